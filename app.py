@@ -1,10 +1,18 @@
+import json
+import threading
+import time
 import traceback
-from flask import render_template, request, redirect, url_for
+import numpy as np
+import sqlalchemy as sql
+from flask import render_template, request, redirect, url_for, jsonify, Response, stream_with_context, g
 import logging.config
 from flask import Flask
-from src.kickstarter_db import Campaign
-from flask_sqlalchemy import SQLAlchemy
+from src.kickstarter_db import Campaign, Prediction, campaign_columns, find_prediction, link_stored_prediction
+from src.kickstarter_db import list_campaigns
+from src.kickstarter_db import get_session_factory, session_scope
 from src import predict_state
+from src import metrics
+from src.campaign_writer import CampaignWriter
 
 
 
@@ -14,9 +22,118 @@ app = Flask(__name__, template_folder="app/templates")
 # Configure flask app from flask_config.py
 app.config.from_pyfile('config/flaskconfig.py')
 
+logger = logging.getLogger('app')
+
+# Buffer form submissions and write them in batches off the request path
+campaign_writer = None
+if app.config["PERSIST_CAMPAIGNS"] and app.config["WRITE_BEHIND"]:
+    # The session factory is looked up per flush, so each forked worker uses its own connection pool
+    campaign_writer = CampaignWriter(lambda: get_session_factory(app.config["SQLALCHEMY_DATABASE_URI"])(),
+                                     max_queue_size=app.config["WRITE_BEHIND_QUEUE_SIZE"],
+                                     batch_size=app.config["WRITE_BEHIND_BATCH_SIZE"],
+                                     flush_interval=app.config["WRITE_BEHIND_FLUSH_INTERVAL"],
+                                     resolve_conflict=link_stored_prediction)
+
+# Readiness: set once the model, vocabularies and encoder are loaded and a warmup prediction has run
+ready = threading.Event()
+warmup_error = None
+
+
+def warmup_app():
+    """Preloads everything the prediction path touches and marks the worker ready.
+
+    Args:
+        None.
+
+    Returns:
+        None
+    """
+    global warmup_error
+    try:
+        predict_state.warmup()
+        ready.set()
+    except Exception:
+        warmup_error = traceback.format_exc().strip().splitlines()[-1]
+        logger.error(f"Warmup failed; worker will not report ready:\n{traceback.format_exc()}")
+
+
+warmup_thread = None
+if app.config["WARMUP_ON_STARTUP"]:
+    warmup_thread = threading.Thread(target=warmup_app, name='warmup', daemon=True)
+    warmup_thread.start()
+else:
+    ready.set()
+
+
+@app.before_request
+def start_request_timer():
+    """Records the start time of the request for the request latency histogram."""
+    if metrics.REGISTRY.enabled:
+        g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request_time(response):
+    """Observes the request latency per endpoint."""
+    if metrics.REGISTRY.enabled and 'request_start' in g:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, request.endpoint)
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus view of per-stage latency histograms, input and prediction counters, and cache and writer state.
+
+    Metrics live in the memory of the worker process answering the request; under gunicorn with several workers
+    they cover that worker only, not the whole service.
+
+    Args:
+        None.
+
+    Returns:
+        Prometheus text exposition
+    """
+    cache = predict_state.get_prediction_cache()
+    cache_gauge = metrics.REGISTRY.gauge('kickstarter_prediction_cache', "Prediction cache state.", ['stat'])
+    cache_gauge.set(cache.hits, 'hits')
+    cache_gauge.set(cache.misses, 'misses')
+    cache_gauge.set(len(cache), 'size')
+    if campaign_writer is not None:
+        writer_gauge = metrics.REGISTRY.gauge('kickstarter_campaign_writer', "Write-behind writer state.", ['stat'])
+        for stat, value in campaign_writer.stats().items():
+            writer_gauge.set(value, stat)
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/healthz')
+def healthz():
+    """Liveness view: the process is up and serving requests.
+
+    Args:
+        None.
+
+    Returns:
+        JSON status, always 200
+    """
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """Readiness view for the load balancer: 200 only once the warmup has completed.
+
+    Args:
+        None.
+
+    Returns:
+        JSON status; 503 while warming up or if the warmup failed
+    """
+    if ready.is_set():
+        return jsonify({'status': 'ready'})
+    if warmup_error is not None:
+        return jsonify({'status': 'failed', 'error': warmup_error}), 503
+    return jsonify({'status': 'warming up'}), 503
 
-# Initialize the database
-db = SQLAlchemy(app)
 
 @app.route('/')
 def index():
@@ -35,10 +152,86 @@ def index():
 
 
 
+def save_campaign(campaign):
+    """Writes a submitted Campaign to the database, through the write-behind buffer if enabled.
+
+    A campaign whose new prediction was stored first by a concurrent request is linked to that prediction and
+    written again. A failed write is logged and does not fail the request.
+
+    Args:
+        campaign (Campaign): campaign submitted by the user
+
+    Returns:
+        None
+    """
+    if campaign_writer is not None:
+        campaign_writer.submit(campaign)
+        return
+    try:
+        try:
+            with session_scope(app.config["SQLALCHEMY_DATABASE_URI"]) as session:
+                session.add(campaign)
+        except sql.exc.IntegrityError:
+            with session_scope(app.config["SQLALCHEMY_DATABASE_URI"]) as session:
+                if not link_stored_prediction(session, campaign):
+                    raise
+                session.add(campaign)
+    except Exception:
+        logger.error(f"Campaign could not be saved:\n{traceback.format_exc()}")
+
+
+def prediction_key(features, encoder):
+    """Builds the key of a valid campaign's prediction in the predictions table under the served model.
+
+    Args:
+        features (dict): normalized feature values, as built by validate_user_input
+        encoder (FeatureEncoder): encoder for the model's columns
+
+    Returns:
+        key (dict): feature_hash and model_version of the campaign, or None if the model version cannot be
+            computed, in which case the campaign is stored without a prediction
+    """
+    try:
+        return {'feature_hash': predict_state.feature_hash(features, encoder),
+                'model_version': predict_state.get_model_version()}
+    except Exception:
+        logger.error(f"Model version could not be computed:\n{traceback.format_exc()}")
+        return None
+
+
+def lookup_prediction(key):
+    """Looks up the stored prediction for a valid campaign's features under the served model.
+
+    A failed lookup is logged and treated as a miss, so the campaign is scored instead.
+
+    Args:
+        key (dict): feature_hash and model_version of the campaign, as built by prediction_key
+
+    Returns:
+        stored (tuple): id, label, probability and explanation (dict, None if not stored) of the stored prediction,
+            or None if there is none
+    """
+    try:
+        with session_scope(app.config["SQLALCHEMY_DATABASE_URI"]) as session:
+            prediction = find_prediction(session, **key)
+            if prediction is None:
+                return None
+            explanation = json.loads(prediction.explanation) if prediction.explanation else None
+            return prediction.id, prediction.label, prediction.probability, explanation
+    except Exception:
+        logger.error(f"Prediction lookup failed:\n{traceback.format_exc()}")
+        return None
+
+
 @app.route('/output', methods=['POST'])
 def add_entry():
     """View that process a POST with new Campaign input containing user-specified campaign information.
 
+    A campaign whose features were already scored by the served model is answered without running the model,
+    explanation included: from the in-process prediction cache, or on a cache miss from the predictions table. Any
+    other campaign is scored. Every campaign is stored with its prediction; one answered from the cache is pointed
+    at the stored prediction by the writer, off the request thread.
+
     Args:
         None.
 
@@ -46,31 +239,235 @@ def add_entry():
          Redirects the output.html page.
     """
 
-    campaign1 = Campaign(
-                        name=request.form['name'],
-                        blurb=request.form['blurb'],
-                        USD_goal=request.form['USD_goal'],
-                        num_days=request.form['num_days'],
-                        country=request.form['country'],
-                        category_name=request.form['category_name'],
-                        p_category_name=request.form['p_category_name'],
-                        staff_pick=request.form['staff_pick']
-    )
-    db.session.add(campaign1)
-    db.session.commit()
-    input = db.session.query(Campaign).order_by(Campaign.id.desc()).first()
-    y_pred, y_pred_proba = predict_state.process_user_input(input)
-    if y_pred == 1:
-        predicted_state = 'SUCCESS'
-        y_pred_proba = [i for i in y_pred_proba]
-    elif y_pred == 0:
-        predicted_state = 'FAILED'
-        y_pred_proba = [i for i in y_pred_proba]
+    user_input = {field: request.form[field] for field in predict_state.CAMPAIGN_FIELDS}
+    persist = app.config["PERSIST_CAMPAIGNS"]
+    encoder = predict_state.get_encoder()
+    with metrics.timer('validate'):
+        features, invalid_fields = predict_state.validate_user_input(user_input, encoder.vocabularies)
+
+    key = stored = cached = None
+    if not invalid_fields:
+        with metrics.timer('cache_lookup'):
+            cached = predict_state.cached_prediction(features, encoder)
+        if persist:
+            key = prediction_key(features, encoder)
+            # The database is only read for features this worker has not answered yet
+            if cached is None and key is not None:
+                with metrics.timer('db_lookup'):
+                    stored = lookup_prediction(key)
+
+    explanation = None
+    if invalid_fields:
+        y_pred, y_pred_proba = -1, None
+    elif cached is not None:
+        y_pred, y_pred_proba, explanation = int(cached[0]), float(cached[1]), cached[2]
+    elif stored is not None:
+        y_pred, y_pred_proba, explanation = stored[1:]
+        if explanation is None:
+            explanation = predict_state.explain_features([features], encoder)[0]
+        else:
+            predict_state.cache_prediction(features, (y_pred, y_pred_proba, explanation), encoder)
     else:
-        predicted_state = 'INVALID USER ENTRY'
-        y_pred_proba = ""
+        # Score the submitted campaign itself rather than re-reading "the latest row" of another request, with its
+        # explanation from the same pass
+        y_pred, y_pred_proba, explanations = predict_state.score_features([features], encoder, explain=True)
+        y_pred, y_pred_proba, explanation = y_pred[0].item(), y_pred_proba[0].item(), explanations[0]
+    predict_state.count_outcomes(np.array([y_pred]), [invalid_fields])
+
+    predicted_state = predict_state.STATE_LABELS[y_pred]
+
+    if persist:
+        campaign = Campaign(**campaign_columns(user_input, features, invalid_fields))
+        if stored is not None:
+            campaign.prediction_id = stored[0]
+        elif key is not None:
+            campaign.prediction = Prediction(label=y_pred, probability=y_pred_proba,
+                                             explanation=json.dumps(explanation), **key)
+        with metrics.timer('db_write'):
+            save_campaign(campaign)
+
+    return render_template("output.html", predicted_state=predicted_state,
+                           y_pred_proba=[y_pred_proba] if y_pred_proba is not None else "", explanation=explanation)
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    """JSON view that scores one campaign posted as a JSON object of Campaign fields, and explains the prediction
+    if the query string has explain=true.
+
+    Args:
+        None.
+
+    Returns:
+        JSON prediction record, with the baseline probability and per-feature contributions if asked for; status
+        400 if the body is not a JSON object or any field is invalid
+    """
+    user_input = request.get_json(silent=True)
+    if not isinstance(user_input, dict):
+        return jsonify({'error': 'Request body must be a JSON object of campaign fields.'}), 400
+
+    explain = request.args.get('explain', '').lower() == 'true'
+    scored = predict_state.process_user_inputs([user_input], explain=explain)
+    record = predict_state.make_prediction_record(*(values[0] for values in scored))
+    return jsonify(record), 400 if 'invalid_fields' in record else 200
+
+
+@app.route('/predict/sweep', methods=['POST'])
+def predict_sweep():
+    """JSON view that scores one campaign over ranges of USD_goal and num_days in a single batched call.
+
+    The body is {"campaign": {...Campaign fields...}, "USD_goal": ..., "num_days": ...}, where each range is a list
+    of values or {"min", "max", "steps", "scale"} with scale "linear" (default) or "log". A field without a range
+    keeps the campaign's own value.
+
+    Args:
+        None.
+
+    Returns:
+        JSON probability surface (one row per goal, one column per duration) and the best setting; status 400 if
+        the body or a range is malformed or any campaign field is invalid
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('campaign'), dict):
+        return jsonify({'error': 'Request body must be a JSON object with a "campaign" object of campaign fields.'}), 400
+
+    try:
+        sweep, invalid_fields = predict_state.sweep_campaign(body['campaign'], body.get('USD_goal'), body.get('num_days'))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    if invalid_fields:
+        return jsonify({'predicted_state': predict_state.STATE_LABELS[-1], 'invalid_fields': invalid_fields}), 400
+    return jsonify(sweep)
+
+
+HISTORY_FILTERS = ['country', 'category_name', 'p_category_name']
+
+
+def history_record(campaign, prediction):
+    """Builds the JSON-serializable history entry of a stored campaign.
+
+    Args:
+        campaign (Campaign): stored campaign
+        prediction (Prediction): its stored prediction, or None if it has none
+
+    Returns:
+        record (dict): campaign fields, its invalid fields, and its prediction if any
+    """
+    record = {field: getattr(campaign, field) for field in ['id'] + predict_state.CAMPAIGN_FIELDS}
+    record['created_at'] = campaign.created_at.isoformat()
+    record['invalid_fields'] = campaign.invalid_fields.split(',') if campaign.invalid_fields else []
+    record['prediction'] = None
+    if prediction is not None:
+        record['prediction'] = {'predicted_state': predict_state.STATE_LABELS[prediction.label],
+                                'probability': prediction.probability,
+                                'model_version': prediction.model_version}
+    return record
+
+
+def get_history_page(args):
+    """Reads one page of the campaign history selected by the query string.
+
+    Args:
+        args (MultiDict): query string with optional before (id to list below), limit (at most MAX_ROWS_SHOW) and
+            country, category_name and p_category_name filters
+
+    Returns:
+        page (dict): campaigns (list[dict]) as built by history_record, next_before (int or None) to request the
+            next page with, and the normalized filters applied
+
+    Raises:
+        ValueError: if before or limit is not a positive integer
+    """
+    try:
+        before = int(args['before']) if args.get('before') else None
+        limit = int(args['limit']) if args.get('limit') else app.config["MAX_ROWS_SHOW"]
+    except ValueError:
+        before = limit = 0
+    if limit < 1 or (before is not None and before < 1):
+        raise ValueError("before and limit must be positive integers.")
+    limit = min(limit, app.config["MAX_ROWS_SHOW"])
+    # Categoricals are stored as their normalized level
+    filters = {field: args[field].strip().lower() for field in HISTORY_FILTERS if args.get(field, '').strip()}
+
+    # One row more than the page tells whether there is a next page
+    with session_scope(app.config["SQLALCHEMY_DATABASE_URI"]) as session:
+        rows = list_campaigns(session, limit + 1, before_id=before, **filters)
+        campaigns = [history_record(campaign, prediction) for campaign, prediction in rows[:limit]]
+    next_before = campaigns[-1]['id'] if len(rows) > limit else None
+    return {'campaigns': campaigns, 'next_before': next_before, 'filters': filters}
+
+
+@app.route('/history', methods=['GET'])
+def history():
+    """View that lists the most recent stored campaigns with their predictions, MAX_ROWS_SHOW per page.
+
+    Args:
+        None.
+
+    Returns:
+        rendered history.html template, error.html if the database cannot be read, or status 400 if the query
+        string is malformed
+    """
+    try:
+        page = get_history_page(request.args)
+    except ValueError as error:
+        return str(error), 400
+    except Exception:
+        logger.error(f"History could not be read:\n{traceback.format_exc()}")
+        return render_template('error.html'), 500
+    return render_template('history.html', **page)
+
+
+@app.route('/history.json', methods=['GET'])
+def history_json():
+    """JSON view of the campaign history, with the same query string as /history.
+
+    Args:
+        None.
+
+    Returns:
+        JSON page of campaigns and the next_before cursor, with status 400 if the query string is malformed or 500
+        if the database cannot be read
+    """
+    try:
+        page = get_history_page(request.args)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    except Exception:
+        logger.error(f"History could not be read:\n{traceback.format_exc()}")
+        return jsonify({'error': 'History could not be read.'}), 500
+    return jsonify(page)
+
+
+def parse_ndjson_line(line):
+    """Parses one NDJSON line into a campaign dictionary, or None if it is not a JSON object."""
+    try:
+        user_input = json.loads(line)
+    except ValueError:
+        return None
+    return user_input if isinstance(user_input, dict) else None
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """NDJSON view that scores one campaign per line and streams one prediction record per line back.
+
+    Records are scored in batches of PREDICT_BATCH_SIZE as the request body is read, so results start flowing
+    before the whole upload has been received.
+
+    Args:
+        None.
+
+    Returns:
+        Streaming application/x-ndjson response of prediction records, each tagged with its input row
+    """
+    def generate():
+        lines = (line for line in request.stream if line.strip())
+        user_inputs = (parse_ndjson_line(line) for line in lines)
+        for record in predict_state.iter_prediction_records(user_inputs, app.config["PREDICT_BATCH_SIZE"]):
+            yield json.dumps(record) + "\n"
 
-    return render_template("output.html", predicted_state=predicted_state, y_pred_proba=y_pred_proba)
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 
 if __name__ == '__main__':
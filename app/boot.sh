@@ -2,5 +2,4 @@
 
 python3 run.py create_db
 python3 run.py add_campaign
-python3 app.py
-
+gunicorn -c config/gunicorn.conf.py app:app
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import traceback
+from urllib.parse import parse_qs
+import logging.config
+from src import config
+from src import predict_state
+from src.micro_batcher import MicroBatcher, score_campaigns, explain_campaigns
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('asgi')
+
+# Async JSON prediction API: `uvicorn asgi:app --port 5001`
+#
+# Concurrent /predict requests are micro-batched: they are collected for up to MICRO_BATCH_MAX_WAIT seconds or
+# MICRO_BATCH_MAX_SIZE requests and scored with one model call, instead of one predict_proba call per request.
+# Requests asking for explanations are batched separately, so the others skip the contributions pass.
+batcher = MicroBatcher(score_campaigns,
+                       max_batch_size=config.MICRO_BATCH_MAX_SIZE,
+                       max_wait=config.MICRO_BATCH_MAX_WAIT)
+explain_batcher = MicroBatcher(explain_campaigns,
+                               max_batch_size=config.MICRO_BATCH_MAX_SIZE,
+                               max_wait=config.MICRO_BATCH_MAX_WAIT)
+
+# Readiness: set once the warmup at startup has completed
+ready = asyncio.Event()
+warmup_error = None
+
+
+async def send_json(send, body, status=200):
+    """Sends a complete JSON response.
+
+    Args:
+        send (coroutine function): ASGI send channel
+        body (dict): JSON-serializable response body
+        status (int): HTTP status code
+
+    Returns:
+        None
+    """
+    payload = json.dumps(body).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def read_body(receive):
+    """Reads the complete request body.
+
+    Args:
+        receive (coroutine function): ASGI receive channel
+
+    Returns:
+        body (bytes): request body
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def lifespan(receive, send):
+    """Warms up the model path at startup and stops the micro-batcher at shutdown.
+
+    Args:
+        receive (coroutine function): ASGI receive channel
+        send (coroutine function): ASGI send channel
+
+    Returns:
+        None
+    """
+    global warmup_error
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await asyncio.get_event_loop().run_in_executor(None, predict_state.warmup)
+                ready.set()
+            except Exception:
+                warmup_error = traceback.format_exc().strip().splitlines()[-1]
+                logger.error(f"Warmup failed; worker will not report ready:\n{traceback.format_exc()}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await batcher.stop()
+            await explain_batcher.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def predict(scope, receive, send):
+    """JSON view that scores one campaign posted as a JSON object of Campaign fields, as /predict in app.py, and
+    explains the prediction if the query string has explain=true.
+
+    Args:
+        scope (dict): ASGI connection scope
+        receive (coroutine function): ASGI receive channel
+        send (coroutine function): ASGI send channel
+
+    Returns:
+        None; sends the JSON prediction record, with status 400 if the body is not a JSON object or any field is
+        invalid
+    """
+    try:
+        user_input = json.loads(await read_body(receive))
+    except ValueError:
+        user_input = None
+    if not isinstance(user_input, dict):
+        await send_json(send, {'error': 'Request body must be a JSON object of campaign fields.'}, 400)
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    explain = query.get('explain', [''])[-1].lower() == 'true'
+    record = await (explain_batcher if explain else batcher).submit(user_input)
+    await send_json(send, record, 400 if 'invalid_fields' in record else 200)
+
+
+async def app(scope, receive, send):
+    """ASGI application routing /predict, /healthz and /readyz.
+
+    Args:
+        scope (dict): ASGI connection scope
+        receive (coroutine function): ASGI receive channel
+        send (coroutine function): ASGI send channel
+
+    Returns:
+        None
+    """
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    route = (scope['method'], scope['path'])
+    if route == ('POST', '/predict'):
+        await predict(scope, receive, send)
+    elif route == ('GET', '/healthz'):
+        await send_json(send, {'status': 'ok'})
+    elif route == ('GET', '/readyz'):
+        if ready.is_set():
+            await send_json(send, {'status': 'ready', 'batching': batcher.stats(),
+                                   'explain_batching': explain_batcher.stats()})
+        elif warmup_error is not None:
+            await send_json(send, {'status': 'failed', 'error': warmup_error}, 503)
+        else:
+            await send_json(send, {'status': 'warming up'}, 503)
+    else:
+        await send_json(send, {'error': 'Not found.'}, 404)
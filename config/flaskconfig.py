@@ -14,6 +14,7 @@ LOGGING_CONFIG = "config/logging/local.conf"
 PORT = 5000
 APP_NAME = "kickstarter_predictor"
 HOST = "0.0.0.0"
+WORKERS = int(os.environ.get('WORKERS', os.cpu_count() or 1))  # Pre-forked gunicorn workers, see config/gunicorn.conf.py
 
 
 # # MYSQL Configurations
@@ -32,4 +33,13 @@ if SQLALCHEMY_DATABASE_URI is None:
 SQLALCHEMY_TRACK_MODIFICATIONS = True
 SQLALCHEMY_ECHO = False  # If true, SQL for queries made will be printed
 MAX_ROWS_SHOW = 100
+PERSIST_CAMPAIGNS = True  # Store campaigns submitted through the form; scoring does not depend on it
+
+# Write-behind persistence: buffer submitted campaigns and bulk insert them from a background thread
+WRITE_BEHIND = True
+WRITE_BEHIND_QUEUE_SIZE = 10000  # Submissions beyond this many unwritten rows are dropped
+WRITE_BEHIND_BATCH_SIZE = 100
+WRITE_BEHIND_FLUSH_INTERVAL = 1.0  # Seconds
+WARMUP_ON_STARTUP = True  # Preload model and levels and run a synthetic prediction before reporting ready
+PREDICT_BATCH_SIZE = 500  # Records scored per model call by /predict/batch
 
@@ -0,0 +1,20 @@
+# Gunicorn configuration for production serving: `gunicorn -c config/gunicorn.conf.py app:app`
+#
+# The app is imported once in the master (preload_app), which loads the model, vocabularies and encoder, and the
+# workers are forked from it afterwards. The model's node arrays are therefore shared copy-on-write between all
+# workers instead of each worker unpickling its own copy, and every worker starts hot.
+from config.flaskconfig import HOST, PORT, WORKERS
+
+bind = f"{HOST}:{PORT}"
+workers = WORKERS
+preload_app = True
+worker_class = 'sync'
+timeout = 60
+
+
+def when_ready(server):
+    """Waits for the warmup started by app.py, so the master forks workers only once the model is loaded."""
+    from app import warmup_thread
+    if warmup_thread is not None:
+        warmup_thread.join()
+    server.log.info(f"Warmup finished in master; forking {server.cfg.workers} workers.")
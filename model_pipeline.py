@@ -11,6 +11,7 @@ import ast
 from src.ingest_data import read_from_S3, process_json, save_csv
 from src.clean_data import read_uncleaned, make_categories, add_category_columns, make_USD_goal, make_description_vars, get_start_epoch, prep_response, save_data, write_column_levels
 from src.model_dev import make_dummies, get_features, split_data, train_model, run_model, evaluate_model, get_findings
+from src.predict_state import export_model
 
 if __name__ == "__main__":
 
@@ -83,6 +84,7 @@ if __name__ == "__main__":
     model_path = config.MODEL_STORE_PATH
     metrics_path = config.MODEL_METRICS_PATH
     features_path = config.MODEL_FEATURES_PATH
+    decision_threshold = config.DECISION_THRESHOLD
 
     # Get features and response from cleaned data
     df_features, df_response = get_features(data_path=cleaned_path, response=response, numerical=numerical, categorical=categorical)
@@ -93,8 +95,11 @@ if __name__ == "__main__":
     # Train and save model
     model = train_model(X_train=X_train, y_train=y_train, model_path=model_path, **model_parameters)
 
+    # Export memory-mappable model arrays for serving
+    export_model(model=model, export_path=config.MODEL_ARRAYS_PATH)
+
     # Run model
-    ypred_proba_test, ypred_binary_test = run_model(model=model, X_test=X_test)
+    ypred_proba_test, ypred_binary_test = run_model(model=model, X_test=X_test, threshold=decision_threshold)
 
     # Evaluate model
     auc, confusion, accuracy = evaluate_model(ypred_proba_test=ypred_proba_test, ypred_binary_test=ypred_binary_test, y_test=y_test, metrics_path=metrics_path)
@@ -1,6 +1,8 @@
 
 import argparse
-from src.kickstarter_db import create_db, add_campaign
+from src.kickstarter_db import create_db, add_campaign, migrate_db
+from src.bulk_score import run_score_file
+from src.bulk_ingest import run_ingest_file
 from datetime import datetime
 from config.flaskconfig import SQLALCHEMY_DATABASE_URI
 
@@ -43,5 +45,34 @@ if __name__ == "__main__":
 
     sb_ingest.set_defaults(func=add_campaign)
 
+    # Sub-parser for migrating a database to the typed, indexed campaign schema
+    sb_migrate = subparsers.add_parser("migrate_db", description="Migrate campaigns to the typed, indexed schema")
+    sb_migrate.add_argument("--batch_size", type=int, default=1000, help="Campaigns converted per transaction")
+    sb_migrate.add_argument("--engine_string", default=SQLALCHEMY_DATABASE_URI,
+                            help="SQLAlchemy connection URI for database.")
+
+    sb_migrate.set_defaults(func=migrate_db)
+
+    # Sub-parser for scoring a file of campaigns offline
+    sb_score = subparsers.add_parser("score_file", description="Score a CSV or NDJSON file of campaigns")
+    sb_score.add_argument("input_path", help="CSV (with header) or NDJSON (.ndjson/.jsonl/.json) file of campaigns")
+    sb_score.add_argument("output_path", help="CSV or NDJSON file to write one prediction per campaign to")
+    sb_score.add_argument("--chunk_size", type=int, default=10000, help="Campaigns scored per task")
+    sb_score.add_argument("--workers", type=int, default=None, help="Worker processes (default = number of CPUs)")
+
+    sb_score.set_defaults(func=run_score_file)
+
+    # Sub-parser for bulk loading a file of campaigns into the database
+    sb_bulk = subparsers.add_parser("ingest_file", description="Load a CSV or NDJSON file of campaigns into database")
+    sb_bulk.add_argument("input_path", help="CSV (with header) or NDJSON (.ndjson/.jsonl/.json) file of campaigns")
+    sb_bulk.add_argument("--chunk_size", type=int, default=1000, help="Campaigns inserted per transaction")
+    sb_bulk.add_argument("--restart", action="store_true",
+                         help="Ignore the checkpoint of an earlier run, e.g. of a file that changed since, and "
+                              "ingest from the first row")
+    sb_bulk.add_argument("--engine_string", default=SQLALCHEMY_DATABASE_URI,
+                         help="SQLAlchemy connection URI for database.")
+
+    sb_bulk.set_defaults(func=run_ingest_file)
+
     args = parser.parse_args()
     args.func(args)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+from src import config
+from src.bulk_score import iter_chunks
+from src.predict_state import CAMPAIGN_FIELDS
+from src.kickstarter_db import Base, Campaign, IngestCheckpoint, get_engine, session_scope, make_campaign_records
+from src.kickstarter_db import utc_now
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('bulk_ingest')
+
+
+def to_campaign_records(chunk):
+    """
+    Validates a chunk of raw campaign records and converts it into typed Campaign column mappings. Raw values are
+    validated as read, so an NDJSON number stays valid even when a missing value in its chunk made it a float.
+
+    Args:
+        chunk (Pandas DataFrame): raw campaign records, with at least the CAMPAIGN_FIELDS columns; others are ignored
+
+    Returns:
+        records (list[dict]): Campaign column values per record, with validation failures in invalid_fields
+    """
+    missing = [field for field in CAMPAIGN_FIELDS if field not in chunk.columns]
+    if missing:
+        raise ValueError(f"Input is missing the campaign fields: {', '.join(missing)}")
+    return make_campaign_records(chunk[CAMPAIGN_FIELDS].reset_index(drop=True))
+
+
+def file_fingerprint(path):
+    """
+    Identifies the current content of a file by its size and modification time.
+
+    Args:
+        path (string): path of the file
+
+    Returns:
+        fingerprint (string): size in bytes and modification time in nanoseconds
+    """
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def get_checkpoint(source, fingerprint, engine_string=None):
+    """
+    Retrieves how many rows of a file have already been committed.
+
+    Args:
+        source (string): absolute path of the ingested file
+        fingerprint (string): current fingerprint of the file, as built by file_fingerprint
+        engine_string (string): SQLAlchemy connection URI
+
+    Returns:
+        rows_committed (int): number of leading rows already in the database
+        completed (boolean): whether the whole file was ingested
+
+    Raises:
+        ValueError: if the file was replaced or modified since its rows were committed, so skipping them would be
+            wrong
+    """
+    with session_scope(engine_string) as session:
+        checkpoint = session.query(IngestCheckpoint).filter_by(source=source).one_or_none()
+        if checkpoint is None:
+            return 0, False
+        if checkpoint.fingerprint != fingerprint:
+            raise ValueError(f"{source} changed since {checkpoint.rows_committed} of its rows were committed; "
+                             f"ingest it with restart to load it again from its first row.")
+        return checkpoint.rows_committed, checkpoint.completed
+
+
+def save_chunk(records, source, fingerprint, rows_committed, completed, engine_string=None):
+    """
+    Bulk inserts a chunk of campaigns and advances the file's checkpoint in one transaction, so either both or
+    neither are committed.
+
+    Args:
+        records (list[dict]): Campaign column values per record
+        source (string): absolute path of the ingested file
+        fingerprint (string): fingerprint of the file, as built by file_fingerprint
+        rows_committed (int): number of leading rows of the file committed once this chunk is
+        completed (boolean): whether this is the last chunk of the file
+        engine_string (string): SQLAlchemy connection URI
+
+    Returns:
+        None
+    """
+    with session_scope(engine_string) as session:
+        if records:
+            session.bulk_insert_mappings(Campaign, records)
+        session.merge(IngestCheckpoint(source=source, fingerprint=fingerprint, rows_committed=rows_committed,
+                                       completed=completed, updated_at=utc_now()))
+
+
+def ingest_file(input_path, engine_string=None, chunk_size=1000, restart=False):
+    """
+    Streams campaigns from a CSV or NDJSON file into the Campaign table, with one bulk insert and one transaction per
+    chunk.
+
+    Each transaction also records how many rows of the file are committed. Running the same file again after a
+    failure skips those rows and resumes with the next chunk; running it after it completed inserts nothing. A file
+    that was replaced or modified since is refused rather than resumed, unless restart is set.
+
+    Args:
+        input_path (string): CSV file with a header row, or NDJSON file of campaign objects, with the CAMPAIGN_FIELDS
+        engine_string (string): SQLAlchemy connection URI; defaults to the configured SQLite database
+        chunk_size (int): number of campaigns inserted per transaction
+        restart (boolean): ignore the checkpoint and ingest the file from its first row
+
+    Returns:
+        report (dict): number of rows inserted, inserted with validation failures and skipped as already committed,
+            chunks committed, elapsed seconds and rows per second
+    """
+    Base.metadata.create_all(get_engine(engine_string))
+    source = os.path.abspath(input_path)
+    fingerprint = file_fingerprint(input_path)
+    rows_committed, completed = (0, False) if restart else get_checkpoint(source, fingerprint, engine_string)
+
+    report = {'rows': 0, 'invalid': 0, 'skipped': rows_committed, 'chunks': 0}
+    start_time = time.perf_counter()
+    if completed:
+        logger.info(f"{input_path} was already ingested ({rows_committed} rows); use restart to ingest it again.")
+    else:
+        if rows_committed:
+            logger.info(f"Resuming ingest of {input_path} after {rows_committed} committed rows.")
+        start = 0
+        for chunk in iter_chunks(input_path, chunk_size):
+            end = start + len(chunk)
+            if end > rows_committed:
+                records = to_campaign_records(chunk.iloc[max(rows_committed - start, 0):])
+                save_chunk(records, source, fingerprint, end, False, engine_string)
+                rows_committed = end
+                report['rows'] += len(records)
+                report['invalid'] += sum(1 for record in records if record['invalid_fields'])
+                report['chunks'] += 1
+                elapsed = time.perf_counter() - start_time
+                logger.info(f"{rows_committed} rows committed ({report['rows'] / elapsed:.0f} rows/s).")
+            start = end
+        save_chunk([], source, fingerprint, rows_committed, True, engine_string)
+
+    report['elapsed_s'] = time.perf_counter() - start_time
+    report['rows_per_s'] = report['rows'] / report['elapsed_s'] if report['elapsed_s'] else 0.0
+    logger.info(f"Ingested {report['rows']} rows ({report['invalid']} invalid, {report['skipped']} skipped as already "
+                f"committed) from {input_path} in {report['elapsed_s']:.1f} s ({report['rows_per_s']:.0f} rows/s).")
+    return report
+
+
+def run_ingest_file(args):
+    """
+    Ingests a file of campaigns from the command line.
+
+    Args:
+        args (Argparse args): includes input_path, engine_string, chunk_size and restart
+
+    Returns:
+        None
+    """
+    report = ingest_file(args.input_path, engine_string=args.engine_string, chunk_size=args.chunk_size,
+                         restart=args.restart)
+    print(json.dumps(report, indent=2))
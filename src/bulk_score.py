@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import collections
+import multiprocessing
+import numpy as np
+import pandas as pd
+from src import config
+from src import predict_state
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('bulk_score')
+
+OUTPUT_COLUMNS = ['row', 'predicted_state', 'prediction', 'probability', 'invalid_fields']
+
+
+def is_ndjson(path):
+    """Whether a path names an NDJSON file (.ndjson, .jsonl or .json) rather than a CSV file."""
+    return os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl', '.json')
+
+
+def bool_to_text(value):
+    """Spells a JSON boolean as it is typed into the form ('True' or 'False'); other values are kept as they are."""
+    return str(value) if isinstance(value, (bool, np.bool_)) else value
+
+
+def iter_chunks(input_path, chunk_size):
+    """
+    Streams raw campaign records from a CSV or NDJSON file in chunks, so memory use does not grow with the file.
+
+    CSV fields are read as strings, as they would be typed into the form, with empty cells kept as empty strings.
+    NDJSON fields keep their JSON types, except staff_pick booleans, which become 'True' or 'False' as in the form,
+    so a JSON false staff_pick validates like a CSV False. Other JSON booleans are validated as read, as in /predict.
+
+    Args:
+        input_path (string): path to a CSV file with a header row, or an NDJSON file of campaign objects
+        chunk_size (int): number of records per chunk
+
+    Yields:
+        chunk (Pandas DataFrame): raw campaign fields of up to chunk_size records
+    """
+    ndjson = is_ndjson(input_path)
+    if ndjson:
+        reader = pd.read_json(input_path, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        reader = pd.read_csv(input_path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    # Chunked readers are only context managers from pandas 1.2, so close the file explicitly
+    try:
+        for chunk in reader:
+            if ndjson and 'staff_pick' in chunk.columns:
+                chunk['staff_pick'] = chunk['staff_pick'].map(bool_to_text)
+            yield chunk
+    finally:
+        reader.close()
+
+
+def score_chunk(task):
+    """
+    Validates, encodes and scores one chunk of raw campaign records.
+
+    Args:
+        task (tuple): zero-based row number of the first record (int) and the chunk (Pandas DataFrame)
+
+    Returns:
+        predictions (Pandas DataFrame): OUTPUT_COLUMNS per record; invalid_fields lists the invalid fields
+            separated by ';'
+    """
+    start, chunk = task
+    y_pred, y_pred_proba, reasons = predict_state.process_user_frame(chunk.reset_index(drop=True))
+    return pd.DataFrame({
+        'row': range(start, start + len(chunk)),
+        'predicted_state': [predict_state.STATE_LABELS[int(label)] for label in y_pred],
+        'prediction': y_pred,
+        'probability': y_pred_proba,
+        'invalid_fields': [';'.join(fields) for fields in predict_state.invalid_fields_from_reasons(reasons)],
+    }, columns=OUTPUT_COLUMNS)
+
+
+def write_predictions(predictions, outfile, ndjson, header):
+    """
+    Appends scored records to an open output file.
+
+    Args:
+        predictions (Pandas DataFrame): scored records, as returned by score_chunk
+        outfile (file object): output file opened for writing
+        ndjson (boolean): write one JSON object per line instead of CSV rows
+        header (boolean): write the CSV header row first
+
+    Returns:
+        None
+    """
+    if ndjson:
+        for record in predictions.to_dict(orient='records'):
+            record['probability'] = None if pd.isna(record['probability']) else record['probability']
+            outfile.write(json.dumps(record) + "\n")
+    else:
+        predictions.to_csv(outfile, header=header, index=False)
+
+
+def score_file(input_path, output_path, chunk_size=10000, workers=None):
+    """
+    Scores every campaign of an input file and writes one prediction per campaign to an output file, in input
+    order.
+
+    The model is loaded once before the worker processes are forked, so all workers share it. At most two chunks
+    per worker are in flight at a time and results are written as soon as they are ready, so memory is bounded by
+    chunk_size and workers rather than by the input size. The output is written next to output_path and renamed
+    into place once complete.
+
+    Args:
+        input_path (string): CSV or NDJSON file of raw campaign records
+        output_path (string): CSV or NDJSON file to write predictions to, by extension
+        chunk_size (int): number of records validated, encoded and scored per task
+        workers (int): number of worker processes; defaults to the number of CPUs
+
+    Returns:
+        report (dict): number of records scored, valid and invalid, elapsed seconds and records per second
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    ndjson = is_ndjson(output_path)
+    predict_state.warmup()
+
+    report = {'rows': 0, 'valid': 0, 'invalid': 0}
+    start_time = time.perf_counter()
+    tmp_path = f"{output_path}.tmp"
+    context = multiprocessing.get_context('fork')
+    try:
+        with context.Pool(workers) as pool, open(tmp_path, 'w') as outfile:
+            pending = collections.deque()
+
+            def write_next():
+                predictions = pending.popleft().get()
+                write_predictions(predictions, outfile, ndjson, header=report['rows'] == 0)
+                n_valid = int((predictions['prediction'] != -1).sum())
+                report['rows'] += len(predictions)
+                report['valid'] += n_valid
+                report['invalid'] += len(predictions) - n_valid
+                elapsed = time.perf_counter() - start_time
+                logger.info(f"{report['rows']} rows scored in {elapsed:.1f} s ({report['rows'] / elapsed:.0f} rows/s).")
+
+            start = 0
+            for chunk in iter_chunks(input_path, chunk_size):
+                pending.append(pool.apply_async(score_chunk, [(start, chunk)]))
+                start += len(chunk)
+                if len(pending) >= 2 * workers:
+                    write_next()
+            while pending:
+                write_next()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+
+    report['elapsed_s'] = time.perf_counter() - start_time
+    report['rows_per_s'] = report['rows'] / report['elapsed_s'] if report['elapsed_s'] else 0.0
+    logger.info(f"Scored {report['rows']} rows ({report['invalid']} invalid) from {input_path} into {output_path} "
+                f"in {report['elapsed_s']:.1f} s ({report['rows_per_s']:.0f} rows/s).")
+    return report
+
+
+def run_score_file(args):
+    """
+    Scores a file of campaigns from the command line.
+
+    Args:
+        args (Argparse args): includes input_path, output_path, chunk_size and workers
+
+    Returns:
+        None
+    """
+    report = score_file(args.input_path, args.output_path, chunk_size=args.chunk_size, workers=args.workers)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,226 @@
+import atexit
+import os
+import queue
+import threading
+import time
+import traceback
+import sqlalchemy as sql
+from src import config
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('campaign_writer')
+
+
+class CampaignWriter(object):
+    """
+    Write-behind persistence for submitted campaigns (or any other mapped rows).
+
+    Rows are buffered in a bounded in-memory queue and written by a background thread with one commit per batch. A
+    batch is flushed once it holds batch_size rows or flush_interval seconds after its first row arrived, whichever
+    comes first. Remaining rows are drained when the writer is stopped or the process exits.
+    """
+
+    def __init__(self, session_factory, max_queue_size=10000, batch_size=100, flush_interval=1.0,
+                 resolve_conflict=None):
+        """
+        Args:
+            session_factory (callable): returns a new SQLAlchemy session, e.g. a sessionmaker
+            max_queue_size (int): maximum number of rows buffered; rows submitted beyond it are dropped
+            batch_size (int): maximum number of rows written per flush
+            flush_interval (float): maximum number of seconds a row waits in the buffer before being flushed
+            resolve_conflict (callable): called with the session and a row that may clash with a stored row, before
+                its batch is written and again if it violated a unique constraint; returns True if it fixed the row
+                (e.g. pointed it at the stored duplicate), so a row that clashed is written again
+        """
+        self.session_factory = session_factory
+        self.resolve_conflict = resolve_conflict
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'duplicates': 0,
+            'failed': 0,
+            'flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_last': 0.0,
+            'flush_seconds_max': 0.0,
+        }
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._start()
+        atexit.register(self.stop)
+
+    def _start(self):
+        """
+        Creates the buffer and starts the background thread for the current process. Threads do not survive a
+        fork, so a pre-forked worker gets its own buffer and thread on first use.
+        """
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(target=self._run, name='campaign_writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, row):
+        """
+        Buffers a row for writing without blocking the caller.
+
+        Args:
+            row (Base object): mapped object to insert, e.g. a Campaign
+
+        Returns:
+            accepted (boolean): False if the buffer was full or the writer is stopped and the row was dropped
+        """
+        if self._pid != os.getpid():
+            self._start()
+        accepted = not self._stopping.is_set()
+        if accepted:
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                accepted = False
+        with self._stats_lock:
+            self._stats['submitted' if accepted else 'dropped'] += 1
+        if not accepted:
+            logger.warning("Write-behind buffer full or stopped; row dropped.")
+        return accepted
+
+    def _collect(self):
+        """
+        Waits for the next batch of buffered rows.
+
+        Returns:
+            batch (list[Base object]): up to batch_size rows, empty if nothing arrived within flush_interval
+        """
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Once stopping, take whatever is already buffered instead of waiting out the interval
+                if self._stopping.is_set() or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        """
+        Writes a batch of rows with one commit.
+
+        Rows are added through the session rather than bulk saved, so related rows (e.g. a campaign's prediction)
+        are written with them. Each row is passed to resolve_conflict first, so rows duplicating a stored row are
+        fixed before they can make the batch clash. If the batch still clashes with a row already stored, e.g. a
+        prediction stored by another process meanwhile, its rows are written one by one; a clashing row is written
+        again once resolve_conflict fixed it, and dropped as a duplicate otherwise.
+
+        Args:
+            batch (list[Base object]): rows to write
+
+        Returns:
+            None
+        """
+        start = time.perf_counter()
+        written = duplicates = 0
+        session = self.session_factory()
+        try:
+            if self.resolve_conflict is not None:
+                for row in batch:
+                    self.resolve_conflict(session, row)
+            session.add_all(batch)
+            session.commit()
+            written = len(batch)
+        except sql.exc.IntegrityError:
+            session.rollback()
+            for row in batch:
+                if self._write_row(session, row):
+                    written += 1
+                else:
+                    duplicates += 1
+            logger.info(f"Write-behind batch clashed with stored rows; wrote {written} of {len(batch)} rows one by one "
+                        f"and dropped {duplicates} duplicates.")
+        except Exception:
+            session.rollback()
+            logger.error(f"Write-behind flush of {len(batch)} rows failed:\n{traceback.format_exc()}")
+        finally:
+            session.close()
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._stats['written'] += written
+            self._stats['duplicates'] += duplicates
+            self._stats['failed'] += len(batch) - written - duplicates
+            self._stats['flushes'] += 1
+            self._stats['flush_seconds_total'] += elapsed
+            self._stats['flush_seconds_last'] = elapsed
+            self._stats['flush_seconds_max'] = max(self._stats['flush_seconds_max'], elapsed)
+        logger.debug(f"Flushed {len(batch)} rows in {elapsed * 1000:.1f} ms; {self._queue.qsize()} rows queued.")
+
+    def _write_row(self, session, row):
+        """
+        Writes a single row with its own commit, resolving a unique constraint violation once if possible.
+
+        Args:
+            session (sqlalchemy Session): open session
+            row (Base object): row to write
+
+        Returns:
+            written (boolean): False if the row clashed with a stored row and could not be resolved
+        """
+        for attempt in range(2):
+            try:
+                session.add(row)
+                session.commit()
+                return True
+            except sql.exc.IntegrityError:
+                session.rollback()
+                if attempt or self.resolve_conflict is None or not self.resolve_conflict(session, row):
+                    return False
+        return False
+
+    def _run(self):
+        """Background loop that flushes batches until the writer is stopped and the buffer is drained."""
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def stop(self, timeout=None):
+        """
+        Stops accepting rows and waits for the buffered rows to be written.
+
+        Args:
+            timeout (float): maximum number of seconds to wait for the drain; None waits until done
+
+        Returns:
+            None
+        """
+        if not self._stopping.is_set():
+            self._stopping.set()
+            logger.info(f"Draining write-behind buffer of {self._queue.qsize()} rows.")
+        self._thread.join(timeout)
+
+    def stats(self):
+        """
+        Reports the state of the writer.
+
+        Returns:
+            stats (dict): queue depth, row counters and flush latency in seconds
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
@@ -41,6 +41,13 @@ DB_NAME = config['mysql']['db_name']
 # SQLITE Configurations
 SQLITE_ENGINE = config['sqlite']['db_path']
 
+# Database Connection Pool Configurations
+database = config['database']
+DB_POOL_SIZE = database['pool_size']
+DB_MAX_OVERFLOW = database['max_overflow']
+DB_POOL_PRE_PING = database['pool_pre_ping']
+DB_POOL_RECYCLE = database['pool_recycle']
+
 # Data Path Configurations
 UNCLEANED_PATH = external_paths['uncleaned_path']
 CLEANED_STORE_PATH = external_paths['cleaned_path']
@@ -62,9 +69,24 @@ VALID_STAFF_PICKS = model['staff_picks']
 TEST_SIZE = model['test_size']
 SPLIT_RANDOM_STATE = model['split_random_state']
 MODEL_DICT = model['model_dict']
+DECISION_THRESHOLD = model['decision_threshold']
 
 # Model Storage
 model_paths = config['source_paths']['model']
 MODEL_STORE_PATH = f"{REPO_PATH}/{model_paths['trained_model']}"
+MODEL_ARRAYS_PATH = f"{REPO_PATH}/{model_paths['model_arrays']}"
 MODEL_METRICS_PATH = f"{REPO_PATH}/{model_paths['model_metrics']}"
 MODEL_FEATURES_PATH = f"{REPO_PATH}/{model_paths['features']}"
+
+# Serving Configurations
+serving = config['serving']
+MODEL_FORMAT = serving['model_format']
+INFERENCE_ENGINE = serving['inference_engine']
+COMPILED_MAX_BATCH = serving['compiled_max_batch']
+MICRO_BATCH_MAX_SIZE = serving['micro_batch_max_size']
+MICRO_BATCH_MAX_WAIT = serving['micro_batch_max_wait']
+SWEEP_MAX_POINTS = serving['sweep_max_points']
+ARTIFACT_CHECK_INTERVAL = serving['artifact_check_interval']
+PREDICTION_CACHE_SIZE = serving['prediction_cache_size']
+PREDICTION_CACHE_TTL = serving['prediction_cache_ttl']
+METRICS_ENABLED = serving['metrics_enabled']
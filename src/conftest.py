@@ -0,0 +1,41 @@
+import sys
+import pickle
+import pytest
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from src import config
+from src import predict_state
+
+
+@pytest.fixture
+def served_model(tmp_path, monkeypatch):
+    """
+    Trains a small random forest on synthetic campaigns encoded from the level files, pickles it in a temporary
+    directory and makes it the served model. Campaigns with a goal under 5000 USD are labelled successful.
+
+    Returns:
+        model (RandomForestClassifier): the served model
+    """
+    encoder = predict_state.get_encoder()
+    campaigns = predict_state.make_sample_campaigns(300, random_state=0)
+    rows = [predict_state.validate_user_input(campaign, encoder.vocabularies)[0] for campaign in campaigns]
+    X = encoder.encode(rows)
+    y = np.array([row['USD_goal'] < 5000 for row in rows], dtype=int)
+    model = RandomForestClassifier(n_estimators=10, max_depth=5, random_state=123).fit(X, y)
+
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, 'wb') as outfile:
+        pickle.dump(model, outfile)
+    monkeypatch.setattr(config, 'MODEL_FORMAT', 'pickle')
+    monkeypatch.setattr(config, 'MODEL_STORE_PATH', str(model_path))
+    predict_state.get_prediction_cache().clear()
+    return model
+
+
+@pytest.fixture(autouse=True, scope='session')
+def stop_campaign_writer():
+    """Drains the write-behind writer of the app, if a test imported it, while the test run can still log."""
+    yield
+    flask_app = sys.modules.get('app')
+    if flask_app is not None and flask_app.campaign_writer is not None:
+        flask_app.campaign_writer.stop()
@@ -0,0 +1,361 @@
+import os
+import json
+import time
+import shutil
+import pickle
+import numpy as np
+from src import config
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('forest_engine')
+
+# Node and class arrays of an exported forest, each stored as <name>.npy so it can be memory-mapped
+ARRAY_NAMES = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes', 'is_leaf', 'children', 'delta',
+               'parent_feature')
+METADATA_FILE = 'metadata.json'
+
+
+class CompiledForest(object):
+    """
+    Random forest flattened into contiguous numpy arrays and evaluated with vectorized traversal.
+
+    All trees share one node table: for every node its split feature and threshold, its left and right children
+    (leaves point to themselves) and its class probabilities. Each traversal step moves every (row, tree) pair that
+    has not reached a leaf one level down at once, so a row or a batch is scored with at most max_depth numpy
+    gathers instead of per-tree Python and joblib calls. predict_proba and classes_ mirror RandomForestClassifier
+    so the two are interchangeable.
+
+    The per-step numpy overhead makes this fastest for single rows and small batches; for batches larger than
+    max_batch the original sklearn forest, when kept as fallback, is used instead.
+
+    Every node also stores how much reaching it changed the positive-class probability relative to its parent, and
+    the feature its parent split on. Summing those deltas along the path a row takes splits its probability into a
+    baseline (the mean root value) plus one contribution per feature, so explaining a prediction costs one traversal.
+
+    A compiled forest can be saved as a directory of .npy files and loaded back memory-mapped, so processes serving
+    it share the node arrays through the page cache instead of each unpickling its own copy.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth, n_features,
+                 fallback=None, max_batch=None, is_leaf=None, children=None, delta=None, parent_feature=None,
+                 metadata=None):
+        """
+        Args:
+            feature (numpy array): split feature per node, 0 for leaves
+            threshold (numpy array): split threshold per node; rows with x[feature] <= threshold go left
+            left (numpy array): index of the left child per node, the node itself for leaves
+            right (numpy array): index of the right child per node, the node itself for leaves
+            value (numpy array): class probabilities per node, shape (n_nodes, n_classes)
+            roots (numpy array): index of the root node of each tree
+            classes (numpy array): class labels, as model.classes_
+            max_depth (int): depth of the deepest tree
+            n_features (int): number of input features
+            fallback (.pkl model object): sklearn forest used for batches larger than max_batch
+            max_batch (int): largest batch scored by the compiled arrays when a fallback is kept
+            is_leaf (numpy array): precomputed leaf flag per node, derived from left if not given
+            children (numpy array): precomputed interleaved children, derived from left and right if not given
+            delta (numpy array): precomputed positive-class probability change from parent to node, 0 for roots
+            parent_feature (numpy array): precomputed split feature of the parent of each node, 0 for roots
+            metadata (dict): additional information stored with the forest, e.g. its feature columns
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.fallback = fallback
+        self.max_batch = max_batch
+        self.metadata = metadata if metadata is not None else {}
+        self.is_leaf = is_leaf if is_leaf is not None else left == np.arange(len(left))
+        # Left and right children interleaved, so the child of node i is _children[2 * i + went_right]
+        self._children = children if children is not None else np.column_stack([left, right]).ravel()
+        if delta is None or parent_feature is None:
+            delta, parent_feature = self._path_deltas()
+        self.delta = delta
+        self.parent_feature = parent_feature
+
+    def _path_deltas(self):
+        """
+        Derives the per-node contribution tables from the node arrays.
+
+        Returns:
+            delta (numpy array): positive-class probability of each node minus that of its parent, 0 for roots
+            parent_feature (numpy array): split feature of the parent of each node, 0 for roots
+        """
+        n_nodes = len(self.left)
+        parent = np.arange(n_nodes)
+        internal = np.flatnonzero(~self.is_leaf)
+        parent[self.left[internal]] = internal
+        parent[self.right[internal]] = internal
+        positive = self.value[:, -1]
+        delta = positive - positive[parent]
+        parent_feature = np.where(parent == np.arange(n_nodes), 0, self.feature[parent]).astype(np.intp)
+        return delta, parent_feature
+
+    @classmethod
+    def from_sklearn(cls, model, max_batch=None):
+        """
+        Flattens a fitted RandomForestClassifier.
+
+        Args:
+            model (.pkl model object): trained random forest model object
+            max_batch (int): if set, model is kept as fallback for batches with more rows than this
+
+        Returns:
+            forest (CompiledForest): compiled forest with the same probabilities as model
+        """
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            own_index = np.arange(tree.node_count) + offset
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, own_index, tree.children_left + offset))
+            rights.append(np.where(is_leaf, own_index, tree.children_right + offset))
+            # Leaf values are class counts or fractions depending on the sklearn version; normalize either way
+            value = tree.value[:, 0, :]
+            values.append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        forest = cls(feature=np.concatenate(features).astype(np.intp),
+                     threshold=np.concatenate(thresholds).astype(np.float64),
+                     left=np.concatenate(lefts).astype(np.intp),
+                     right=np.concatenate(rights).astype(np.intp),
+                     value=np.concatenate(values).astype(np.float64),
+                     roots=np.array(roots, dtype=np.intp),
+                     classes=np.asarray(model.classes_),
+                     max_depth=max_depth,
+                     n_features=model.n_features_in_ if hasattr(model, 'n_features_in_') else model.n_features_,
+                     fallback=model if max_batch is not None else None,
+                     max_batch=max_batch)
+        logger.debug(f"Compiled forest of {len(roots)} trees and {offset} nodes.")
+        return forest
+
+    def save(self, path, metadata=None):
+        """
+        Writes the forest as a directory of .npy arrays and a metadata.json file. The directory is written next to
+        path and renamed into place, so a serving process never opens a half-written forest. Between the two renames
+        path briefly does not exist; model stores keep serving the forest they have loaded until it reappears.
+
+        Args:
+            path (string): directory to write the forest to; replaced if it exists
+            metadata (dict): JSON-serializable information to store with the forest, e.g. its feature columns
+
+        Returns:
+            None
+        """
+        arrays = {'feature': self.feature, 'threshold': self.threshold, 'left': self.left, 'right': self.right,
+                  'value': self.value, 'roots': self.roots, 'classes': self.classes_, 'is_leaf': self.is_leaf,
+                  'children': self._children, 'delta': self.delta, 'parent_feature': self.parent_feature}
+        info = dict(self.metadata)
+        info.update(metadata or {})
+        info.update({'max_depth': int(self.max_depth), 'n_features': int(self.n_features),
+                     'n_estimators': self.n_estimators, 'n_nodes': len(self.feature)})
+
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(arrays[name]), allow_pickle=False)
+        with open(os.path.join(tmp_path, METADATA_FILE), 'w') as outfile:
+            json.dump(info, outfile)
+
+        # Processes that still map the old arrays keep reading them until they reload
+        old_path = f"{path}.old"
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        logger.info(f"Compiled forest of {self.n_estimators} trees and {len(self.feature)} nodes saved to {path}")
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Opens a forest written by save. With the default mmap_mode the arrays are mapped read-only rather than read,
+        so loading takes constant time and the pages are shared by every process mapping the same files.
+
+        Args:
+            path (string): directory written by save
+            mmap_mode (string): numpy memory-map mode, or None to read the arrays into memory
+
+        Returns:
+            forest (CompiledForest): forest with the stored arrays and metadata
+        """
+        with open(os.path.join(path, METADATA_FILE), 'r') as infile:
+            metadata = json.load(infile)
+        # asarray drops the memmap subclass (the mapping is kept alive as the base), so indexing returns plain arrays
+        # Exports that predate is_leaf, children, delta or parent_feature get them derived on load instead
+        arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False))
+                  for name in ARRAY_NAMES if os.path.exists(os.path.join(path, f"{name}.npy"))}
+        return cls(feature=arrays['feature'],
+                   threshold=arrays['threshold'],
+                   left=arrays['left'],
+                   right=arrays['right'],
+                   value=arrays['value'],
+                   roots=arrays['roots'],
+                   classes=arrays['classes'],
+                   max_depth=metadata['max_depth'],
+                   n_features=metadata['n_features'],
+                   is_leaf=arrays.get('is_leaf'),
+                   children=arrays.get('children'),
+                   delta=arrays.get('delta'),
+                   parent_feature=arrays.get('parent_feature'),
+                   metadata=metadata)
+
+    @property
+    def n_estimators(self):
+        """Number of trees in the forest."""
+        return len(self.roots)
+
+    def _traverse(self, X, contributions=None):
+        """
+        Walks every row down every tree, optionally accumulating the per-node deltas along the way.
+
+        Args:
+            X (numpy array or pandas DataFrame): model-ready features, shape (n_rows, n_features) or (n_features,)
+            contributions (numpy array): if given, summed positive-class deltas per row and feature are added to it,
+                shape (n_rows, n_features)
+
+        Returns:
+            leaves (numpy array): node index of the leaf per row and tree, shape (n_rows, n_estimators)
+        """
+        # The forest compares float32 features against float64 thresholds, as sklearn does
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+
+        # One entry per (row, tree) pair, row-major. Only pairs that have not reached a leaf are advanced, and they
+        # are kept in compacted arrays so each step touches no finished pairs
+        node = np.tile(self.roots, n_rows)
+        pair = np.flatnonzero(~self.is_leaf[node])
+        current = node[pair]
+        row_start = (pair // self.n_estimators) * n_features
+        while pair.size:
+            go_right = X_flat[row_start + self.feature[current]] > self.threshold[current]
+            current = self._children[2 * current + go_right]
+            if contributions is not None:
+                # row_start + feature is the flat (row, feature) cell the node's delta is attributed to
+                contributions += np.bincount(row_start + self.parent_feature[current], weights=self.delta[current],
+                                             minlength=n_rows * n_features).reshape(n_rows, n_features)
+            done = self.is_leaf[current]
+            if done.any():
+                node[pair[done]] = current[done]
+                keep = ~done
+                pair, current, row_start = pair[keep], current[keep], row_start[keep]
+        return node.reshape(n_rows, self.n_estimators)
+
+    def apply(self, X):
+        """
+        Finds the leaf reached by every row in every tree.
+
+        Args:
+            X (numpy array or pandas DataFrame): model-ready features, shape (n_rows, n_features) or (n_features,)
+
+        Returns:
+            leaves (numpy array): node index of the leaf per row and tree, shape (n_rows, n_estimators)
+        """
+        return self._traverse(X)
+
+    def contributions(self, X):
+        """
+        Splits the positive-class probability of each row into a baseline and one contribution per feature, from
+        the per-node deltas along each row's path (as in the treeinterpreter decomposition).
+
+        Args:
+            X (numpy array or pandas DataFrame): model-ready features, shape (n_rows, n_features) or (n_features,)
+
+        Returns:
+            baseline (numpy array): mean positive-class probability of the tree roots, per row
+            contributions (numpy array): change of the probability attributed to each feature, shape
+                (n_rows, n_features); baseline plus the row sum equals predict_proba(X)[:, -1]
+        """
+        n_rows = 1 if np.ndim(X) == 1 else len(X)
+        contributions = np.zeros((n_rows, self.n_features))
+        self._traverse(X, contributions)
+        baseline = np.full(n_rows, self.value[self.roots, -1].mean())
+        return baseline, contributions / self.n_estimators
+
+    def predict_proba(self, X):
+        """
+        Computes class probabilities as the mean of the leaf probabilities over all trees.
+
+        Args:
+            X (numpy array or pandas DataFrame): model-ready features, shape (n_rows, n_features) or (n_features,)
+
+        Returns:
+            proba (numpy array): class probabilities, shape (n_rows, n_classes)
+        """
+        if self.fallback is not None and len(X) > self.max_batch and np.ndim(X) == 2:
+            return self.fallback.predict_proba(X)
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        """
+        Predicts the most probable class.
+
+        Args:
+            X (numpy array or pandas DataFrame): model-ready features
+
+        Returns:
+            y_pred (numpy array): class labels
+        """
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def benchmark(model, X, repeats=20):
+    """
+    Times predict_proba of the pickled sklearn forest against its compiled counterpart.
+
+    Args:
+        model (.pkl model object): trained random forest model object
+        X (numpy array): model-ready features; the batch benchmark uses all rows, the single-row one the first row
+        repeats (int): number of timed calls per case
+
+    Returns:
+        results (dict): median latency in milliseconds per engine and case, and the maximum probability difference
+    """
+    forest = CompiledForest.from_sklearn(model)
+    cases = {'single': X[:1], 'batch': X}
+    results = {'max_abs_diff': float(np.abs(model.predict_proba(X) - forest.predict_proba(X)).max())}
+    for engine_name, engine in [('sklearn', model), ('compiled', forest)]:
+        for case_name, data in cases.items():
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                engine.predict_proba(data)
+                timings.append(time.perf_counter() - start)
+            results[f"{engine_name}_{case_name}_ms"] = float(np.median(timings) * 1000)
+    return results
+
+
+if __name__ == "__main__":
+
+    from src.predict_state import get_encoder, make_sample_campaigns, validate_user_input
+
+    # Configurations
+    model_path = config.MODEL_STORE_PATH
+
+    with open(model_path, 'rb') as infile:
+        model = pickle.load(infile)
+
+    # Encode a batch of synthetic campaigns
+    encoder = get_encoder()
+    rows = [validate_user_input(campaign, encoder.vocabularies)[0] for campaign in make_sample_campaigns(1000, random_state=0)]
+    X = encoder.encode(rows)
+
+    results = benchmark(model, X)
+    print(f"Rows in batch: {len(rows)}")
+    for name, result in results.items():
+        print(f"{name}: {result:.6g}")
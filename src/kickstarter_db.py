@@ -1,35 +1,127 @@
 
 
 import sqlalchemy as sql
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float, Boolean, MetaData, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, MetaData, DateTime, ForeignKey, Index, Text
 
 import os
+import datetime
+import threading
+import contextlib
+import pandas as pd
 from src import config
-#import logger
+from src.predict_state import CAMPAIGN_FIELDS, get_field, to_sec
+from src.predict_state import validate_user_input, validate_frame, invalid_fields_from_reasons
+import logging.config
 
-# logger = logging.getLogger(__name__)
-# logger.setLevel("INFO")
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('kickstarter_db')
 
 
 Base = declarative_base()
 
 
+def utc_now():
+    """Current time as a timezone-aware UTC datetime, stored as UTC in the DateTime columns."""
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# One engine (and so one connection pool) and session factory per database and process
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(engine_string=None):
+    """Retrieves the shared engine for a database, creating it with the configured pool settings on first use.
+
+    Engines are kept per process: a forked worker (e.g. a gunicorn worker) builds its own pool instead of reusing
+    connections opened by its parent.
+
+    Args:
+        engine_string (string): SQLAlchemy connection URI; defaults to the configured SQLite database
+
+    Returns:
+        engine (sqlalchemy Engine): engine shared by every caller in this process
+    """
+    if engine_string is None:
+        engine_string = config.SQLITE_ENGINE
+    key = (os.getpid(), engine_string)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                options = {'pool_pre_ping': config.DB_POOL_PRE_PING, 'pool_recycle': config.DB_POOL_RECYCLE}
+                # SQLite picks its own pool class, which does not take a size
+                if not engine_string.startswith('sqlite'):
+                    options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+                engine = _engines[key] = sql.create_engine(engine_string, **options)
+                logger.debug(f"Engine created for {engine.url!r}")
+    return engine
+
+
+def get_session_factory(engine_string=None):
+    """Retrieves the shared session factory for a database.
+
+    Args:
+        engine_string (string): SQLAlchemy connection URI; defaults to the configured SQLite database
+
+    Returns:
+        session_factory (sessionmaker): factory of sessions bound to the shared engine
+    """
+    engine = get_engine(engine_string)
+    session_factory = _session_factories.get(engine)
+    if session_factory is None:
+        session_factory = _session_factories.setdefault(engine, sessionmaker(bind=engine))
+    return session_factory
+
+
+@contextlib.contextmanager
+def session_scope(engine_string=None):
+    """Provides a session on the shared engine that is committed if the block succeeds, rolled back if it raises,
+    and closed either way.
+
+    Args:
+        engine_string (string): SQLAlchemy connection URI; defaults to the configured SQLite database
+
+    Yields:
+        session (sqlalchemy Session): session for the block
+    """
+    session = get_session_factory(engine_string)()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
 
 class Campaign(Base):
-    """Create a data model for the Kickstarter database to be set up for capturing campaigns. """
+    """Create a data model for the Kickstarter database to be set up for capturing campaigns.
+
+    Numeric and boolean fields are typed and hold NULL where the entry failed validation; invalid_fields names the
+    fields that failed. Valid categoricals are stored as their normalized (lowercase) level.
+    """
 
     __tablename__ = 'kickstarter'
     id = Column(Integer, primary_key=True)
-    USD_goal = Column(String(100), unique=False, nullable=False)
-    staff_pick = Column(String(100), unique=False, nullable=False)
-    category_name = Column(String(100), unique=False, nullable=False)
-    p_category_name = Column(String(100), unique=False, nullable=False)
+    created_at = Column(DateTime, unique=False, nullable=False, default=utc_now, index=True)
+    USD_goal = Column(Float, unique=False, nullable=True)
+    staff_pick = Column(Boolean, unique=False, nullable=True)
+    category_name = Column(String(100), unique=False, nullable=False, index=True)
+    p_category_name = Column(String(100), unique=False, nullable=False, index=True)
     blurb = Column(String(200), unique=False, nullable=False)
     name = Column(String(200), unique=False, nullable=False)
-    country = Column(String(100), unique=False, nullable=False)
-    num_days = Column(String(100), unique=False, nullable=False)
+    country = Column(String(100), unique=False, nullable=False, index=True)
+    num_days = Column(Integer, unique=False, nullable=True)
+    invalid_fields = Column(String(200), unique=False, nullable=True)
+    prediction_id = Column(Integer, ForeignKey('predictions.id'), unique=False, nullable=True, index=True)
+    prediction = relationship('Prediction', back_populates='campaigns')
 
     def __repr__(self):
         """Creates string representation of Campaign object."""
@@ -37,6 +129,172 @@ class Campaign(Base):
         return campaign_str
 
 
+class Prediction(Base):
+    """Prediction made for stored campaigns. Every submitted campaign is stored, but campaigns with the same
+    normalized features share one prediction per model version, which the unique index on (feature_hash,
+    model_version) finds with a single lookup."""
+
+    __tablename__ = 'predictions'
+    __table_args__ = (Index('ix_predictions_feature_hash_model_version', 'feature_hash', 'model_version', unique=True),)
+    id = Column(Integer, primary_key=True)
+    feature_hash = Column(String(64), unique=False, nullable=False)
+    model_version = Column(String(64), unique=False, nullable=False)
+    label = Column(Integer, unique=False, nullable=False)
+    probability = Column(Float, unique=False, nullable=False)
+    # JSON of the explanation (baseline and per-feature contributions), so a repeat is answered without inference
+    explanation = Column(Text, unique=False, nullable=True)
+    created_at = Column(DateTime, unique=False, nullable=False, default=utc_now)
+    campaigns = relationship('Campaign', back_populates='prediction')
+
+    def __repr__(self):
+        """Creates string representation of Prediction object."""
+        return f"<Prediction ID: {self.id}, Model version: {self.model_version}, Label: {self.label}>"
+
+
+def find_prediction(session, feature_hash, model_version):
+    """Looks up the stored prediction for a campaign's features and a model version.
+
+    Args:
+        session (sqlalchemy Session): open session
+        feature_hash (string): hash of the campaign's normalized features, as built by predict_state.feature_hash
+        model_version (string): version of the served model, as returned by predict_state.get_model_version
+
+    Returns:
+        prediction (Prediction): stored prediction, or None if these features were not scored by this model yet
+    """
+    return session.query(Prediction).filter_by(feature_hash=feature_hash, model_version=model_version).one_or_none()
+
+
+def link_stored_prediction(session, campaign):
+    """Points a campaign carrying a new prediction at the prediction already stored for its features, e.g. one
+    stored by an earlier or concurrent request, so the campaign can be written without clashing with the unique
+    index.
+
+    Args:
+        session (sqlalchemy Session): open session, e.g. after a transaction that clashed was rolled back
+        campaign (Campaign): campaign carrying a prediction that is not stored
+
+    Returns:
+        linked (boolean): True if the campaign now references the stored prediction and can be added again
+    """
+    prediction = getattr(campaign, 'prediction', None)
+    if prediction is None or prediction.id is not None:
+        return False
+    stored = find_prediction(session, prediction.feature_hash, prediction.model_version)
+    if stored is None:
+        return False
+    campaign.prediction = stored
+    # SQLAlchemy 1.3 cascades the replaced prediction into the session along the backref; it must not be inserted
+    if prediction in session:
+        session.expunge(prediction)
+    return True
+
+
+def list_campaigns(session, limit, before_id=None, **filters):
+    """Lists stored campaigns with their predictions, newest first, one page at a time.
+
+    Pages are keyed on the primary key rather than skipped with OFFSET: the next page starts below the last id of
+    the previous one, so each page costs an index range scan of limit rows however deep it is. Filters on country,
+    category_name or p_category_name are answered by their indexes, which also hold the id.
+
+    Args:
+        session (sqlalchemy Session): open session
+        limit (int): maximum number of campaigns on the page
+        before_id (int): only list campaigns with a smaller id; None lists from the newest campaign
+        **filters: normalized levels to match, keyed by country, category_name or p_category_name
+
+    Returns:
+        page (list[tuple]): Campaign and its Prediction (None if it has none) per campaign, by descending id
+    """
+    query = session.query(Campaign, Prediction).outerjoin(Prediction, Campaign.prediction_id == Prediction.id)
+    if before_id is not None:
+        query = query.filter(Campaign.id < before_id)
+    for field, level in filters.items():
+        query = query.filter(getattr(Campaign, field) == level)
+    return query.order_by(Campaign.id.desc()).limit(limit).all()
+
+
+def to_text(value):
+    """Stores a raw entry in a string column: missing values as empty strings, anything else as its str()."""
+    if isinstance(value, str):
+        return value
+    if value is None or pd.isna(value):
+        return ''
+    return str(value)
+
+
+def campaign_columns(user_input, features, invalid_fields):
+    """Builds the Campaign columns of one campaign from its validation result.
+
+    Args:
+        user_input (dict or object): raw campaign fields, as typed into the form
+        features (dict): normalized feature values, as returned by validate_user_input
+        invalid_fields (list[string]): names of the campaign fields that failed validation
+
+    Returns:
+        columns (dict): Campaign column values; typed fields are None and categoricals keep their raw entry where
+            invalid
+    """
+    columns = {
+        'name': to_text(get_field(user_input, 'name')),
+        'blurb': to_text(get_field(user_input, 'blurb')),
+        'USD_goal': None if 'USD_goal' in invalid_fields else float(features['USD_goal']),
+        'num_days': None if 'num_days' in invalid_fields else int(features['time_elapsed']) // to_sec(1),
+        'staff_pick': None if 'staff_pick' in invalid_fields else bool(features['staff_pick']),
+        'invalid_fields': ','.join(invalid_fields) or None,
+    }
+    for field in ['country', 'category_name', 'p_category_name']:
+        columns[field] = to_text(get_field(user_input, field)) if field in invalid_fields else features[field]
+    return columns
+
+
+def make_campaign(user_input):
+    """Validates raw campaign fields and builds the Campaign to store.
+
+    Args:
+        user_input (dict or object): raw campaign fields, e.g. a form submission or argparse args
+
+    Returns:
+        campaign (Campaign): typed campaign, with its validation failures in invalid_fields
+    """
+    features, invalid_fields = validate_user_input(user_input)
+    return Campaign(**campaign_columns(user_input, features, invalid_fields))
+
+
+def make_campaign_records(data):
+    """Validates a dataframe of raw campaign fields column by column and builds the Campaign column mappings to
+    insert, as make_campaign does per campaign.
+
+    Args:
+        data (Pandas DataFrame): raw campaign fields, one row per campaign
+
+    Returns:
+        records (list[dict]): Campaign column values per campaign
+    """
+    features, reasons = validate_frame(data)
+    return [campaign_columns(user_input, row_features, invalid_fields)
+            for user_input, row_features, invalid_fields in zip(data.to_dict(orient='records'),
+                                                                features.to_dict(orient='records'),
+                                                                invalid_fields_from_reasons(reasons))]
+
+
+class IngestCheckpoint(Base):
+    """Records how many rows of an ingested file have been committed, updated in the same transaction as each
+    chunk so an interrupted ingest resumes after the last committed chunk. The fingerprint (size and modification
+    time) tells whether the file at that path is still the one the rows came from."""
+
+    __tablename__ = 'ingest_checkpoint'
+    source = Column(String(500), primary_key=True)
+    fingerprint = Column(String(100), unique=False, nullable=False)
+    rows_committed = Column(Integer, unique=False, nullable=False)
+    completed = Column(Boolean, unique=False, nullable=False)
+    updated_at = Column(DateTime, unique=False, nullable=False)
+
+    def __repr__(self):
+        """Creates string representation of IngestCheckpoint object."""
+        return f"<IngestCheckpoint Source: {self.source}, Rows committed: {self.rows_committed}>"
+
+
 def create_db(args):
     """Creates kickstarter database schema either locally or in RDS.
 
@@ -46,29 +304,14 @@ def create_db(args):
     Returns:
         None
     """
-    db_engine = sql.create_engine(args.engine_string)
-    Base.metadata.create_all(db_engine)
-
-    Session = sessionmaker(bind=db_engine)
-    session = Session()
-
+    Base.metadata.create_all(get_engine(args.engine_string))
 
-    campaign = Campaign(
-                        name=args.name,
-                        blurb=args.blurb,
-                        USD_goal=args.USD_goal,
-                        num_days=args.num_days,
-                        country=args.country,
-                        category_name=args.category_name,
-                        p_category_name=args.p_category_name,
-                        staff_pick=args.staff_pick
-                        )
+    campaign = make_campaign(args)
 
-    session.add(campaign)
-    session.commit()
+    with session_scope(args.engine_string) as session:
+        session.add(campaign)
 
-
-    #logger.info("Kickstarter database created!")
+    logger.info("Kickstarter database created!")
 
 
 
@@ -83,28 +326,89 @@ def add_campaign(args):
     Returns:
         None
     """
-    db_engine = sql.create_engine(args.engine_string)
+    campaign = make_campaign(args)
+
+    with session_scope(args.engine_string) as session:
+        session.add(campaign)
+    logger.info(f"{args.name} Kickstarter campaign added to database!")
 
-    Session = sessionmaker(bind=db_engine)
-    session = Session()
 
-    campaign = Campaign(name=args.name,
-                        blurb=args.blurb,
-                        USD_goal=args.USD_goal,
-                        num_days=args.num_days,
-                        country=args.country,
-                        category_name=args.category_name,
-                        p_category_name=args.p_category_name,
-                        staff_pick=args.staff_pick
-                        )
+LEGACY_TABLE = 'kickstarter_v1'
+LEGACY_COLUMNS = ['id'] + CAMPAIGN_FIELDS
 
-    session.add(campaign)
-    session.commit()
-    session.close()
-    #logger.info(f"{name} Kickstarter campaign added to database!")
 
+def migrate_campaigns(engine_string=None, batch_size=1000):
+    """
+    Migrates a kickstarter table with the original all-string schema to the typed, indexed Campaign schema.
 
+    The original table is renamed to LEGACY_TABLE and its rows are validated and copied into the new table in
+    batches of ascending id, one transaction per batch, keeping their ids. Rows created before the migration get
+    the time of the migration as created_at. An interrupted migration, whether it stopped between the rename and
+    the creation of the new table or after any committed batch, resumes after the last copied id when run again;
+    the legacy table is dropped once every row was copied. Run it while the app is not writing campaigns.
 
+    Ids are copied explicitly, which SQLite and MySQL follow with their next generated id; on PostgreSQL the id
+    sequence would have to be reset after the migration.
 
+    Args:
+        engine_string (string): SQLAlchemy connection URI; defaults to the configured SQLite database
+        batch_size (int): number of rows validated and copied per transaction
 
+    Returns:
+        report (dict): number of rows copied and of those with validation failures
+    """
+    engine = get_engine(engine_string)
+    inspector = sql.inspect(engine)
+    tables = inspector.get_table_names()
+    if Campaign.__tablename__ in tables and LEGACY_TABLE not in tables:
+        if 'created_at' in [column['name'] for column in inspector.get_columns(Campaign.__tablename__)]:
+            Base.metadata.create_all(engine)
+            logger.info("Kickstarter table already has the typed schema; created any missing tables.")
+            return {'rows': 0, 'invalid': 0}
+        with engine.begin() as connection:
+            connection.execute(sql.text(f"ALTER TABLE {Campaign.__tablename__} RENAME TO {LEGACY_TABLE}"))
+        logger.info(f"Renamed {Campaign.__tablename__} to {LEGACY_TABLE}.")
+    elif LEGACY_TABLE not in tables:
+        Base.metadata.create_all(engine)
+        logger.info("No kickstarter table to migrate; created the typed schema.")
+        return {'rows': 0, 'invalid': 0}
+    Base.metadata.create_all(engine)
+
+    migrated_at = utc_now()
+    select = sql.text(f"SELECT {', '.join(LEGACY_COLUMNS)} FROM {LEGACY_TABLE} WHERE id > :last_id "
+                      f"ORDER BY id LIMIT :batch_size")
+    with session_scope(engine_string) as session:
+        last_id = session.query(sql.func.max(Campaign.id)).scalar() or 0
+    report = {'rows': 0, 'invalid': 0}
+    while True:
+        with session_scope(engine_string) as session:
+            rows = session.execute(select, {'last_id': last_id, 'batch_size': batch_size}).fetchall()
+            if not rows:
+                break
+            batch = pd.DataFrame([tuple(row) for row in rows], columns=LEGACY_COLUMNS)
+            records = make_campaign_records(batch[CAMPAIGN_FIELDS])
+            for record, campaign_id in zip(records, batch['id']):
+                record.update(id=int(campaign_id), created_at=migrated_at)
+            session.bulk_insert_mappings(Campaign, records)
+        last_id = int(batch['id'].iloc[-1])
+        report['rows'] += len(records)
+        report['invalid'] += sum(1 for record in records if record['invalid_fields'])
+        logger.info(f"Migrated campaigns up to id {last_id}.")
+
+    with engine.begin() as connection:
+        connection.execute(sql.text(f"DROP TABLE {LEGACY_TABLE}"))
+    logger.info(f"Migrated {report['rows']} campaigns ({report['invalid']} with validation failures); "
+                f"dropped {LEGACY_TABLE}.")
+    return report
+
+
+def migrate_db(args):
+    """Migrates the kickstarter table to the typed, indexed schema.
 
+    Args:
+        args (Argparse args): includes engine_string and batch_size
+
+    Returns:
+        None
+    """
+    migrate_campaigns(args.engine_string, batch_size=args.batch_size)
@@ -0,0 +1,245 @@
+import json
+import time
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src import config
+from src.predict_state import make_sample_campaigns, CAMPAIGN_FIELDS
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('load_test')
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Report entries where a larger value is worse, checked by compare_reports
+REGRESSION_KEYS = ('p50_ms', 'p95_ms', 'p99_ms', 'error_rate')
+
+
+def make_payloads(n, invalid_rate=0.05, random_state=None):
+    """
+    Generates campaign payloads as users type them into the form: levels drawn from the level files in
+    data/internal/ with form-style capitalization, and a fraction of campaigns with one invalid field.
+
+    Args:
+        n (int): number of payloads
+        invalid_rate (float): fraction of payloads with one invalid field
+        random_state (int): seed for reproducible payloads
+
+    Returns:
+        payloads (list[dict]): campaign fields per payload
+    """
+    rng = np.random.RandomState(random_state)
+    payloads = make_sample_campaigns(n, random_state=random_state)
+    for payload in payloads:
+        payload['country'] = payload['country'].upper()
+        payload['category_name'] = payload['category_name'].title()
+        payload['p_category_name'] = payload['p_category_name'].title()
+        payload['staff_pick'] = payload['staff_pick'].title()
+        if rng.rand() < invalid_rate:
+            field = CAMPAIGN_FIELDS[rng.randint(len(CAMPAIGN_FIELDS))]
+            payload[field] = "" if field not in ('USD_goal', 'num_days') else "a lot"
+    return payloads
+
+
+def save_payloads(payloads, path):
+    """
+    Writes payloads as NDJSON so a load test can be replayed with exactly the same requests.
+
+    Args:
+        payloads (list[dict]): campaign fields per payload
+        path (string): path of the NDJSON file
+
+    Returns:
+        None
+    """
+    with open(path, 'w') as outfile:
+        for payload in payloads:
+            outfile.write(json.dumps(payload) + "\n")
+    logger.info(f"{len(payloads)} payloads saved to {path}")
+
+
+def load_payloads(path):
+    """
+    Reads payloads written by save_payloads.
+
+    Args:
+        path (string): path of the NDJSON file
+
+    Returns:
+        payloads (list[dict]): campaign fields per payload
+    """
+    with open(path, 'r') as infile:
+        return [json.loads(line) for line in infile if line.strip()]
+
+
+def make_sender(endpoint, url=None, persist=False):
+    """
+    Builds a function that sends one payload to the app and returns the status code. Each thread gets its own
+    client, as neither the Flask test client nor a requests session may be shared between threads.
+
+    In-process, the app stores campaigns submitted to /output in the configured database, so persistence is turned
+    off unless asked for, to keep synthetic campaigns out of it.
+
+    Args:
+        endpoint (string): '/output' (form post) or '/predict' (JSON post)
+        url (string): base URL of a running server, e.g. http://127.0.0.1:5000; None sends in-process through the
+            Flask test client
+        persist (boolean): in-process only, keep storing submitted campaigns through the write-behind writer
+
+    Returns:
+        send (callable): sends a payload dictionary and returns the HTTP status code
+    """
+    local = threading.local()
+    if url is None:
+        # Importing the app starts its warmup; wait for it so the first requests are not measured cold
+        import app as flask_app
+        if flask_app.warmup_thread is not None:
+            flask_app.warmup_thread.join()
+        flask_app.app.config['PERSIST_CAMPAIGNS'] = flask_app.app.config['PERSIST_CAMPAIGNS'] and persist
+
+    def get_client():
+        client = getattr(local, 'client', None)
+        if client is None:
+            if url is None:
+                client = local.client = flask_app.app.test_client()
+            else:
+                import requests
+                client = local.client = requests.Session()
+        return client
+
+    def send(payload):
+        client = get_client()
+        target = endpoint if url is None else url.rstrip('/') + endpoint
+        if endpoint == '/predict':
+            response = client.post(target, json=payload)
+        else:
+            response = client.post(target, data=payload)
+        return response.status_code
+
+    return send
+
+
+def summarize(latencies, statuses, elapsed):
+    """
+    Summarizes a load test run.
+
+    Args:
+        latencies (list[float]): number of seconds taken per request
+        statuses (list[int or string]): status code per request, or the exception name if it raised
+        elapsed (float): wall time of the run in seconds
+
+    Returns:
+        report (dict): request count, throughput, latency percentiles in milliseconds, error rate and status counts
+    """
+    latencies_ms = np.array(latencies) * 1000
+    errors = sum(1 for status in statuses if not isinstance(status, int) or status >= 500)
+    report = {'requests': len(statuses),
+              'elapsed_s': elapsed,
+              'throughput_rps': len(statuses) / elapsed if elapsed else 0.0}
+    for percentile in PERCENTILES:
+        report[f"p{percentile}_ms"] = float(np.percentile(latencies_ms, percentile)) if len(latencies_ms) else None
+    report['max_ms'] = float(latencies_ms.max()) if len(latencies_ms) else None
+    report['errors'] = errors
+    report['error_rate'] = errors / len(statuses) if statuses else 0.0
+    report['statuses'] = {str(status): statuses.count(status) for status in sorted(set(statuses), key=str)}
+    return report
+
+
+def run_load_test(payloads, send, concurrency=8):
+    """
+    Sends every payload once from concurrency threads and measures each request.
+
+    Args:
+        payloads (list[dict]): campaign fields per payload
+        send (callable): sends a payload and returns the status code, as built by make_sender
+        concurrency (int): number of requests in flight at once
+
+    Returns:
+        report (dict): summary of the run, as built by summarize
+    """
+    def timed(payload):
+        start = time.perf_counter()
+        try:
+            status = send(payload)
+        except Exception as error:
+            status = type(error).__name__
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, payloads))
+    elapsed = time.perf_counter() - start
+
+    report = summarize([latency for latency, _ in results], [status for _, status in results], elapsed)
+    report['concurrency'] = concurrency
+    return report
+
+
+def compare_reports(report, baseline, tolerance=0.1):
+    """
+    Compares a load test report against a baseline report from an earlier release.
+
+    Args:
+        report (dict): report of the current run
+        baseline (dict): report of the baseline run
+        tolerance (float): allowed relative increase of latency and error rate, and decrease of throughput
+
+    Returns:
+        regressions (list[string]): description of every metric that regressed beyond the tolerance
+    """
+    regressions = []
+    for key in REGRESSION_KEYS:
+        current, previous = report.get(key), baseline.get(key)
+        if current is None or previous is None:
+            continue
+        if current > previous * (1 + tolerance) and current - previous > 1e-9:
+            regressions.append(f"{key}: {previous:.4g} -> {current:.4g}")
+    if report['throughput_rps'] < baseline['throughput_rps'] * (1 - tolerance):
+        regressions.append(f"throughput_rps: {baseline['throughput_rps']:.4g} -> {report['throughput_rps']:.4g}")
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Load test the prediction service")
+    parser.add_argument("--url", default=None, help="Base URL of a running server; in-process test client if not set")
+    parser.add_argument("--persist", action="store_true",
+                        help="In-process only: store submitted campaigns in the configured database")
+    parser.add_argument("--endpoint", default="/output", choices=["/output", "/predict"], help="Endpoint to load")
+    parser.add_argument("--requests", type=int, default=1000, help="Number of generated payloads")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of requests in flight at once")
+    parser.add_argument("--invalid_rate", type=float, default=0.05, help="Fraction of payloads with an invalid field")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated payloads")
+    parser.add_argument("--payloads", default=None, help="NDJSON payloads to replay instead of generating new ones")
+    parser.add_argument("--save_payloads", default=None, help="Path to save the generated payloads to for replay")
+    parser.add_argument("--report", default=None, help="Path to save the JSON report to")
+    parser.add_argument("--baseline", default=None, help="JSON report of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression versus baseline")
+    args = parser.parse_args()
+
+    if args.payloads:
+        payloads = load_payloads(args.payloads)
+    else:
+        payloads = make_payloads(args.requests, invalid_rate=args.invalid_rate, random_state=args.seed)
+    if args.save_payloads:
+        save_payloads(payloads, args.save_payloads)
+
+    # Keep per-request logging of the in-process app out of the measurement
+    logging.disable(logging.WARNING)
+    report = run_load_test(payloads, make_sender(args.endpoint, args.url, args.persist), concurrency=args.concurrency)
+    logging.disable(logging.NOTSET)
+
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as infile:
+            regressions = compare_reports(report, json.load(infile), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
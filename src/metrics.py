@@ -0,0 +1,278 @@
+import bisect
+import threading
+import time
+from src import config
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('metrics')
+
+# Upper bounds in seconds of the latency buckets, from sub-millisecond model calls to multi-second batches
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def format_labels(label_names, labels, extra=None):
+    """
+    Formats a label set in Prometheus text syntax.
+
+    Args:
+        label_names (list[string]): names of the labels
+        labels (tuple): values of the labels, in the same order
+        extra (tuple): optional additional (name, value) label pair
+
+    Returns:
+        text (string): e.g. '{stage="predict"}', or an empty string if there are no labels
+    """
+    pairs = [(name, value) for name, value in zip(label_names, labels)]
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter(object):
+    """Monotonic counter per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, registry, name, help_text, label_names=()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label_names = list(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """Adds amount to the counter of the given label values."""
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        """Current value for the given label values."""
+        return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.label_names, labels)} {value}" for labels, value in values]
+
+
+class Gauge(Counter):
+    """Value per label set that is overwritten rather than accumulated."""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        """Sets the gauge of the given label values."""
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(object):
+    """
+    Latency histogram per label set with fixed buckets. Observing a value is one binary search and one increment;
+    quantiles are estimated from the buckets by linear interpolation.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label_names = list(label_names)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """Records one observation for the given label values."""
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        """Number of observations for the given label values."""
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def quantile(self, q, *labels):
+        """
+        Estimates a quantile of the observations.
+
+        Args:
+            q (float): quantile between 0 and 1
+            *labels: label values of the series
+
+        Returns:
+            value (float): estimated quantile, or None if nothing was observed
+        """
+        with self._lock:
+            series = self._series.get(labels)
+            if not series or series[2] == 0:
+                return None
+            bucket_counts, _, count = list(series[0]), series[1], series[2]
+        rank = q * count
+        cumulative = 0
+        for i, bucket_count in enumerate(bucket_counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = []
+        with self._lock:
+            series = sorted((labels, (list(values[0]), values[1], values[2])) for labels, values in self._series.items())
+        for labels, (bucket_counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {count}")
+        return lines
+
+    def render_quantiles(self):
+        """Renders the p50/p95/p99 estimates as a Prometheus gauge family named <name>_quantile."""
+        lines = []
+        for labels in sorted(self._series):
+            for q in QUANTILES:
+                value = self.quantile(q, *labels)
+                lines.append(f"{self.name}_quantile{format_labels(self.label_names, labels, ('quantile', q))} {value}")
+        return lines
+
+
+class Timer(object):
+    """Context manager that observes its elapsed wall time into a histogram."""
+
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class NullTimer(object):
+    """Context manager that does nothing, handed out while metrics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+# Shared no-op context manager handed out while metrics are disabled
+NULL_TIMER = NullTimer()
+
+
+class MetricsRegistry(object):
+    """Collection of metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self, enabled=True):
+        """
+        Args:
+            enabled (boolean): if False every metric operation is a no-op
+        """
+        self.enabled = enabled
+        self._metrics = {}
+
+    def _get_or_create(self, metric_class, name, help_text, label_names):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = metric_class(self, name, help_text, label_names)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get_or_create(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=()):
+        return self._get_or_create(Histogram, name, help_text, label_names)
+
+    def timer(self, histogram, *labels):
+        """
+        Times a block of code into a histogram.
+
+        Args:
+            histogram (Histogram): histogram receiving the elapsed seconds
+            *labels: label values of the series
+
+        Returns:
+            timer (context manager): Timer, or a shared no-op context manager if metrics are disabled
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(histogram, labels)
+
+    def render(self):
+        """
+        Renders all metrics.
+
+        Returns:
+            text (string): Prometheus text exposition of every metric
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+            if isinstance(metric, Histogram):
+                lines.append(f"# HELP {metric.name}_quantile Estimated p50/p95/p99 of {metric.name}")
+                lines.append(f"# TYPE {metric.name}_quantile gauge")
+                lines.extend(metric.render_quantiles())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(enabled=config.METRICS_ENABLED)
+
+STAGE_SECONDS = REGISTRY.histogram('kickstarter_stage_seconds', "Time spent in each stage of a prediction.", ['stage'])
+REQUEST_SECONDS = REGISTRY.histogram('kickstarter_request_seconds', "Time spent handling a request.", ['endpoint'])
+INVALID_INPUTS = REGISTRY.counter('kickstarter_invalid_inputs_total', "Invalid campaign fields submitted.", ['field'])
+PREDICTIONS = REGISTRY.counter('kickstarter_predictions_total', "Predictions made per predicted state.", ['predicted_state'])
+
+
+def timer(stage):
+    """
+    Times a stage of the prediction path.
+
+    Args:
+        stage (string): name of the stage, e.g. 'validate' or 'predict'
+
+    Returns:
+        timer (context manager): times the enclosed block into kickstarter_stage_seconds
+    """
+    return REGISTRY.timer(STAGE_SECONDS, stage)
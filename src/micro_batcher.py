@@ -0,0 +1,274 @@
+import asyncio
+import time
+import numpy as np
+from src import config
+from src import predict_state
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('micro_batcher')
+
+
+class MicroBatcher(object):
+    """
+    Collects items submitted by concurrent coroutines and scores them together.
+
+    A batch is closed once it holds max_batch_size items or max_wait seconds after its first item arrived, whichever
+    comes first, and is scored with one call of score_batch in a worker thread so the event loop keeps accepting
+    requests meanwhile. Items arriving while a batch is being scored form the next batch, so under load batches
+    fill up without waiting at all.
+    """
+
+    def __init__(self, score_batch, max_batch_size=64, max_wait=0.002):
+        """
+        Args:
+            score_batch (callable): scores a list of items and returns one result per item, in the same order
+            max_batch_size (int): maximum number of items scored per call
+            max_wait (float): maximum number of seconds the first item of a batch waits for more items
+        """
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Starts the batching task on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stops the batching task and fails the items still waiting in the queue."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped."))
+        self._task = None
+
+    async def submit(self, item):
+        """
+        Queues an item for the next batch and waits for its result.
+
+        Args:
+            item (object): item to score, e.g. a campaign dictionary
+
+        Returns:
+            result (object): result of score_batch for the item
+        """
+        if self._task is None:
+            self.start()
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self):
+        """
+        Waits for the next batch of queued items.
+
+        Returns:
+            batch (list[tuple]): up to max_batch_size (item, future) pairs
+        """
+        loop = asyncio.get_event_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        """
+        Background loop that scores batches and resolves the futures of their items. A batch that fails is scored
+        again one item at a time, so one bad item fails only its own caller and not the others batched with it.
+        """
+        while True:
+            batch = await self._collect()
+            try:
+                await self._score(batch)
+            except Exception as error:
+                if len(batch) == 1:
+                    logger.error(f"Item could not be scored: {error!r}")
+                    self._fail(batch, error)
+                    continue
+                logger.warning(f"Batch of {len(batch)} items could not be scored ({error!r}); scoring them one by one.")
+                for pair in batch:
+                    try:
+                        await self._score([pair])
+                    except Exception as item_error:
+                        logger.error(f"Item could not be scored: {item_error!r}")
+                        self._fail([pair], item_error)
+
+    async def _score(self, batch):
+        """
+        Scores a batch with one call of score_batch in a worker thread and resolves the futures of its items.
+
+        Args:
+            batch (list[tuple]): (item, future) pairs
+
+        Returns:
+            None
+
+        Raises:
+            Exception: whatever score_batch raised; the futures are then left unresolved
+        """
+        items = [item for item, _ in batch]
+        results = await asyncio.get_event_loop().run_in_executor(None, self.score_batch, items)
+        self.batches += 1
+        self.items += len(items)
+        for (_, future), result in zip(batch, results):
+            # A caller that gave up (e.g. a dropped connection) leaves a cancelled future behind
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch, error):
+        """Fails the futures of a batch that could not be scored."""
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self):
+        """
+        Reports the batches scored so far.
+
+        Returns:
+            stats (dict): number of batches and items scored, and the mean batch size
+        """
+        return {'batches': self.batches, 'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0}
+
+
+def score_campaigns(user_inputs, explain=False):
+    """
+    Scores a batch of campaigns with a single model call and builds one prediction record per campaign.
+
+    Args:
+        user_inputs (list[dict]): campaign records to score
+        explain (boolean): add the explanation of each prediction, from the same model call
+
+    Returns:
+        records (list[dict]): prediction record per campaign, as built by make_prediction_record
+    """
+    scored = predict_state.process_user_inputs(user_inputs, explain=explain)
+    return [predict_state.make_prediction_record(*record) for record in zip(*scored)]
+
+
+def explain_campaigns(user_inputs):
+    """
+    Scores and explains a batch of campaigns with a single model call, as score_campaigns with explain.
+
+    Args:
+        user_inputs (list[dict]): campaign records to score
+
+    Returns:
+        records (list[dict]): explained prediction record per campaign
+    """
+    return score_campaigns(user_inputs, explain=True)
+
+
+def run_in_new_loop(coroutine):
+    """
+    Runs a coroutine to completion on a new event loop and closes the loop, as asyncio.run does from Python 3.7.
+
+    Args:
+        coroutine (coroutine): coroutine to run
+
+    Returns:
+        result (object): result of the coroutine
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def run_clients(score, campaigns, concurrency):
+    """
+    Scores campaigns from concurrent clients that each send one request at a time.
+
+    Args:
+        score (coroutine function): scores one campaign
+        campaigns (list[dict]): campaign records to score, split evenly over the clients
+        concurrency (int): number of concurrent clients
+
+    Returns:
+        elapsed (float): number of seconds taken to score all campaigns
+        latencies (list[float]): number of seconds taken per request
+    """
+    latencies = []
+
+    async def client(requests):
+        for campaign in requests:
+            start = time.perf_counter()
+            await score(campaign)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(campaigns[i::concurrency]) for i in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def benchmark(campaigns, concurrency, max_batch_size, max_wait):
+    """
+    Compares scoring every request on its own with micro-batching at the same concurrency.
+
+    Args:
+        campaigns (list[dict]): campaign records to score
+        concurrency (int): number of concurrent clients
+        max_batch_size (int): maximum number of items per micro-batch
+        max_wait (float): maximum number of seconds a micro-batch waits for more items
+
+    Returns:
+        results (dict): throughput in requests per second and p50/p99 latency in milliseconds per path
+    """
+    loop = asyncio.get_event_loop()
+
+    async def score_alone(campaign):
+        return (await loop.run_in_executor(None, score_campaigns, [campaign]))[0]
+
+    batcher = MicroBatcher(score_campaigns, max_batch_size=max_batch_size, max_wait=max_wait)
+    results = {}
+    for name, score in [('single', score_alone), ('batched', batcher.submit)]:
+        elapsed, latencies = await run_clients(score, campaigns, concurrency)
+        results[f"{name}_requests_per_s"] = len(campaigns) / elapsed
+        results[f"{name}_p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+        results[f"{name}_p99_ms"] = float(np.percentile(latencies, 99) * 1000)
+    results['mean_batch_size'] = batcher.stats()['mean_batch_size']
+    await batcher.stop()
+    return results
+
+
+if __name__ == "__main__":
+
+    # Keep per-request logging out of the measurement
+    logging.disable(logging.WARNING)
+
+    # Score distinct campaigns with the prediction cache off, so every request reaches the model
+    campaigns = predict_state.make_sample_campaigns(4000, random_state=0)
+    predict_state.get_prediction_cache().max_size = 0
+    predict_state.warmup()
+
+    for concurrency in [1, 8, 32, 128]:
+        results = run_in_new_loop(benchmark(campaigns, concurrency, config.MICRO_BATCH_MAX_SIZE,
+                                            config.MICRO_BATCH_MAX_WAIT))
+        print(f"Concurrency: {concurrency}")
+        for name, result in results.items():
+            print(f"  {name}: {result:.6g}")
@@ -1,4 +1,5 @@
 
+import os
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
@@ -107,8 +108,11 @@ def train_model(X_train, y_train, model_path, **kwargs):
     model = model.fit(X_train, y_train)
 
     try:
-        with open(model_path, "wb") as outfile:
+        # Write to a sibling file and rename so a serving process never reads a half-written model
+        tmp_path = f"{model_path}.tmp"
+        with open(tmp_path, "wb") as outfile:
             pickle.dump(model, outfile)
+        os.replace(tmp_path, model_path)
         logger.info("Model object saved to local path.")
     except:
         logger.error("Model object not saved! Please check paths.")
@@ -116,21 +120,40 @@ def train_model(X_train, y_train, model_path, **kwargs):
     return model
 
 
-def run_model(model, X_test):
+def predict_with_threshold(model, X, threshold=0.5):
+    """
+    Scores data with a single pass over the forest and derives class labels from the positive-class probability.
+    A probability strictly above the threshold is labeled positive, so a threshold of 0.5 reproduces model.predict.
+
+    Args:
+        model (.pkl model object): Trained random forest model object
+        X (numpy array or pandas DataFrame): Model-ready kickstarter features
+        threshold (float): Decision threshold on the positive-class probability
+
+    Returns:
+        ypred_proba (numpy array): raw predicted probabilities of the positive class
+        ypred_binary (numpy array): binary class predictions
+    """
+    ypred_proba = model.predict_proba(X)[:, 1]
+    ypred_binary = model.classes_[(ypred_proba > threshold).astype(int)]
+    return ypred_proba, ypred_binary
+
+
+def run_model(model, X_test, threshold=0.5):
     """
     Runs and scores trained model on testing data features.
 
     Args:
         model (.pkl model object): Trained random forest model object
         X_test (pandas DataFrame): Test dataset of kickstarter features used in model
+        threshold (float): Decision threshold on the positive-class probability
 
     Returns:
         ypred_proba_test (numpy array): raw predicted probabilities array for test set
         ypred_binary_test (numpy array): binary class predictions array for test set
     """
 
-    ypred_proba_test = model.predict_proba(X_test)[:,1]
-    ypred_binary_test = model.predict(X_test)
+    ypred_proba_test, ypred_binary_test = predict_with_threshold(model, X_test, threshold)
     logger.debug("Model fitted and scored on test data.")
 
     return ypred_proba_test, ypred_binary_test
@@ -203,6 +226,8 @@ def get_findings(X_train_features, model, importances_path):
 
 if __name__=="__main__":
 
+    from src.predict_state import export_model
+
     # Get configuration variables
     cleaned_path = config.CLEANED_STORE_PATH
     numerical = config.NUMERICAL
@@ -214,6 +239,7 @@ if __name__=="__main__":
     model_path = config.MODEL_STORE_PATH
     metrics_path = config.MODEL_METRICS_PATH
     features_path = config.MODEL_FEATURES_PATH
+    decision_threshold = config.DECISION_THRESHOLD
 
     # Get features and response from cleaned data
     df_features, df_response = get_features(data_path=cleaned_path, response=response, numerical=numerical, categorical=categorical)
@@ -224,8 +250,11 @@ if __name__=="__main__":
     # Train and save model
     model = train_model(X_train=X_train, y_train=y_train, model_path=model_path, **model_parameters)
 
+    # Export memory-mappable model arrays for serving
+    export_model(model=model, export_path=config.MODEL_ARRAYS_PATH)
+
     # Run model
-    ypred_proba_test, ypred_binary_test = run_model(model=model, X_test=X_test)
+    ypred_proba_test, ypred_binary_test = run_model(model=model, X_test=X_test, threshold=decision_threshold)
 
     # Evaluate model
     auc, confusion, accuracy = evaluate_model(ypred_proba_test=ypred_proba_test, ypred_binary_test=ypred_binary_test, y_test=y_test, metrics_path=metrics_path)
@@ -1,8 +1,18 @@
 
+import os
+import abc
+import json
 import pickle
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from src import config
+from src.model_dev import predict_with_threshold
+from src.forest_engine import CompiledForest, METADATA_FILE
+from src import metrics
 from sklearn.ensemble import RandomForestClassifier
 import logging.config
 
@@ -24,8 +34,13 @@ def process_USD_goal(goal_entry):
     """
     invalid_flag = False
     try:
-        goal_entry = float(goal_entry)
-    except ValueError:
+        goal = float(goal_entry)
+        # NaN and infinite goals parse but cannot be scored
+        if np.isfinite(goal):
+            goal_entry = goal
+        else:
+            invalid_flag = True
+    except (TypeError, ValueError, OverflowError):
         invalid_flag = True
     if not invalid_flag:
         logger.debug(f"USD_goal is valid.")
@@ -82,13 +97,207 @@ def get_column_levels(levels_path):
         logger.warning("Column levels path not found!")
     return vals
 
+class ArtifactCache(abc.ABC):
+    """
+    Process-wide cache for an object loaded from a file. The object is loaded once and reused; the file's
+    modification time and size are checked at most every check_interval seconds and the object is reloaded
+    when they change. Subclasses define how the object is loaded by implementing _load.
+    """
+
+    def __init__(self, path, check_interval=0):
+        """
+        Args:
+            path (string): path to the artifact on disk
+            check_interval (float): minimum number of seconds between checks of the artifact on disk
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._last_check = None
+        # (version stamp, object) is swapped as a single reference so readers never see a torn pair
+        self._state = (None, None)
+
+    def _stamp(self):
+        """
+        Builds the version stamp of the artifact.
+
+        Returns:
+            stamp (tuple): modification time in nanoseconds and size in bytes of the artifact
+        """
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @abc.abstractmethod
+    def _load(self):
+        """
+        Loads the object from the artifact.
+
+        Returns:
+            obj (object): object read from self.path
+        """
+
+    @property
+    def version(self):
+        """Version stamp of the currently loaded object, or None if nothing has been loaded."""
+        return self._state[0]
+
+    def snapshot(self, recheck=False):
+        """
+        Returns the loaded object together with its version stamp, (re)loading it first if the artifact changed
+        since the last load. The pair is read as one reference, so the version always describes the object returned
+        with it. If the artifact cannot be read or loaded once an object is loaded, the loaded object keeps being
+        served.
+
+        Args:
+            recheck (boolean): check the artifact on disk even if it was checked less than check_interval seconds ago
+
+        Returns:
+            version (tuple): version stamp of obj
+            obj (object): object read from self.path
+        """
+        state = self._state
+        now = time.monotonic()
+        if (not recheck and state[0] is not None and self._last_check is not None
+                and now - self._last_check < self.check_interval):
+            return state
+
+        try:
+            stamp = self._stamp()
+        except OSError:
+            # The artifact is missing, e.g. while an export is swapped into place: keep serving what is loaded
+            if state[0] is None:
+                raise
+            logger.warning(f"{self.path} is not readable; serving previous version.")
+            return state
+        self._last_check = now
+        if stamp == state[0]:
+            return state
+
+        with self._lock:
+            state = self._state
+            if stamp == state[0]:
+                return state
+            try:
+                new_obj = self._load()
+            except Exception:
+                if state[0] is None:
+                    raise
+                logger.error(f"{self.path} could not be reloaded; serving previous version.")
+                return state
+            self._state = (stamp, new_obj)
+            return self._state
+
+    def get(self):
+        """
+        Returns the loaded object, (re)loading it first if the artifact changed since the last load.
+
+        Returns:
+            obj (object): object read from self.path
+        """
+        return self.snapshot()[1]
+
+    def clear(self):
+        """Drops the loaded object so the next access reloads it from disk."""
+        with self._lock:
+            self._state = (None, None)
+            self._last_check = None
+
+
+_artifact_stores = {}
+_artifact_stores_lock = threading.Lock()
+
+
+def get_artifact_store(store_class, path):
+    """
+    Retrieves the process-wide cache of a given class for a path, creating it on first use.
+
+    Args:
+        store_class (type): ArtifactCache subclass used to load the artifact
+        path (string): path to the artifact on disk
+
+    Returns:
+        store (ArtifactCache): cache for the artifact at path
+    """
+    key = (store_class, path)
+    store = _artifact_stores.get(key)
+    if store is None:
+        with _artifact_stores_lock:
+            store = _artifact_stores.setdefault(key, store_class(path, check_interval=config.ARTIFACT_CHECK_INTERVAL))
+    return store
+
+
+class Vocabulary(object):
+    """
+    Immutable set of valid levels for a categorical feature with O(1) membership and a stable level-to-column
+    index map. Levels are sorted so columns line up with the pd.get_dummies output the model was trained on.
+    """
+
+    def __init__(self, levels):
+        """
+        Args:
+            levels (list[string]): valid levels for the feature
+        """
+        self.levels = tuple(sorted(set(levels)))
+        self.members = frozenset(self.levels)
+        self.index = {level: i for i, level in enumerate(self.levels)}
+
+    def __contains__(self, level):
+        return level in self.members
+
+    def __iter__(self):
+        return iter(self.levels)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __repr__(self):
+        return f"<Vocabulary levels: {len(self.levels)}>"
+
+
+class VocabularyStore(ArtifactCache):
+    """Process-wide cache of the Vocabulary read from a levels .txt file."""
+
+    def _stamp(self):
+        # A missing levels file yields an empty vocabulary (every entry invalid) rather than an error
+        try:
+            return super()._stamp()
+        except OSError:
+            return ('missing',)
+
+    def _load(self):
+        return Vocabulary(get_column_levels(self.path))
+
+
+def get_vocabulary(levels_path):
+    """
+    Retrieves the cached vocabulary for a levels file, reloading it if the file has changed on disk.
+
+    Args:
+        levels_path (string): source path containing levels .txt file.
+
+    Returns:
+        vocabulary (Vocabulary): valid levels for the feature
+    """
+    return get_artifact_store(VocabularyStore, levels_path).get()
+
+
+def get_vocabularies():
+    """
+    Retrieves the cached vocabularies of all categorical features, in the order of config.CATEGORICAL.
+
+    Returns:
+        vocabularies (list[Vocabulary]): valid levels for country, category and parent category
+    """
+    return [get_vocabulary(path) for path in config.ALL_VALID_PATHS]
+
+
 def process_category(category_entry, valid_categories):
     """
     Process category entry and checks for invalidity.
 
     Args:
         category_entry (object): user entry for category
-        valid_categories (list[string]): list of valid categories to choose from
+        valid_categories (Vocabulary or list[string]): valid categories to choose from
 
     Returns:
         category_entry (object): processed user entry for category
@@ -118,7 +327,7 @@ def process_p_category(p_category_entry, valid_p_categories):
 
     Args:
         p_category_entry (object): user entry for parent category
-        valid_p_categories (list[string]): list of valid parent categories to choose from
+        valid_p_categories (Vocabulary or list[string]): valid parent categories to choose from
 
     Returns:
         p_category_entry (object): processed user entry for parent category
@@ -156,7 +365,8 @@ def process_blurb(blurb_entry):
         invalid_flag = True
     elif blurb_entry == "":
         invalid_flag = True
-    blurb_entry = len(blurb_entry.lower())
+    if isinstance(blurb_entry, str):
+        blurb_entry = len(blurb_entry.lower())
 
     if not invalid_flag:
         logger.debug(f"blurb is valid.")
@@ -180,7 +390,8 @@ def process_name(name_entry):
         invalid_flag = True
     elif name_entry == "":
         invalid_flag = True
-    name_entry = len(name_entry.lower())
+    if isinstance(name_entry, str):
+        name_entry = len(name_entry.lower())
 
     if not invalid_flag:
         logger.debug(f"staff_pick is valid.")
@@ -194,7 +405,7 @@ def process_country(country_entry, valid_countries):
 
     Args:
         country_entry (object): user entry for name
-        valid_countries (list[string]): list of valid countries to choose from
+        valid_countries (Vocabulary or list[string]): valid countries to choose from
 
     Returns:
         country_entry (object): processed user entry for name
@@ -241,7 +452,9 @@ def process_num_days(campaign_length_entry):
     invalid_flag = False
     try:
         campaign_length_entry = to_sec(int(campaign_length_entry))
-    except ValueError:
+        # Durations beyond the float range cannot be encoded
+        float(campaign_length_entry)
+    except (TypeError, ValueError, OverflowError):
         invalid_flag = True
 
     if not invalid_flag:
@@ -291,97 +504,1197 @@ def prep_user_input(data, categorical_cols=None, numerical_cols=None, all_valid_
         return full
 
 
-def evaluate_input(model_path, prepared_input):
+class FeatureEncoder(object):
+    """
+    Encodes validated campaign features straight into a preallocated numpy matrix in training column order:
+    numerical columns first, then the one-hot levels of each categorical column.
+    """
+
+    # The forest casts its input to float32, so encoding in float32 avoids a copy at prediction time
+    DTYPE = np.float32
+
+    def __init__(self, numerical_cols, categorical_cols, vocabularies):
+        """
+        Args:
+            numerical_cols (list[string]): list of numerical columns
+            categorical_cols (list[string]): list of categorical columns
+            vocabularies (list[Vocabulary]): valid levels for each categorical column, in the same order
+        """
+        self.numerical_cols = list(numerical_cols)
+        self.categorical_cols = list(categorical_cols)
+        self.vocabularies = list(vocabularies)
+
+        # Start column of each categorical block
+        self.offsets = []
+        offset = len(self.numerical_cols)
+        for vocabulary in self.vocabularies:
+            self.offsets.append(offset)
+            offset += len(vocabulary)
+        self.n_features = offset
+        self.columns = self.numerical_cols + [level for vocabulary in self.vocabularies for level in vocabulary.levels]
+
+    def encode_row(self, features, out=None):
+        """
+        Encodes one campaign into a model-ready row.
+
+        Args:
+            features (dict): normalized feature values keyed by feature name, as built by validate_user_input
+            out (numpy array): optional row of length n_features to write into
+
+        Returns:
+            out (numpy array): encoded row
+        """
+        if out is None:
+            out = np.zeros(self.n_features, dtype=self.DTYPE)
+        else:
+            out[:] = 0
+        for i, column in enumerate(self.numerical_cols):
+            out[i] = features[column]
+        for column, vocabulary, offset in zip(self.categorical_cols, self.vocabularies, self.offsets):
+            # Unknown levels leave the block at zero, as reindexing the dummies does
+            index = vocabulary.index.get(features[column])
+            if index is not None:
+                out[offset + index] = 1
+        return out
+
+    def encode_frame(self, features, out=None):
+        """
+        Encodes a dataframe of validated campaigns column by column.
+
+        Args:
+            features (Pandas DataFrame): normalized feature values, as built by validate_frame
+            out (numpy array): optional matrix of shape (len(features), n_features) to write into
+
+        Returns:
+            out (numpy array): encoded matrix
+        """
+        if out is None:
+            out = np.zeros((len(features), self.n_features), dtype=self.DTYPE)
+        else:
+            out[:] = 0
+        for i, column in enumerate(self.numerical_cols):
+            out[:, i] = features[column].to_numpy(dtype=np.float64)
+        rows = np.arange(len(features))
+        for column, vocabulary, offset in zip(self.categorical_cols, self.vocabularies, self.offsets):
+            index = features[column].map(vocabulary.index).to_numpy(dtype=np.float64)
+            known = ~np.isnan(index)
+            out[rows[known], offset + index[known].astype(np.intp)] = 1
+        return out
+
+    def encode(self, rows, out=None):
+        """
+        Encodes many campaigns into a model-ready matrix.
+
+        Args:
+            rows (list[dict]): normalized feature values per campaign, as built by validate_user_input
+            out (numpy array): optional matrix of shape (len(rows), n_features) to write into
+
+        Returns:
+            out (numpy array): encoded matrix
+        """
+        if out is None:
+            out = np.zeros((len(rows), self.n_features), dtype=self.DTYPE)
+        for i, features in enumerate(rows):
+            self.encode_row(features, out[i])
+        return out
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """
+    Retrieves the process-wide FeatureEncoder, rebuilding it when any of the level files has changed.
+
+    Returns:
+        encoder (FeatureEncoder): encoder for config.NUMERICAL and config.CATEGORICAL
+    """
+    global _encoder
+    vocabularies = get_vocabularies()
+    encoder = _encoder
+    if encoder is None or any(old is not new for old, new in zip(encoder.vocabularies, vocabularies)):
+        with _encoder_lock:
+            encoder = FeatureEncoder(config.NUMERICAL, config.CATEGORICAL, vocabularies)
+            _encoder = encoder
+        logger.debug("Feature encoder built.")
+    return encoder
+
+
+class ModelStore(ArtifactCache):
+    """
+    Process-wide holder for a pickled model. The model is unpickled once and reused across requests, and a
+    retrained model is swapped in without restarting the app. With the 'compiled' engine the forest is served as a
+    CompiledForest.
+    """
+
+    def __init__(self, path, check_interval=0, engine=None):
+        """
+        Args:
+            path (string): path to trained random forest model pickle object
+            check_interval (float): minimum number of seconds between checks of the artifact on disk
+            engine (string): 'compiled' or 'sklearn'; defaults to config.INFERENCE_ENGINE
+        """
+        super().__init__(path, check_interval)
+        self.engine = engine if engine is not None else config.INFERENCE_ENGINE
+
+    def _load(self):
+        with open(self.path, 'rb') as infile:
+            model = pickle.load(infile)
+        logger.info(f"Model loaded from {self.path}")
+        if self.engine == 'compiled':
+            model = CompiledForest.from_sklearn(model, max_batch=config.COMPILED_MAX_BATCH)
+        return model
+
+
+class MappedModelStore(ArtifactCache):
+    """
+    Process-wide holder for a forest exported by export_model. The node arrays are memory-mapped rather than
+    unpickled, so loading is near-instant and all workers share one copy of the model in the page cache.
+    """
+
+    def _stamp(self):
+        # metadata.json is written last and the directory is swapped in whole, so it versions the export
+        stat = os.stat(os.path.join(self.path, METADATA_FILE))
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        forest = CompiledForest.load(self.path)
+        columns = forest.metadata.get('columns')
+        if columns is not None and columns != get_encoder().columns:
+            logger.warning(f"Feature columns of {self.path} differ from the current levels files.")
+        logger.info(f"Model mapped from {self.path}")
+        return forest
+
+
+def get_model_store(model_path=None):
+    """
+    Retrieves the process-wide store of a model artifact: a pickled model file or a directory written by
+    export_model.
+
+    Args:
+        model_path (string): path to the model artifact; defaults to the artifact selected by config.MODEL_FORMAT
+
+    Returns:
+        store (ArtifactCache): ModelStore or MappedModelStore for the artifact
+    """
+    if model_path is None:
+        model_path = config.MODEL_ARRAYS_PATH if config.MODEL_FORMAT == 'arrays' else config.MODEL_STORE_PATH
+    store_class = MappedModelStore if os.path.isdir(model_path) else ModelStore
+    return get_artifact_store(store_class, model_path)
+
+
+def export_model(model, export_path, encoder=None):
+    """
+    Exports a trained random forest as memory-mappable arrays, together with the feature columns and categorical
+    levels it was trained on.
+
+    Args:
+        model (.pkl model object): trained random forest model object
+        export_path (string): directory to write the arrays and metadata to
+        encoder (FeatureEncoder): encoder for the model's columns; defaults to the process-wide encoder
+
+    Returns:
+        None
+    """
+    if encoder is None:
+        encoder = get_encoder()
+    metadata = {'columns': encoder.columns,
+                'numerical': encoder.numerical_cols,
+                'categorical': encoder.categorical_cols,
+                'vocabularies': {column: list(vocabulary.levels)
+                                 for column, vocabulary in zip(encoder.categorical_cols, encoder.vocabularies)}}
+    CompiledForest.from_sklearn(model).save(export_path, metadata)
+
+
+def load_model(model_path):
+    """
+    Retrieves the cached model for a path, reloading it if the artifact has changed on disk.
+
+    Args:
+        model_path (string): path to trained random forest model pickle object or exported model directory
+
+    Returns:
+        model (.pkl model object): trained random forest model object
+    """
+    return get_model_store(model_path).get()
+
+
+def evaluate_input(model_path, prepared_input, threshold=None):
     """
     Evaluates prepared user input on trained model.
 
     Args:
         model (pickle object): path to trained random forest model pickle object
-        prepared_input (Pandas DataFrame): model-ready dataframe of user input
+        prepared_input (numpy array or Pandas DataFrame): model-ready user input
+        threshold (float): decision threshold on the success probability; defaults to config.DECISION_THRESHOLD
 
     Returns:
         ypred (numpy array): binary state prediction for user-entered campaign info
         ypred_proba (numpy array): raw probability for state prediction
     """
+    if threshold is None:
+        threshold = config.DECISION_THRESHOLD
     try:
-        model = pickle.load(open(model_path, 'rb'))
-        y_pred = model.predict(prepared_input)
-        y_pred_proba = model.predict_proba(prepared_input)[:,1]
+        model = load_model(model_path)
+        y_pred_proba, y_pred = predict_with_threshold(model, prepared_input, threshold)
         logger.debug("User input successfully evaluated on model!")
     except:
         raise
     return y_pred, y_pred_proba
 
 
-def process_user_input(user_input):
+class PredictionCache(object):
     """
-    - Processes user input and checks to see if any inputted fields are invalid
-    - If valid, prepares input for modeling and then evaluates on said model
+    Bounded LRU cache of predictions keyed on normalized feature tuples, with an optional time-to-live.
+    Entries belong to one model version and are dropped as soon as a different model is served.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        """
+        Args:
+            max_size (int): maximum number of cached predictions; 0 disables the cache
+            ttl (float): number of seconds an entry stays valid; None keeps entries until evicted
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sync(self, version):
+        """
+        Clears the cache if the served model version has changed.
+
+        Args:
+            version (tuple): version stamp of the model currently served
+        """
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self._entries.clear()
+                    self.version = version
+                    logger.debug("Prediction cache cleared for new model version.")
+
+    def get(self, key):
+        """
+        Looks up a cached prediction.
+
+        Args:
+            key (tuple): normalized feature tuple
+
+        Returns:
+            value (tuple): cached (y_pred, y_pred_proba, explanation), or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """
+        Stores a prediction, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (tuple): normalized feature tuple
+            value (tuple): (y_pred, y_pred_proba, explanation), explanation None if not explained
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops all cached predictions."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_prediction_cache = PredictionCache(config.PREDICTION_CACHE_SIZE, config.PREDICTION_CACHE_TTL)
+
+
+def get_prediction_cache():
+    """
+    Retrieves the process-wide prediction cache.
+
+    Returns:
+        cache (PredictionCache): cache of predictions for the served model
+    """
+    return _prediction_cache
+
+
+def prediction_cache_key(version, features, encoder, threshold):
+    """
+    Builds the prediction cache key of a validated campaign.
 
     Args:
-        user_input (Campaign object): user entered object of class Campaign
+        version (tuple): version stamp of the served model
+        features (dict): normalized feature values, as built by validate_user_input
+        encoder (FeatureEncoder): encoder for the model's columns
+        threshold (float): decision threshold of the label
+
+    Returns:
+        key (tuple): model version, feature values in column order and threshold
     """
-    logger.info(f"User input-> {type(user_input)}")
+    columns = encoder.numerical_cols + encoder.categorical_cols
+    return (version,) + tuple(features[column] for column in columns) + (threshold,)
+
+
+def cached_prediction(features, encoder=None):
+    """
+    Looks up the explained prediction of a validated campaign in the prediction cache, without scoring it.
+
+    Args:
+        features (dict): normalized feature values, as built by validate_user_input
+        encoder (FeatureEncoder): encoder for the model's columns; defaults to the process-wide encoder
 
-    # Get column configurations
-    categorical = config.CATEGORICAL
-    numerical = config.NUMERICAL
+    Returns:
+        prediction (tuple): cached (y_pred, y_pred_proba, explanation) under the served model and the configured
+            threshold, or None if it is not cached with its explanation
+    """
+    if encoder is None:
+        encoder = get_encoder()
+    version = get_model_store().snapshot()[0]
+    cache = get_prediction_cache()
+    cache.sync(version)
+    cached = cache.get(prediction_cache_key(version, features, encoder, config.DECISION_THRESHOLD))
+    return cached if cached is not None and cached[2] is not None else None
 
-    # Valid levels for categorical variables
-    valid_countries = get_column_levels(config.VALID_COUNTRIES_PATH)
-    valid_categories = get_column_levels(config.VALID_CATEGORIES_PATH)
-    valid_p_categories = get_column_levels(config.VALID_P_CATEGORIES_PATH)
-    all_valid = [valid_countries, valid_categories, valid_p_categories]
 
+def cache_prediction(features, prediction, encoder=None):
+    """
+    Caches the explained prediction of a validated campaign obtained without scoring it, e.g. from the database.
 
+    Args:
+        features (dict): normalized feature values, as built by validate_user_input
+        prediction (tuple): (y_pred, y_pred_proba, explanation) under the served model and the configured threshold
+        encoder (FeatureEncoder): encoder for the model's columns; defaults to the process-wide encoder
+
+    Returns:
+        None
+    """
+    if encoder is None:
+        encoder = get_encoder()
+    version = get_model_store().snapshot()[0]
+    cache = get_prediction_cache()
+    cache.sync(version)
+    cache.put(prediction_cache_key(version, features, encoder, config.DECISION_THRESHOLD), prediction)
+
+
+def score_features(rows, encoder=None, threshold=None, explain=False):
+    """
+    Scores validated campaigns, answering repeated inputs from the prediction cache and evaluating the rest with
+    a single model call.
+
+    Explained campaigns are scored by the contributions pass alone, whose baseline plus contributions is the
+    probability, so an explanation costs no second traversal; it is cached with the prediction.
+
+    Args:
+        rows (list[dict]): normalized feature values per campaign, as built by validate_user_input
+        encoder (FeatureEncoder): encoder for the model's columns; defaults to the process-wide encoder
+        threshold (float): decision threshold on the success probability; defaults to config.DECISION_THRESHOLD
+        explain (boolean): also return the explanation of each prediction
+
+    Returns:
+        y_pred (numpy array): binary state prediction per campaign
+        y_pred_proba (numpy array): probability of success per campaign
+        explanations (list[dict]): only if explain; as built by summarize_contributions, per campaign
+    """
+    if encoder is None:
+        encoder = get_encoder()
+    if threshold is None:
+        threshold = config.DECISION_THRESHOLD
+
+    with metrics.timer('model_load'):
+        # The model and its version are read as one snapshot, so a reload in between cannot mix them up
+        version, model = get_model_store().snapshot()
+        cache = get_prediction_cache()
+        cache.sync(version)
+
+    y_pred = np.empty(len(rows), dtype=int)
+    y_pred_proba = np.empty(len(rows))
+    explanations = [None] * len(rows)
+    with metrics.timer('cache_lookup'):
+        # Keys carry the model version, so a request still scoring with the previous model cannot fill the cache
+        # of the new one
+        keys = [prediction_cache_key(version, features, encoder, threshold) for features in rows]
+        misses = []
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            # A prediction cached without its explanation is scored again when one is asked for
+            if cached is None or (explain and cached[2] is None):
+                misses.append(i)
+            else:
+                y_pred[i], y_pred_proba[i], explanations[i] = cached
+
+    if misses:
+        with metrics.timer('encode'):
+            model_ready_input = encoder.encode([rows[i] for i in misses])
+        if explain:
+            with metrics.timer('explain'):
+                baseline, contributions = get_explainer(model).contributions(model_ready_input)
+                miss_proba = baseline + contributions.sum(axis=1)
+                miss_pred = model.classes_[(miss_proba > threshold).astype(int)]
+                miss_explanations = summarize_contributions(baseline, contributions, encoder)
+        else:
+            with metrics.timer('predict'):
+                miss_proba, miss_pred = predict_with_threshold(model, model_ready_input, threshold)
+            miss_explanations = [None] * len(misses)
+        y_pred[misses] = miss_pred
+        y_pred_proba[misses] = miss_proba
+        for i, pred, proba, explanation in zip(misses, miss_pred, miss_proba, miss_explanations):
+            explanations[i] = explanation
+            cache.put(keys[i], (pred, proba, explanation))
+    logger.debug(f"{len(rows) - len(misses)} of {len(rows)} predictions served from cache.")
+    if explain:
+        return y_pred, y_pred_proba, explanations
+    return y_pred, y_pred_proba
+
+
+_model_version = (None, None)
+
+
+def artifact_digest(path):
+    """
+    Hashes the contents of a model artifact: a file, or every file of a directory in name order.
+
+    Args:
+        path (string): path to the artifact
+
+    Returns:
+        digest (string): hexadecimal SHA-256 digest of the artifact
+    """
+    paths = [path] if not os.path.isdir(path) else [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    digest = hashlib.sha256()
+    for file_path in paths:
+        with open(file_path, 'rb') as infile:
+            for block in iter(lambda: infile.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def get_model_version():
+    """
+    Identifies the served model by the content of its artifact, hashed once per loaded model, so stored predictions
+    can be matched to the model that made them across processes and restarts.
+
+    Returns:
+        model_version (string): first 16 hexadecimal digits of the artifact digest
+
+    Raises:
+        RuntimeError: if the artifact kept changing while it was hashed
+    """
+    global _model_version
+    store = get_model_store()
+    version, model = store.snapshot()
+    for attempt in range(3):
+        stamp, model_version = _model_version
+        if stamp == (store.path, version):
+            return model_version
+        model_version = artifact_digest(store.path)[:16]
+        # The digest only identifies the loaded model if the artifact was not replaced while it was hashed
+        latest_version, model = store.snapshot(recheck=True)
+        if latest_version == version:
+            _model_version = ((store.path, version), model_version)
+            return model_version
+        version = latest_version
+    raise RuntimeError(f"{store.path} kept changing while its version was computed.")
+
+
+def feature_hash(features, encoder=None, threshold=None):
+    """
+    Hashes the normalized features of a validated campaign together with the decision threshold, so campaigns that
+    the model cannot tell apart share a hash.
+
+    Args:
+        features (dict): normalized feature values, as built by validate_user_input
+        encoder (FeatureEncoder): encoder for the model's columns; defaults to the process-wide encoder
+        threshold (float): decision threshold on the success probability; defaults to config.DECISION_THRESHOLD
+
+    Returns:
+        feature_hash (string): hexadecimal SHA-256 digest
+    """
+    if encoder is None:
+        encoder = get_encoder()
+    if threshold is None:
+        threshold = config.DECISION_THRESHOLD
+    values = [features[column] for column in encoder.numerical_cols + encoder.categorical_cols] + [threshold]
+    return hashlib.sha256(json.dumps(values).encode('utf-8')).hexdigest()
+
+
+_explainer = (None, None)
+_explainer_lock = threading.Lock()
 
-    # Check for any invalid inputs
-    len_name, invalid_name = process_name(user_input.name)
-    len_blurb, invalid_blurb = process_blurb(user_input.blurb)
-    USD_goal, invalid_goal = process_USD_goal(user_input.USD_goal)
-    time_elapsed, invalid_time = process_num_days(user_input.num_days)
-    country, invalid_country = process_country(user_input.country, valid_countries=valid_countries)
-    category_name, invalid_cat = process_category(user_input.category_name, valid_categories=valid_categories)
-    p_category_name, invalid_pcat = process_p_category(user_input.p_category_name, valid_p_categories=valid_p_categories)
-    staff_pick, invalid_staff = process_staff_pick(user_input.staff_pick, valid_staff_picks=config.VALID_STAFF_PICKS)
 
-    # Calculate number of invalid entries
-    invalid_sum = np.sum([invalid_name, invalid_blurb, invalid_goal, invalid_time, invalid_country, invalid_cat, invalid_pcat, invalid_staff])
+def get_explainer(model):
+    """
+    Retrieves a CompiledForest for a served model, compiling an sklearn forest once per loaded model.
+
+    Args:
+        model (.pkl model object or CompiledForest): model returned by the model store
+
+    Returns:
+        forest (CompiledForest): forest carrying the per-node deltas used for explanations
+    """
+    global _explainer
+    if isinstance(model, CompiledForest):
+        return model
+    source, forest = _explainer
+    if source is not model:
+        # Concurrent first requests wait for one compile rather than each compiling the forest
+        with _explainer_lock:
+            source, forest = _explainer
+            if source is not model:
+                forest = CompiledForest.from_sklearn(model)
+                _explainer = (model, forest)
+    return forest
+
+
+def summarize_contributions(baseline, contributions, encoder):
+    """
+    Builds the explanation of each row from its per-column contributions, with the one-hot columns of each
+    categorical feature summed into a single contribution.
+
+    Args:
+        baseline (numpy array): baseline probability per row, as returned by CompiledForest.contributions
+        contributions (numpy array): contribution per row and model-ready column
+        encoder (FeatureEncoder): encoder for the model's columns
+
+    Returns:
+        explanations (list[dict]): per row, the baseline probability under 'baseline' and the contribution of each
+            feature under 'contributions', largest absolute contribution first
+    """
+    # Numerical columns map to themselves, each categorical block to its column name
+    n_numerical = len(encoder.numerical_cols)
+    blocks = [contributions[:, :n_numerical]]
+    for offset, vocabulary in zip(encoder.offsets, encoder.vocabularies):
+        blocks.append(contributions[:, offset:offset + len(vocabulary)].sum(axis=1, keepdims=True))
+    per_feature = np.hstack(blocks)
+    names = encoder.numerical_cols + encoder.categorical_cols
+
+    explanations = []
+    for row_baseline, row_contributions in zip(baseline, per_feature):
+        order = np.argsort(-np.abs(row_contributions), kind='stable')
+        explanations.append({'baseline': float(row_baseline),
+                             'contributions': {names[i]: float(row_contributions[i]) for i in order}})
+    return explanations
+
+
+def explain_features(rows, encoder=None):
+    """
+    Explains the success probability of validated campaigns as a baseline plus one contribution per feature.
+
+    Args:
+        rows (list[dict]): normalized feature values per campaign, as built by validate_user_input
+        encoder (FeatureEncoder): encoder for the model's columns; defaults to the process-wide encoder
+
+    Returns:
+        explanations (list[dict]): per campaign, as built by summarize_contributions
+    """
+    return score_features(rows, encoder, explain=True)[2]
+
+
+def make_sample_campaigns(n, random_state=None):
+    """
+    Generates valid synthetic campaign records from the level files, for warmups, benchmarks and load tests.
+
+    Args:
+        n (int): number of campaigns
+        random_state (int): seed for reproducible campaigns
+
+    Returns:
+        campaigns (list[dict]): raw campaign fields as submitted through the form
+    """
+    rng = np.random.RandomState(random_state)
+    countries, categories, p_categories = get_vocabularies()
+    campaigns = []
+    for _ in range(n):
+        campaigns.append({
+            'name': "n" * rng.randint(1, 61),
+            'blurb': "b" * rng.randint(1, 136),
+            'USD_goal': str(round(float(rng.lognormal(8.5, 1.5)), 2)),
+            'num_days': str(rng.randint(1, 61)),
+            'country': countries.levels[rng.randint(len(countries))],
+            'category_name': categories.levels[rng.randint(len(categories))],
+            'p_category_name': p_categories.levels[rng.randint(len(p_categories))],
+            'staff_pick': 'true' if rng.rand() < 0.12 else 'false'
+        })
+    return campaigns
+
+
+CAMPAIGN_FIELDS = ['name', 'blurb', 'USD_goal', 'num_days', 'country', 'category_name', 'p_category_name', 'staff_pick']
+
+
+def get_field(user_input, field):
+    """
+    Retrieves a raw campaign field from a Campaign object or a dictionary of campaign fields.
+
+    Args:
+        user_input (Campaign object or dict): campaign record
+        field (string): name of the campaign field
+
+    Returns:
+        value (object): raw field value, or None if the record does not have it
+    """
+    if isinstance(user_input, dict):
+        return user_input.get(field)
+    return getattr(user_input, field, None)
+
+
+def validate_user_input(user_input, vocabularies=None):
+    """
+    Validates a single campaign record and normalizes its fields into model features.
+
+    Args:
+        user_input (Campaign object or dict): campaign record
+        vocabularies (list[Vocabulary]): valid levels for country, category and parent category; defaults to the
+            cached vocabularies from the level files
+
+    Returns:
+        features (dict): normalized feature values keyed by feature name
+        invalid_fields (list[string]): names of the campaign fields that failed validation
+    """
+    if vocabularies is None:
+        vocabularies = get_vocabularies()
+    valid_countries, valid_categories, valid_p_categories = vocabularies
+
+    len_name, invalid_name = process_name(get_field(user_input, 'name'))
+    len_blurb, invalid_blurb = process_blurb(get_field(user_input, 'blurb'))
+    USD_goal, invalid_goal = process_USD_goal(get_field(user_input, 'USD_goal'))
+    time_elapsed, invalid_time = process_num_days(get_field(user_input, 'num_days'))
+    country, invalid_country = process_country(get_field(user_input, 'country'), valid_countries=valid_countries)
+    category_name, invalid_cat = process_category(get_field(user_input, 'category_name'), valid_categories=valid_categories)
+    p_category_name, invalid_pcat = process_p_category(get_field(user_input, 'p_category_name'), valid_p_categories=valid_p_categories)
+    staff_pick, invalid_staff = process_staff_pick(get_field(user_input, 'staff_pick'), valid_staff_picks=config.VALID_STAFF_PICKS)
+
+    invalid_flags = [invalid_name, invalid_blurb, invalid_goal, invalid_time, invalid_country, invalid_cat, invalid_pcat, invalid_staff]
+    invalid_fields = [field for field, invalid in zip(CAMPAIGN_FIELDS, invalid_flags) if invalid]
+
+    features = {
+        'len_name': len_name,
+        'len_blurb': len_blurb,
+        'USD_goal': USD_goal,
+        'time_elapsed': time_elapsed,
+        'country': country,
+        'category_name': category_name,
+        'p_category_name': p_category_name,
+        'staff_pick': staff_pick
+    }
+    return features, invalid_fields
+
+
+REASON_MISSING = 'missing'
+REASON_NOT_A_STRING = 'not_a_string'
+REASON_EMPTY = 'empty'
+REASON_NOT_A_NUMBER = 'not_a_number'
+REASON_UNKNOWN_LEVEL = 'unknown_level'
+
+
+def get_column(data, field):
+    """
+    Retrieves a raw campaign field from a dataframe, as an object column of None if the field is absent.
+
+    Args:
+        data (Pandas DataFrame): raw campaign fields, one row per campaign
+        field (string): name of the campaign field
+
+    Returns:
+        column (Pandas Series): raw field values
+    """
+    if field in data.columns:
+        return data[field]
+    return pd.Series([None] * len(data), index=data.index, dtype=object)
+
+
+def string_mask(column):
+    """
+    Flags the string entries of a column.
+
+    Args:
+        column (Pandas Series): raw field values
+
+    Returns:
+        is_str (numpy array): True where the entry is a str
+    """
+    if column.dtype == object or str(column.dtype) in ('string', 'str'):
+        return column.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    return np.zeros(len(column), dtype=bool)
+
+
+def to_numeric_array(column):
+    """
+    Converts a column to floats, with entries that are not numbers as NaN.
+
+    Args:
+        column (Pandas Series): raw field values
+
+    Returns:
+        values (numpy array): float64 value per entry; NaN where the entry is not a number or is an integer too
+            large for a float
+    """
+    try:
+        return np.array(pd.to_numeric(column, errors='coerce'), dtype=np.float64)
+    except OverflowError:
+        # errors='coerce' does not cover integers beyond the float range, so convert entry by entry
+        values = np.full(len(column), np.nan)
+        for i, value in enumerate(column):
+            try:
+                values[i] = pd.to_numeric(value, errors='coerce')
+            except OverflowError:
+                pass
+        return values
+
+
+def validate_frame(data, vocabularies=None, valid_staff_picks=None):
+    """
+    Validates a dataframe of raw campaign fields column by column, with the same outcome per row as the scalar
+    process_* functions but without per-row calls or logging.
+
+    Args:
+        data (Pandas DataFrame): raw campaign fields, one row per campaign and one column per Campaign field
+        vocabularies (list[Vocabulary]): valid levels for country, category and parent category; defaults to the
+            cached vocabularies from the level files
+        valid_staff_picks (list[string]): valid staff_pick entries; defaults to config.VALID_STAFF_PICKS
+
+    Returns:
+        features (Pandas DataFrame): normalized feature values; invalid entries keep their raw value
+        reasons (Pandas DataFrame): reason code per Campaign field, an empty string where the field is valid
+    """
+    if vocabularies is None:
+        vocabularies = get_vocabularies()
+    if valid_staff_picks is None:
+        valid_staff_picks = config.VALID_STAFF_PICKS
+    valid_countries, valid_categories, valid_p_categories = vocabularies
+
+    features = pd.DataFrame(index=data.index)
+    reasons = pd.DataFrame('', index=data.index, columns=CAMPAIGN_FIELDS, dtype=object)
+
+    def not_string_reason(column, is_str):
+        return np.where(column.isna().to_numpy(), REASON_MISSING, REASON_NOT_A_STRING)[~is_str]
+
+    # Free text: valid if a non-empty string, normalized to its length
+    for field, feature in [('name', 'len_name'), ('blurb', 'len_blurb')]:
+        column = get_column(data, field)
+        is_str = string_mask(column)
+        lengths = column.where(is_str, '').astype(object).str.lower().str.len().to_numpy()
+        features[feature] = np.where(is_str, lengths, column.to_numpy(dtype=object))
+        reasons.loc[~is_str, field] = not_string_reason(column, is_str)
+        reasons.loc[is_str & (lengths == 0), field] = REASON_EMPTY
+
+    # USD_goal: anything float() accepts, as long as it is finite
+    column = get_column(data, 'USD_goal')
+    goal = to_numeric_array(column)
+    # Rare spellings float() accepts but to_numeric does not (e.g. '1_000') go through float() itself
+    for i in np.flatnonzero(np.isnan(goal) & column.notna().to_numpy()):
+        try:
+            goal[i] = float(column.iloc[i])
+        except (TypeError, ValueError, OverflowError):
+            pass
+    goal_valid = np.isfinite(goal)
+    # Kept as objects, so a raw entry too large for a float is not converted when the column is assigned
+    features['USD_goal'] = pd.Series(np.where(goal_valid, goal, column.to_numpy(dtype=object)), index=data.index,
+                                     dtype=object)
+    reasons.loc[~goal_valid, 'USD_goal'] = np.where(column.isna().to_numpy(), REASON_MISSING, REASON_NOT_A_NUMBER)[~goal_valid]
+
+    # num_days: anything int() accepts (integer literals, or numbers truncated), converted to seconds
+    column = get_column(data, 'num_days')
+    is_str = string_mask(column)
+    days = to_numeric_array(column)
+    is_int_literal = column.where(is_str, '').astype(object).str.match(r'\s*[+-]?\d+\s*$').to_numpy(dtype=bool)
+    days_valid = np.isfinite(days) & (is_int_literal | ~is_str)
+    for i in np.flatnonzero(is_str & ~is_int_literal):
+        try:
+            days[i] = int(column.iloc[i])
+            days_valid[i] = True
+        except (TypeError, ValueError, OverflowError):
+            pass
+    seconds = to_sec(np.trunc(np.where(days_valid, days, 0))).astype(np.int64)
+    features['time_elapsed'] = pd.Series(np.where(days_valid, seconds, column.to_numpy(dtype=object)),
+                                         index=data.index, dtype=object)
+    reasons.loc[~days_valid, 'num_days'] = np.where(column.isna().to_numpy(), REASON_MISSING, REASON_NOT_A_NUMBER)[~days_valid]
+
+    # Categoricals: valid if a string whose lowercase form is a known level
+    for field, vocabulary in [('country', valid_countries), ('category_name', valid_categories), ('p_category_name', valid_p_categories)]:
+        column = get_column(data, field)
+        is_str = string_mask(column)
+        lowered = column.where(is_str, '').astype(object).str.lower()
+        known = is_str & lowered.isin(set(vocabulary)).to_numpy(dtype=bool)
+        features[field] = np.where(known, lowered.to_numpy(dtype=object), column.to_numpy(dtype=object))
+        reasons.loc[~is_str, field] = not_string_reason(column, is_str)
+        reasons.loc[is_str & ~known, field] = np.where(lowered.to_numpy(dtype=object) == '', REASON_EMPTY, REASON_UNKNOWN_LEVEL)[is_str & ~known]
+
+    # staff_pick: 'true' or 'false' in any case
+    column = get_column(data, 'staff_pick')
+    is_str = string_mask(column)
+    lowered = column.where(is_str, '').astype(object).str.lower()
+    known = is_str & lowered.isin(set(valid_staff_picks)).to_numpy(dtype=bool)
+    features['staff_pick'] = np.where(known, (lowered == 'true').to_numpy(dtype=object), column.to_numpy(dtype=object))
+    reasons.loc[~is_str, 'staff_pick'] = not_string_reason(column, is_str)
+    reasons.loc[is_str & ~known, 'staff_pick'] = REASON_UNKNOWN_LEVEL
+
+    n_invalid = int((reasons != '').any(axis=1).sum())
+    logger.debug(f"Validated {len(data)} campaigns: {n_invalid} invalid.")
+    return features, reasons
+
+
+def invalid_fields_from_reasons(reasons):
+    """
+    Lists the invalid fields of each row of a validate_frame reason report.
+
+    Args:
+        reasons (Pandas DataFrame): reason code per Campaign field, as returned by validate_frame
+
+    Returns:
+        invalid_fields (list[list[string]]): names of the fields that failed validation, per row
+    """
+    fields = np.array(reasons.columns, dtype=object)
+    return [list(fields[mask]) for mask in reasons.to_numpy() != '']
+
+
+def count_outcomes(y_pred, invalid_fields):
+    """
+    Updates the invalid-field and predicted-state counters exposed on /metrics.
+
+    Args:
+        y_pred (numpy array): binary state prediction per record, -1 for invalid records
+        invalid_fields (list[list[string]]): names of the fields that failed validation, per record
+
+    Returns:
+        None
+    """
+    if not metrics.REGISTRY.enabled:
+        return
+    for fields in invalid_fields:
+        for field in fields:
+            metrics.INVALID_INPUTS.inc(field)
+    labels, counts = np.unique(y_pred, return_counts=True)
+    for label, count in zip(labels, counts):
+        metrics.PREDICTIONS.inc(STATE_LABELS[int(label)], amount=int(count))
+
+
+def warmup():
+    """
+    Loads the model, vocabularies and encoder and scores a synthetic campaign, so that the first real request does
+    not pay any cold-load cost.
+
+    Returns:
+        elapsed (float): number of seconds the warmup took
+    """
+    start = time.perf_counter()
+    encoder = get_encoder()
+    get_explainer(get_model_store().get())
+    get_model_version()
+    features, invalid_fields = validate_user_input(make_sample_campaigns(1, random_state=0)[0], encoder.vocabularies)
+    score_features([features], encoder)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Warmup finished in {elapsed:.2f} seconds.")
+    return elapsed
+
+
+def process_user_input(user_input, explain=False):
+    """
+    - Processes user input and checks to see if any inputted fields are invalid
+    - If valid, prepares input for modeling and then evaluates on said model
+    - If asked, explains the prediction with per-feature contributions
+
+    Args:
+        user_input (Campaign object): user entered object of class Campaign
+        explain (boolean): also return the explanation of the prediction
+
+    Returns:
+        y_pred (numpy array or int): binary state prediction, -1 for invalid input
+        y_pred_proba (numpy array or string): probability of success, "" for invalid input
+        explanation (dict): only if explain; as built by summarize_contributions, None for invalid input
+    """
+    logger.info(f"User input-> {type(user_input)}")
+
+    # Encoder holding the valid levels for categorical variables
+    encoder = get_encoder()
 
+    # Check for any invalid inputs
+    with metrics.timer('validate'):
+        input_dict, invalid_fields = validate_user_input(user_input, encoder.vocabularies)
 
     # If any invalid entries, return error tuple
-    if invalid_sum > 0:
+    explanation = None
+    if invalid_fields:
         logger.warning("Invalid user input! Please try again.")
         y_pred = -1
         y_pred_proba = ""
     # If entries are all valid, evaluate the input
     else:
         logger.debug("User input is valid!")
-        input_dict = {
-            'len_name': len_name,
-            'len_blurb': len_blurb,
-            'USD_goal': USD_goal,
-            'time_elapsed': time_elapsed,
-            'country': country,
-            'category_name': category_name,
-            'p_category_name': p_category_name,
-            'staff_pick': staff_pick
-        }
-        test_data = pd.DataFrame([input_dict])
-
-        # Prepare model input for model fitting
-        model_ready_input = prep_user_input(test_data, categorical, numerical, all_valid)
-
-        # Fit model to prepared user input
-        model_path = config.MODEL_STORE_PATH
-
-        y_pred, y_pred_proba = evaluate_input(model_path, model_ready_input)
 
+        # Evaluate the input, or reuse the prediction for an identical earlier input
+        scored = score_features([input_dict], encoder, explain=explain)
+        y_pred, y_pred_proba = scored[:2]
+        if explain:
+            explanation = scored[2][0]
+
+    count_outcomes(np.ravel(y_pred), [invalid_fields])
+    if explain:
+        return y_pred, y_pred_proba, explanation
     return y_pred, y_pred_proba
 
 
+def process_user_inputs(user_inputs, explain=False):
+    """
+    - Processes a batch of user inputs and records the invalid fields of each one
+    - Encodes all valid inputs not already in the prediction cache into one model-ready matrix and evaluates them
+      with a single model call
 
+    Args:
+        user_inputs (list[Campaign object or dict]): campaign records to score
+        explain (boolean): also return the explanation of each prediction
 
+    Returns:
+        y_pred (numpy array): binary state prediction per record, -1 for invalid records
+        y_pred_proba (numpy array): probability of success per record, NaN for invalid records
+        invalid_fields (list[list[string]]): names of the fields that failed validation, per record
+        explanations (list[dict]): only if explain; as built by summarize_contributions per record, None for invalid
+            records
+    """
+    logger.info(f"Batch of {len(user_inputs)} user inputs received.")
+
+    encoder = get_encoder()
+
+    y_pred = np.full(len(user_inputs), -1, dtype=int)
+    y_pred_proba = np.full(len(user_inputs), np.nan)
+    invalid_fields = []
+    valid_rows = []
+    valid_index = []
+    with metrics.timer('validate'):
+        for i, user_input in enumerate(user_inputs):
+            features, invalid = validate_user_input(user_input, encoder.vocabularies)
+            invalid_fields.append(invalid)
+            if not invalid:
+                valid_rows.append(features)
+                valid_index.append(i)
+
+    explanations = [None] * len(user_inputs)
+    if valid_rows:
+        scored = score_features(valid_rows, encoder, explain=explain)
+        y_pred[valid_index], y_pred_proba[valid_index] = scored[:2]
+        if explain:
+            for i, explanation in zip(valid_index, scored[2]):
+                explanations[i] = explanation
+
+    count_outcomes(y_pred, invalid_fields)
+
+    logger.info(f"Batch scored: {len(valid_index)} valid, {len(user_inputs) - len(valid_index)} invalid.")
+    if explain:
+        return y_pred, y_pred_proba, invalid_fields, explanations
+    return y_pred, y_pred_proba, invalid_fields
+
+
+def process_user_frame(data):
+    """
+    - Validates a dataframe of raw campaign fields column by column
+    - Encodes all valid rows into one model-ready matrix and evaluates them with a single model call
 
+    Args:
+        data (Pandas DataFrame): raw campaign fields, one row per campaign and one column per Campaign field
+
+    Returns:
+        y_pred (numpy array): binary state prediction per row, -1 for invalid rows
+        y_pred_proba (numpy array): probability of success per row, NaN for invalid rows
+        reasons (Pandas DataFrame): reason code per Campaign field, an empty string where the field is valid
+    """
+    encoder = get_encoder()
+    with metrics.timer('validate'):
+        features, reasons = validate_frame(data, encoder.vocabularies)
+    valid = (reasons == '').all(axis=1).to_numpy()
+
+    y_pred = np.full(len(data), -1, dtype=int)
+    y_pred_proba = np.full(len(data), np.nan)
+    if valid.any():
+        with metrics.timer('encode'):
+            model_ready_input = encoder.encode_frame(features[valid])
+        with metrics.timer('predict'):
+            y_pred[valid], y_pred_proba[valid] = evaluate_input(get_model_store().path, model_ready_input)
+
+    count_outcomes(y_pred, invalid_fields_from_reasons(reasons))
+    logger.info(f"Frame scored: {int(valid.sum())} valid, {int((~valid).sum())} invalid.")
+    return y_pred, y_pred_proba, reasons
+
+
+def make_sweep_values(spec, integer=False):
+    """
+    Expands a what-if range into the values to try.
 
+    Args:
+        spec (list or dict): explicit values, or {'min', 'max', 'steps'} with an optional 'scale' of 'linear'
+            (default) or 'log'
+        integer (boolean): round the values to whole numbers, e.g. for num_days
+
+    Returns:
+        values (numpy array): sorted unique values to try
+
+    Raises:
+        ValueError: if the range is malformed, empty, not made of finite numbers or longer than SWEEP_MAX_POINTS
+    """
+    if isinstance(spec, dict):
+        try:
+            low, high, steps = float(spec['min']), float(spec['max']), int(spec['steps'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("A range needs numeric 'min', 'max' and 'steps'.")
+        if steps < 1 or low > high:
+            raise ValueError("A range needs min <= max and at least one step.")
+        # Checked before any array is built, so a tiny request cannot allocate an arbitrarily large grid
+        if steps > config.SWEEP_MAX_POINTS:
+            raise ValueError(f"A range of {steps} steps exceeds the limit of {config.SWEEP_MAX_POINTS}.")
+        if spec.get('scale', 'linear') == 'log':
+            if low <= 0:
+                raise ValueError("A log range needs min > 0.")
+            values = np.geomspace(low, high, steps)
+        else:
+            values = np.linspace(low, high, steps)
+    else:
+        if isinstance(spec, (list, tuple)) and len(spec) > config.SWEEP_MAX_POINTS:
+            raise ValueError(f"{len(spec)} values to try exceed the limit of {config.SWEEP_MAX_POINTS}.")
+        try:
+            values = np.array(spec, dtype=np.float64).ravel()
+        except (TypeError, ValueError):
+            raise ValueError("Values to try must be numbers.")
+        if len(values) > config.SWEEP_MAX_POINTS:
+            raise ValueError(f"{len(values)} values to try exceed the limit of {config.SWEEP_MAX_POINTS}.")
+    if integer:
+        values = np.round(values)
+    values = np.unique(values)
+    if len(values) == 0 or not np.isfinite(values).all():
+        raise ValueError("Values to try must be finite numbers.")
+    return values
+
+
+def sweep_campaign(user_input, goals=None, durations=None):
+    """
+    Scores one campaign over a grid of USD_goal and num_days values with a single batched model call, to find the
+    settings that maximize its probability of success. The grid is built by copying the campaign's encoded row and
+    overwriting the goal and duration columns; it bypasses the prediction cache.
+
+    Args:
+        user_input (Campaign object or dict): campaign record; its goal and duration are used when a range is absent
+        goals (list or dict): USD_goal values to try, as accepted by make_sweep_values
+        durations (list or dict): num_days values to try, as accepted by make_sweep_values
 
+    Returns:
+        sweep (dict): goals and durations tried, the probability surface (one row per goal, one column per duration)
+            and the best setting; None if the campaign is invalid
+        invalid_fields (list[string]): names of the campaign fields that failed validation
+
+    Raises:
+        ValueError: if a range is malformed or the grid is larger than config.SWEEP_MAX_POINTS
+    """
+    encoder = get_encoder()
+    with metrics.timer('validate'):
+        features, invalid_fields = validate_user_input(user_input, encoder.vocabularies)
+    # The swept fields only need to be valid when they are not being swept
+    invalid_fields = [field for field in invalid_fields
+                      if not (field == 'USD_goal' and goals is not None or field == 'num_days' and durations is not None)]
+    if invalid_fields:
+        return None, invalid_fields
+
+    goals = make_sweep_values(goals if goals is not None else [features['USD_goal']])
+    durations = make_sweep_values(durations if durations is not None else [features['time_elapsed'] / to_sec(1)],
+                                  integer=True)
+    if len(goals) * len(durations) > config.SWEEP_MAX_POINTS:
+        raise ValueError(f"Grid of {len(goals) * len(durations)} points exceeds the limit of {config.SWEEP_MAX_POINTS}.")
+
+    with metrics.timer('encode'):
+        # Swept fields may hold invalid raw entries; any number will do before they are overwritten
+        base = dict(features, USD_goal=0.0, time_elapsed=0)
+        grid = np.tile(encoder.encode_row(base), (len(goals) * len(durations), 1))
+        grid[:, encoder.numerical_cols.index('USD_goal')] = np.repeat(goals, len(durations))
+        grid[:, encoder.numerical_cols.index('time_elapsed')] = np.tile(to_sec(durations), len(goals))
+    with metrics.timer('predict'):
+        model = get_model_store().get()
+        y_pred_proba, _ = predict_with_threshold(model, grid, config.DECISION_THRESHOLD)
+
+    surface = y_pred_proba.reshape(len(goals), len(durations))
+    best_goal, best_duration = np.unravel_index(np.argmax(surface), surface.shape)
+    logger.info(f"Swept {len(goals)} goals x {len(durations)} durations.")
+    return {'USD_goal': goals.tolist(),
+            'num_days': durations.astype(int).tolist(),
+            'probability': surface.tolist(),
+            'best': {'USD_goal': float(goals[best_goal]),
+                     'num_days': int(durations[best_duration]),
+                     'probability': float(surface[best_goal, best_duration])}}, []
+
+
+STATE_LABELS = {1: 'SUCCESS', 0: 'FAILED', -1: 'INVALID USER ENTRY'}
+
+
+def make_prediction_record(y_pred, y_pred_proba, invalid_fields, explanation=None):
+    """
+    Builds a JSON-serializable prediction record for one campaign.
+
+    Args:
+        y_pred (int): binary state prediction, -1 for invalid input
+        y_pred_proba (float): probability of success
+        invalid_fields (list[string]): names of the fields that failed validation
+        explanation (dict): optional explanation of the prediction, as built by summarize_contributions
+
+    Returns:
+        record (dict): predicted_state and prediction, plus probability if valid or invalid_fields if not, and
+            baseline and contributions if an explanation is given
+    """
+    y_pred = int(y_pred)
+    record = {'predicted_state': STATE_LABELS[y_pred], 'prediction': y_pred}
+    if invalid_fields:
+        record['invalid_fields'] = list(invalid_fields)
+    else:
+        record['probability'] = float(y_pred_proba)
+    if explanation is not None:
+        record.update(explanation)
+    return record
+
+
+def iter_prediction_records(user_inputs, batch_size):
+    """
+    Scores a stream of campaign records in batches and yields one prediction record per input, in input order.
+
+    Args:
+        user_inputs (iterable[Campaign object or dict]): campaign records to score; None marks a record that
+            could not be parsed
+        batch_size (int): number of records scored per model call
+
+    Yields:
+        record (dict): prediction record with the zero-based input row number under 'row'
+    """
+    def score(chunk, start):
+        records = [user_input for user_input in chunk if user_input is not None]
+        y_pred, y_pred_proba, invalid_fields = process_user_inputs(records) if records else ([], [], [])
+        scored = iter(zip(y_pred, y_pred_proba, invalid_fields))
+        for row, user_input in enumerate(chunk, start):
+            if user_input is None:
+                record = {'error': 'Record could not be parsed.'}
+            else:
+                record = make_prediction_record(*next(scored))
+            record['row'] = row
+            yield record
+
+    chunk = []
+    start = 0
+    for user_input in user_inputs:
+        chunk.append(user_input)
+        if len(chunk) >= batch_size:
+            yield from score(chunk, start)
+            start += len(chunk)
+            chunk = []
+    if chunk:
+        yield from score(chunk, start)
@@ -0,0 +1,323 @@
+import json
+import pytest
+import app as flask_app
+from src import config
+from src import predict_state
+from src.kickstarter_db import Base, Campaign, Prediction, get_engine, session_scope, make_campaign
+
+###########################################################################################################
+
+
+def make_user_input(name, **fields):
+    """Builds raw campaign fields as submitted through the form."""
+    user_input = {'name': name, 'blurb': "A fun board game", 'USD_goal': "5000", 'num_days': "30", 'country': "US",
+                  'category_name': "Tabletop Games", 'p_category_name': "Games", 'staff_pick': "False"}
+    user_input.update(fields)
+    return user_input
+
+
+def expected_probability(model, user_input):
+    """Scores raw campaign fields directly with a model, bypassing the app."""
+    encoder = predict_state.get_encoder()
+    features, _ = predict_state.validate_user_input(user_input, encoder.vocabularies)
+    return model.predict_proba(encoder.encode([features]))[0, 1]
+
+
+def explained_features():
+    """Names of the features an explanation has one contribution for."""
+    encoder = predict_state.get_encoder()
+    return encoder.numerical_cols + encoder.categorical_cols
+
+
+@pytest.fixture
+def history_client(tmp_path, monkeypatch):
+    """Flask test client reading a database of five campaigns, the newest with a stored prediction."""
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    with session_scope(engine_string) as session:
+        for i in range(5):
+            campaign = make_campaign(make_user_input(f"Campaign {i}", country="US" if i % 2 == 0 else "GB"))
+            if i == 4:
+                campaign.prediction = Prediction(feature_hash='abc', model_version='v1', label=1, probability=0.9)
+            session.add(campaign)
+    monkeypatch.setitem(flask_app.app.config, 'SQLALCHEMY_DATABASE_URI', engine_string)
+    return flask_app.app.test_client()
+
+
+def test_history_json(history_client):
+    """
+    Happy path for /history.json: pages follow each other through the next_before cursor, newest first.
+    """
+    first = history_client.get('/history.json?limit=2').get_json()
+    assert [campaign['name'] for campaign in first['campaigns']] == ["Campaign 4", "Campaign 3"]
+    assert first['campaigns'][0]['prediction'] == {'predicted_state': 'SUCCESS', 'probability': 0.9,
+                                                   'model_version': 'v1'}
+    assert first['campaigns'][1]['prediction'] is None
+
+    second = history_client.get(f"/history.json?limit=2&before={first['next_before']}").get_json()
+    assert [campaign['name'] for campaign in second['campaigns']] == ["Campaign 2", "Campaign 1"]
+    last = history_client.get(f"/history.json?limit=2&before={second['next_before']}").get_json()
+    assert [campaign['name'] for campaign in last['campaigns']] == ["Campaign 0"]
+    assert last['next_before'] is None
+
+    filtered = history_client.get('/history.json?country=us').get_json()
+    assert [campaign['name'] for campaign in filtered['campaigns']] == ["Campaign 4", "Campaign 2", "Campaign 0"]
+    assert filtered['filters'] == {'country': 'us'}
+
+
+def test_history_json_unhappy(history_client, tmp_path, monkeypatch):
+    """
+    Unhappy path for /history.json: a malformed before or limit is a 400 and an unreadable database a JSON 500.
+    """
+    for query in ['before=abc', 'before=0', 'limit=0', 'limit=-3', 'limit=ten']:
+        response = history_client.get(f"/history.json?{query}")
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+    monkeypatch.setitem(flask_app.app.config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'empty.db'}")
+    response = history_client.get('/history.json')
+    assert response.status_code == 500
+    assert response.get_json() == {'error': 'History could not be read.'}
+
+
+def test_history(history_client):
+    """
+    Happy path for /history: the page lists the campaigns and links to the next page.
+    """
+    response = history_client.get('/history?limit=2')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert "Campaign 4" in page and "Campaign 3" in page and "Campaign 2" not in page
+    assert "SUCCESS" in page
+    assert "/history?before=4" in page
+
+
+def test_history_unhappy(history_client, tmp_path, monkeypatch):
+    """
+    Unhappy path for /history: a malformed before is a 400 and an unreadable database renders the error page.
+    """
+    assert history_client.get('/history?before=abc').status_code == 400
+
+    monkeypatch.setitem(flask_app.app.config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'empty.db'}")
+    assert history_client.get('/history').status_code == 500
+
+
+###########################################################################################################
+
+
+def test_predict(served_model):
+    """
+    Happy path for /predict: a valid campaign is scored by the served model, and explained when asked for.
+    """
+    client = flask_app.app.test_client()
+    user_input = make_user_input("Board Game", USD_goal="1000")
+    response = client.post('/predict', json=user_input)
+    assert response.status_code == 200
+    record = response.get_json()
+    assert record['probability'] == pytest.approx(expected_probability(served_model, user_input))
+    assert record['predicted_state'] == predict_state.STATE_LABELS[record['prediction']]
+    assert 'contributions' not in record
+
+    explained = client.post('/predict?explain=true', json=user_input).get_json()
+    assert explained['probability'] == pytest.approx(record['probability'])
+    assert explained['baseline'] + sum(explained['contributions'].values()) == pytest.approx(record['probability'])
+    assert set(explained['contributions']) == set(explained_features())
+
+
+def test_predict_unhappy(served_model):
+    """
+    Unhappy path for /predict: invalid fields and bodies that are not JSON objects are a 400.
+    """
+    client = flask_app.app.test_client()
+    response = client.post('/predict', json=make_user_input("Board Game", country="Atlantis"))
+    assert response.status_code == 400
+    assert response.get_json()['invalid_fields'] == ['country']
+    assert client.post('/predict', data="not json").status_code == 400
+    assert client.post('/predict', json=["Board Game"]).status_code == 400
+
+    # A JSON integer too large for a float is an invalid field, not a server error
+    body = json.dumps(make_user_input("Board Game")).replace('"5000"', "1" + "0" * 400)
+    response = client.post('/predict', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['invalid_fields'] == ['USD_goal']
+
+
+def test_predict_batch(served_model, monkeypatch):
+    """
+    Happy path for /predict/batch: one record per line is streamed back across scoring batches, in input order.
+    """
+    monkeypatch.setitem(flask_app.app.config, 'PREDICT_BATCH_SIZE', 2)
+    user_inputs = [make_user_input("Board Game", USD_goal=str(goal)) for goal in [500, 20000, 3000]]
+    lines = [json.dumps(user_inputs[0]), "not json", json.dumps(make_user_input("Card Game", num_days="a month")),
+             "", json.dumps(user_inputs[1]), json.dumps(user_inputs[2])]
+    response = flask_app.app.test_client().post('/predict/batch', data="\n".join(lines) + "\n",
+                                                content_type='application/x-ndjson')
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['row'] for record in records] == [0, 1, 2, 3, 4]
+    assert records[1] == {'error': 'Record could not be parsed.', 'row': 1}
+    assert records[2]['invalid_fields'] == ['num_days']
+    for record, user_input in zip([records[0], records[3], records[4]], user_inputs):
+        assert record['probability'] == pytest.approx(expected_probability(served_model, user_input))
+
+
+def test_output(served_model, tmp_path, monkeypatch):
+    """
+    Happy path for /output: every submission is stored, and one with the features of an earlier one is answered
+    from the prediction cache, without reading the database or running the model, and shares its stored prediction.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    monkeypatch.setitem(flask_app.app.config, 'SQLALCHEMY_DATABASE_URI', engine_string)
+    monkeypatch.setattr(flask_app, 'campaign_writer', None)
+    client = flask_app.app.test_client()
+
+    user_input = make_user_input("Board Game", USD_goal="1000")
+    first = client.post('/output', data=user_input)
+    assert first.status_code == 200
+    assert predict_state.STATE_LABELS[1] in first.get_data(as_text=True)
+
+    # Same features (the name has the same length), so the cache answers without the database or the model
+    monkeypatch.setattr(flask_app, 'lookup_prediction', None)
+    monkeypatch.setattr(predict_state, 'score_features', None)
+    second = client.post('/output', data=dict(user_input, name="Card Games"))
+    assert second.status_code == 200
+    assert predict_state.STATE_LABELS[1] in second.get_data(as_text=True)
+    with session_scope(engine_string) as session:
+        campaigns = session.query(Campaign).order_by(Campaign.id).all()
+        assert [campaign.name for campaign in campaigns] == ["Board Game", "Card Games"]
+        assert campaigns[0].prediction_id == campaigns[1].prediction_id is not None
+        prediction = session.query(Prediction).one()
+        assert prediction.probability == pytest.approx(expected_probability(served_model, user_input))
+        assert json.loads(prediction.explanation)['contributions']
+
+
+def test_output_stored(served_model, tmp_path, monkeypatch):
+    """
+    Happy path for /output: on a prediction cache miss, e.g. in another worker, a stored prediction answers without
+    running the model and fills the cache.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    monkeypatch.setitem(flask_app.app.config, 'SQLALCHEMY_DATABASE_URI', engine_string)
+    monkeypatch.setattr(flask_app, 'campaign_writer', None)
+    client = flask_app.app.test_client()
+    user_input = make_user_input("Board Game", USD_goal="1000")
+    client.post('/output', data=user_input)
+
+    predict_state.get_prediction_cache().clear()
+    lookup_prediction = flask_app.lookup_prediction
+    lookups = []
+    monkeypatch.setattr(flask_app, 'lookup_prediction', lambda key: lookups.append(key) or lookup_prediction(key))
+    monkeypatch.setattr(predict_state, 'score_features', None)
+    second = client.post('/output', data=dict(user_input, name="Card Games"))
+    assert second.status_code == 200
+    assert predict_state.STATE_LABELS[1] in second.get_data(as_text=True)
+    assert len(lookups) == 1
+    encoder = predict_state.get_encoder()
+    features, _ = predict_state.validate_user_input(user_input, encoder.vocabularies)
+    assert predict_state.cached_prediction(features, encoder) is not None
+    with session_scope(engine_string) as session:
+        campaigns = session.query(Campaign).order_by(Campaign.id).all()
+        assert campaigns[0].prediction_id == campaigns[1].prediction_id is not None
+        assert session.query(Prediction).count() == 1
+
+
+def test_output_unhappy(served_model, tmp_path, monkeypatch):
+    """
+    Unhappy path for /output: an invalid submission is stored with its invalid fields and without a prediction.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    monkeypatch.setitem(flask_app.app.config, 'SQLALCHEMY_DATABASE_URI', engine_string)
+    monkeypatch.setattr(flask_app, 'campaign_writer', None)
+
+    response = flask_app.app.test_client().post('/output', data=make_user_input("Board Game", USD_goal="a lot"))
+    assert response.status_code == 200
+    assert predict_state.STATE_LABELS[-1] in response.get_data(as_text=True)
+    with session_scope(engine_string) as session:
+        campaign = session.query(Campaign).one()
+        assert (campaign.invalid_fields, campaign.prediction_id) == ('USD_goal', None)
+
+
+###########################################################################################################
+
+
+def test_readyz(served_model, monkeypatch):
+    """
+    Happy path for /readyz: the worker reports ready once the warmup has scored with the served model.
+    """
+    ready = flask_app.threading.Event()
+    monkeypatch.setattr(flask_app, 'ready', ready)
+    monkeypatch.setattr(flask_app, 'warmup_error', None)
+    client = flask_app.app.test_client()
+    assert client.get('/readyz').status_code == 503
+    assert client.get('/healthz').get_json() == {'status': 'ok'}
+
+    flask_app.warmup_app()
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ready'}
+
+
+def test_readyz_unhappy(tmp_path, monkeypatch):
+    """
+    Unhappy path for /readyz: a warmup without a model keeps the worker out of rotation and reports why.
+    """
+    monkeypatch.setattr(config, 'MODEL_FORMAT', 'pickle')
+    monkeypatch.setattr(config, 'MODEL_STORE_PATH', str(tmp_path / 'missing.pkl'))
+    monkeypatch.setattr(flask_app, 'ready', flask_app.threading.Event())
+    monkeypatch.setattr(flask_app, 'warmup_error', None)
+
+    flask_app.warmup_app()
+    response = flask_app.app.test_client().get('/readyz')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'failed'
+    assert 'missing.pkl' in response.get_json()['error']
+    assert flask_app.app.test_client().get('/healthz').status_code == 200
+
+
+###########################################################################################################
+
+
+def test_predict_sweep(served_model):
+    """
+    Happy path for /predict/sweep: the surface is the served model's probability at every goal and duration, and
+    the best setting is its maximum.
+    """
+    user_input = make_user_input("Board Game")
+    response = flask_app.app.test_client().post('/predict/sweep', json={
+        'campaign': user_input, 'USD_goal': {'min': 1000, 'max': 9000, 'steps': 3}, 'num_days': [15, 45]})
+    assert response.status_code == 200
+    sweep = response.get_json()
+    assert (sweep['USD_goal'], sweep['num_days']) == ([1000, 5000, 9000], [15, 45])
+    for goal, row in zip(sweep['USD_goal'], sweep['probability']):
+        for days, probability in zip(sweep['num_days'], row):
+            campaign = dict(user_input, USD_goal=str(goal), num_days=str(days))
+            assert probability == pytest.approx(expected_probability(served_model, campaign))
+    best = sweep['best']
+    surface = {(goal, days): probability for goal, row in zip(sweep['USD_goal'], sweep['probability'])
+               for days, probability in zip(sweep['num_days'], row)}
+    assert best['probability'] == max(surface.values()) == surface[(best['USD_goal'], best['num_days'])]
+
+
+def test_predict_sweep_unhappy(served_model):
+    """
+    Unhappy path for /predict/sweep: an invalid campaign, a malformed range and an oversized grid are a 400.
+    """
+    client = flask_app.app.test_client()
+    response = client.post('/predict/sweep', json={'campaign': make_user_input("Board Game", country="Atlantis")})
+    assert response.status_code == 400
+    assert response.get_json()['invalid_fields'] == ['country']
+
+    campaign = make_user_input("Board Game", USD_goal="a lot")
+    assert client.post('/predict/sweep', json={'campaign': campaign, 'USD_goal': [1000, 2000]}).status_code == 200
+    assert client.post('/predict/sweep', json={'campaign': campaign}).status_code == 400
+    oversized = {'min': 1, 'max': 10 ** 6, 'steps': config.SWEEP_MAX_POINTS}
+    response = client.post('/predict/sweep', json={'campaign': campaign, 'USD_goal': oversized, 'num_days': [10, 20]})
+    assert response.status_code == 400
+    assert 'exceeds the limit' in response.get_json()['error']
+    assert client.post('/predict/sweep', json={'campaign': campaign, 'USD_goal': "lots"}).status_code == 400
+
+
+###########################################################################################################
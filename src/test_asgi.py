@@ -0,0 +1,142 @@
+import json
+import asyncio
+import pytest
+import asgi
+from src import predict_state
+from src.micro_batcher import run_in_new_loop
+
+###########################################################################################################
+
+
+def make_user_input(name, **fields):
+    """Builds raw campaign fields as posted to /predict."""
+    user_input = {'name': name, 'blurb': "A fun board game", 'USD_goal': "5000", 'num_days': "30", 'country': "US",
+                  'category_name': "Tabletop Games", 'p_category_name': "Games", 'staff_pick': "False"}
+    user_input.update(fields)
+    return user_input
+
+
+async def call(method, path, body=b'', query_string=b''):
+    """Sends one request to the ASGI app and collects the response.
+
+    Args:
+        method (string): HTTP method
+        path (string): request path
+        body (bytes): request body, sent in two parts to exercise the body reader
+        query_string (bytes): raw query string
+
+    Returns:
+        status (int): HTTP status code
+        body (dict): parsed JSON response body
+    """
+    parts = [body[:len(body) // 2], body[len(body) // 2:]]
+    messages = []
+
+    async def receive():
+        part = parts.pop(0)
+        return {'type': 'http.request', 'body': part, 'more_body': bool(parts)}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query_string}
+    await asgi.app(scope, receive, send)
+    return messages[0]['status'], json.loads(messages[1]['body'])
+
+
+def run_requests(*requests):
+    """Sends requests concurrently on a fresh event loop and stops the batchers before the loop closes.
+
+    Args:
+        requests (tuple): arguments of call per request
+
+    Returns:
+        responses (list[tuple]): status and body per request, in the order of the requests
+    """
+    async def run():
+        try:
+            return await asyncio.gather(*(call(*request) for request in requests))
+        finally:
+            await asgi.batcher.stop()
+            await asgi.explain_batcher.stop()
+
+    return run_in_new_loop(run())
+
+
+def test_predict(served_model):
+    """
+    Happy path for the ASGI /predict: concurrent requests are scored together and each gets its own prediction.
+    """
+    encoder = predict_state.get_encoder()
+    user_inputs = [make_user_input(f"Campaign {i}", USD_goal=str(1000 * (i + 1))) for i in range(12)]
+    batches = asgi.batcher.batches
+    responses = run_requests(*(('POST', '/predict', json.dumps(user_input).encode()) for user_input in user_inputs))
+
+    assert asgi.batcher.batches - batches < len(user_inputs)
+    for (status, record), user_input in zip(responses, user_inputs):
+        features, _ = predict_state.validate_user_input(user_input, encoder.vocabularies)
+        assert status == 200
+        assert record['probability'] == pytest.approx(served_model.predict_proba(encoder.encode([features]))[0, 1])
+        assert 'contributions' not in record
+
+    (status, explained), = run_requests(('POST', '/predict', json.dumps(user_inputs[0]).encode(), b'explain=true'))
+    assert status == 200
+    assert explained['probability'] == pytest.approx(responses[0][1]['probability'])
+    assert explained['baseline'] + sum(explained['contributions'].values()) == pytest.approx(explained['probability'])
+
+
+def test_predict_unhappy(served_model):
+    """
+    Unhappy path for the ASGI app: invalid fields and bodies that are not JSON objects are a 400, other routes a 404.
+    """
+    invalid = json.dumps(make_user_input("Board Game", country="Atlantis")).encode()
+    responses = run_requests(('POST', '/predict', invalid),
+                             ('POST', '/predict', b'not json'),
+                             ('POST', '/predict', b'["Board Game"]'),
+                             ('GET', '/predict'),
+                             ('GET', '/history'))
+    assert [status for status, _ in responses] == [400, 400, 400, 404, 404]
+    assert responses[0][1]['invalid_fields'] == ['country']
+    assert responses[1][1] == {'error': 'Request body must be a JSON object of campaign fields.'}
+
+
+def test_predict_huge_integer(served_model):
+    """
+    Unhappy path for the ASGI /predict: a JSON integer too large for a float fails only its own request, not the
+    requests batched with it.
+    """
+    huge = json.dumps(make_user_input("Board Game")).replace('"5000"', "1" + "0" * 400).encode()
+    valid = json.dumps(make_user_input("Card Game")).encode()
+    responses = run_requests(('POST', '/predict', valid), ('POST', '/predict', huge), ('POST', '/predict', valid))
+    assert [status for status, _ in responses] == [200, 400, 200]
+    assert responses[1][1]['invalid_fields'] == ['USD_goal']
+
+
+def test_lifespan(served_model, monkeypatch):
+    """
+    Happy path for the ASGI lifespan: the startup warmup makes /readyz report ready with the batching statistics.
+    """
+    monkeypatch.setattr(asgi, 'ready', asyncio.Event())
+    monkeypatch.setattr(asgi, 'warmup_error', None)
+    messages = ['lifespan.startup', 'lifespan.shutdown']
+    sent = []
+
+    async def receive():
+        return {'type': messages.pop(0)}
+
+    async def send(message):
+        sent.append(message['type'])
+
+    async def run():
+        before = await call('GET', '/readyz')
+        await asgi.app({'type': 'lifespan'}, receive, send)
+        return before, await call('GET', '/readyz'), await call('GET', '/healthz')
+
+    before, after, health = run_in_new_loop(run())
+    assert before == (503, {'status': 'warming up'})
+    assert after[0] == 200 and after[1]['status'] == 'ready'
+    assert set(after[1]) == {'status', 'batching', 'explain_batching'}
+    assert health == (200, {'status': 'ok'})
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+###########################################################################################################
@@ -0,0 +1,108 @@
+import pytest
+import pandas as pd
+import sqlalchemy as sql
+from src.bulk_ingest import *
+
+###########################################################################################################
+
+
+def test_to_campaign_records():
+    """
+    Happy path for to_campaign_records: fields are typed and normalized, a missing value is recorded as a validation
+    failure, and columns that are not campaign fields are ignored.
+    """
+    chunk = pd.DataFrame({'name': ['A'], 'blurb': ['Games!'], 'USD_goal': [1000], 'num_days': [None],
+                          'country': ['US'], 'category_name': ['Tabletop Games'], 'p_category_name': ['Games'],
+                          'staff_pick': ['True'], 'state': ['successful']})
+    assert to_campaign_records(chunk) == [{'name': 'A', 'blurb': 'Games!', 'USD_goal': 1000.0, 'num_days': None,
+                                           'country': 'us', 'category_name': 'tabletop games',
+                                           'p_category_name': 'games', 'staff_pick': True,
+                                           'invalid_fields': 'num_days'}]
+
+
+def test_to_campaign_records_unhappy():
+    """
+    Unhappy path for to_campaign_records: an input without every campaign field is rejected.
+    """
+    with pytest.raises(ValueError):
+        to_campaign_records(pd.DataFrame({'name': ['A'], 'blurb': ['Games!']}))
+
+###########################################################################################################
+
+
+def test_ingest_file(tmp_path):
+    """
+    Happy path for ingest_file: an interrupted ingest resumes after the last committed chunk, so every row is
+    inserted exactly once.
+    """
+    input_path = tmp_path / "campaigns.csv"
+    pd.DataFrame([{'name': f"Campaign {i}", 'blurb': 'Games!', 'USD_goal': '1000', 'num_days': '30', 'country': 'US',
+                   'category_name': 'Tabletop Games', 'p_category_name': 'Games', 'staff_pick': 'False'}
+                  for i in range(10)]).to_csv(input_path, index=False)
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    fingerprint = file_fingerprint(input_path)
+    save_chunk([], os.path.abspath(input_path), fingerprint, 4, False, engine_string)
+
+    report = ingest_file(str(input_path), engine_string, chunk_size=3)
+    assert (report['rows'], report['skipped'], report['chunks']) == (6, 4, 3)
+    assert get_checkpoint(os.path.abspath(input_path), fingerprint, engine_string) == (10, True)
+    with get_engine(engine_string).connect() as connection:
+        names = [row[0] for row in connection.execute(sql.text("SELECT name FROM kickstarter"))]
+    assert names == [f"Campaign {i}" for i in range(4, 10)]
+
+
+def test_ingest_file_unhappy(tmp_path):
+    """
+    Unhappy path for ingest_file: a file that was already ingested completely is not inserted again.
+    """
+    input_path = tmp_path / "campaigns.ndjson"
+    input_path.write_text('{"name": "A", "blurb": "Games!", "USD_goal": 1000, "num_days": 30, "country": "US", '
+                          '"category_name": "Tabletop Games", "p_category_name": "Games", "staff_pick": false}\n')
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    assert ingest_file(str(input_path), engine_string)['rows'] == 1
+    assert ingest_file(str(input_path), engine_string)['rows'] == 0
+    assert ingest_file(str(input_path), engine_string, restart=True)['rows'] == 1
+
+
+def test_ingest_file_ndjson_missing_field(tmp_path):
+    """
+    Unhappy path for ingest_file: a record missing num_days is invalid, without invalidating the integer num_days of
+    the other records in its chunk.
+    """
+    input_path = tmp_path / "campaigns.ndjson"
+    input_path.write_text('{"name": "A", "blurb": "Games!", "USD_goal": 1000, "num_days": 30, "country": "US", '
+                          '"category_name": "Tabletop Games", "p_category_name": "Games", "staff_pick": false}\n'
+                          '{"name": "B", "blurb": "Games!", "USD_goal": 1000, "country": "US", '
+                          '"category_name": "Tabletop Games", "p_category_name": "Games", "staff_pick": true}\n')
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    assert ingest_file(str(input_path), engine_string)['invalid'] == 1
+    with get_engine(engine_string).connect() as connection:
+        rows = connection.execute(sql.text("SELECT name, num_days, staff_pick, invalid_fields FROM kickstarter "
+                                           "ORDER BY id")).fetchall()
+    assert [tuple(row) for row in rows] == [('A', 30, 0, None), ('B', None, 1, 'num_days')]
+
+
+def test_ingest_file_changed(tmp_path):
+    """
+    Unhappy path for ingest_file: a file that changed since its checkpoint is refused rather than resumed, and is
+    ingested again in full with restart.
+    """
+    record = ('{"name": "A", "blurb": "Games!", "USD_goal": 1000, "num_days": 30, "country": "US", '
+              '"category_name": "Tabletop Games", "p_category_name": "Games", "staff_pick": false}\n')
+    input_path = tmp_path / "campaigns.ndjson"
+    input_path.write_text(record)
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    assert ingest_file(str(input_path), engine_string)['rows'] == 1
+    input_path.write_text(record * 3)
+    with pytest.raises(ValueError):
+        ingest_file(str(input_path), engine_string)
+    assert ingest_file(str(input_path), engine_string, restart=True)['rows'] == 3
+    assert ingest_file(str(input_path), engine_string)['rows'] == 0
+
+###########################################################################################################
+
+
+if __name__ == "__main__":
+    test_to_campaign_records()
+    test_to_campaign_records_unhappy()
@@ -0,0 +1,147 @@
+import io
+import os
+import json
+import pytest
+import numpy as np
+from src.bulk_score import *
+
+###########################################################################################################
+
+
+def test_iter_chunks(tmp_path):
+    """
+    Happy path for iter_chunks: a CSV is streamed in chunks of strings, with empty cells kept as empty strings.
+    """
+    input_path = tmp_path / "campaigns.csv"
+    input_path.write_text("name,USD_goal,country\nA,1000,US\nB,,GB\nC,25.5,AU\n")
+    chunks = list(iter_chunks(str(input_path), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert list(chunks[0]['USD_goal']) == ['1000', '']
+    assert list(chunks[1]['USD_goal']) == ['25.5']
+
+
+def test_iter_chunks_unhappy(tmp_path):
+    """
+    Unhappy path for iter_chunks: missing NDJSON keys come through as missing values, not as empty strings.
+    """
+    input_path = tmp_path / "campaigns.ndjson"
+    input_path.write_text('{"name": "A", "USD_goal": 1000}\n{"name": "B"}\n')
+    chunk = next(iter_chunks(str(input_path), chunk_size=10))
+    assert chunk['USD_goal'].isna().tolist() == [False, True]
+
+
+def test_iter_chunks_booleans(tmp_path):
+    """
+    Happy path for iter_chunks: NDJSON staff_pick booleans are spelled as in the form, so they validate like CSV
+    entries; other booleans are kept, so they validate as they do in /predict.
+    """
+    input_path = tmp_path / "campaigns.ndjson"
+    input_path.write_text('{"name": "A", "staff_pick": false, "USD_goal": true}\n'
+                          '{"name": "B", "staff_pick": true, "USD_goal": 1000}\n')
+    chunk = next(iter_chunks(str(input_path), chunk_size=10))
+    assert list(chunk['staff_pick']) == ['False', 'True']
+    assert list(chunk['USD_goal']) == [True, 1000]
+
+###########################################################################################################
+
+
+def test_write_predictions():
+    """
+    Happy path for write_predictions: CSV chunks after the first are appended without a header.
+    """
+    predictions = pd.DataFrame({'row': [0], 'predicted_state': ['SUCCESS'], 'prediction': [1],
+                                'probability': [0.75], 'invalid_fields': ['']}, columns=OUTPUT_COLUMNS)
+    outfile = io.StringIO()
+    write_predictions(predictions, outfile, ndjson=False, header=True)
+    write_predictions(predictions.assign(row=1), outfile, ndjson=False, header=False)
+    assert outfile.getvalue().splitlines() == [','.join(OUTPUT_COLUMNS), '0,SUCCESS,1,0.75,', '1,SUCCESS,1,0.75,']
+
+
+def test_write_predictions_unhappy():
+    """
+    Unhappy path for write_predictions: the missing probability of an invalid campaign is written as JSON null.
+    """
+    predictions = pd.DataFrame({'row': [3], 'predicted_state': ['INVALID USER ENTRY'], 'prediction': [-1],
+                                'probability': [np.nan], 'invalid_fields': ['USD_goal;country']}, columns=OUTPUT_COLUMNS)
+    outfile = io.StringIO()
+    write_predictions(predictions, outfile, ndjson=True, header=True)
+    assert json.loads(outfile.getvalue()) == {'row': 3, 'predicted_state': 'INVALID USER ENTRY', 'prediction': -1,
+                                              'probability': None, 'invalid_fields': 'USD_goal;country'}
+
+
+def make_campaigns(n):
+    """Builds raw campaign fields as typed into the form, with the goal of every fourth campaign invalid."""
+    return [{'name': f"Campaign {i}", 'blurb': "A fun board game",
+             'USD_goal': "a lot" if i % 4 == 3 else str(800 * i + 100), 'num_days': "30", 'country': "US", 'category_name': "Tabletop Games", 'p_category_name': "Games",
+             'staff_pick': "True" if i % 2 else "False"} for i in range(n)]
+
+
+def expected_probabilities(model, campaigns):
+    """Scores raw campaign fields one by one with a model, bypassing score_file; None for invalid campaigns."""
+    encoder = predict_state.get_encoder()
+    probabilities = []
+    for campaign in campaigns:
+        features, invalid_fields = predict_state.validate_user_input(campaign, encoder.vocabularies)
+        probabilities.append(None if invalid_fields else model.predict_proba(encoder.encode([features]))[0, 1])
+    return probabilities
+
+
+def test_score_file(served_model, tmp_path):
+    """
+    Happy path for score_file: chunks scored by a pool of workers are written in input order.
+    """
+    campaigns = make_campaigns(11)
+    input_path = tmp_path / "campaigns.csv"
+    pd.DataFrame(campaigns).to_csv(input_path, index=False)
+    output_path = tmp_path / "predictions.ndjson"
+
+    report = score_file(str(input_path), str(output_path), chunk_size=2, workers=2)
+    assert (report['rows'], report['valid'], report['invalid']) == (11, 9, 2)
+    records = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert [record['row'] for record in records] == list(range(11))
+    for record, probability in zip(records, expected_probabilities(served_model, campaigns)):
+        if probability is None:
+            assert (record['prediction'], record['probability'], record['invalid_fields']) == (-1, None, 'USD_goal')
+        else:
+            assert record['probability'] == pytest.approx(probability)
+            assert record['predicted_state'] == predict_state.STATE_LABELS[record['prediction']]
+    assert not os.path.exists(f"{output_path}.tmp")
+
+
+def test_score_file_ndjson(served_model, tmp_path):
+    """
+    Happy path for score_file: NDJSON numbers and booleans are scored like the same fields typed into the form.
+    """
+    campaigns = make_campaigns(7)
+    input_path = tmp_path / "campaigns.ndjson"
+    with open(input_path, 'w') as outfile:
+        for campaign in campaigns:
+            goal = campaign['USD_goal']
+            outfile.write(json.dumps(dict(campaign, USD_goal=float(goal) if goal[0].isdigit() else goal,
+                                          num_days=30, staff_pick=campaign['staff_pick'] == "True")) + "\n")
+    output_path = tmp_path / "predictions.csv"
+
+    report = score_file(str(input_path), str(output_path), chunk_size=3, workers=2)
+    assert (report['rows'], report['valid'], report['invalid']) == (7, 6, 1)
+    predictions = pd.read_csv(output_path)
+    assert list(predictions['row']) == list(range(7))
+    assert list(predictions['invalid_fields'].fillna('')) == ['', '', '', 'USD_goal', '', '', '']
+    for probability, expected in zip(predictions['probability'], expected_probabilities(served_model, campaigns)):
+        assert np.isnan(probability) if expected is None else probability == pytest.approx(expected)
+
+
+def test_score_file_unhappy(served_model, tmp_path):
+    """
+    Unhappy path for score_file: an input file that cannot be read leaves no output behind.
+    """
+    output_path = tmp_path / "predictions.csv"
+    with pytest.raises(FileNotFoundError):
+        score_file(str(tmp_path / "missing.csv"), str(output_path), chunk_size=2, workers=2)
+    assert list(tmp_path.iterdir()) == [tmp_path / "model.pkl"]
+
+###########################################################################################################
+
+
+if __name__ == "__main__":
+    test_write_predictions()
+    test_write_predictions_unhappy()
@@ -0,0 +1,127 @@
+import pytest
+import sqlalchemy as sql
+from sqlalchemy.orm import sessionmaker
+from src.kickstarter_db import Base, Campaign, Prediction, link_stored_prediction
+from src.campaign_writer import *
+
+###########################################################################################################
+
+
+def make_campaign(i):
+    return Campaign(name=f"Name {i}", blurb="Blurb!", USD_goal=1000.0, num_days=30, country='us',
+                    category_name='food', p_category_name='food', staff_pick=False)
+
+
+def make_session_factory(tmp_path):
+    engine = sql.create_engine(f"sqlite:///{tmp_path / 'kickstarter.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_campaign_writer(tmp_path):
+    """
+    Happy path for CampaignWriter: buffered campaigns are written in batches and drained on stop.
+    """
+    session_factory = make_session_factory(tmp_path)
+    writer = CampaignWriter(session_factory, batch_size=10, flush_interval=0.05)
+    for i in range(25):
+        assert writer.submit(make_campaign(i))
+    writer.stop()
+
+    session = session_factory()
+    assert session.query(Campaign).count() == 25
+    session.close()
+    stats = writer.stats()
+    assert stats['written'] == 25
+    assert stats['flushes'] >= 3
+    assert stats['queue_depth'] == 0
+
+
+def test_campaign_writer_unhappy(tmp_path):
+    """
+    Unhappy path for CampaignWriter: rows submitted after stop are dropped and counted.
+    """
+    writer = CampaignWriter(make_session_factory(tmp_path), flush_interval=0.05)
+    writer.stop()
+    assert not writer.submit(make_campaign(0))
+    assert writer.stats()['dropped'] == 1
+
+
+def test_campaign_writer_duplicates(tmp_path):
+    """
+    Unhappy path for CampaignWriter: a row clashing with one already stored is dropped without losing its batch.
+    """
+    session_factory = make_session_factory(tmp_path)
+    writer = CampaignWriter(session_factory, batch_size=10, flush_interval=0.05)
+    for i in range(3):
+        campaign = make_campaign(i)
+        campaign.prediction = Prediction(feature_hash='same' if i < 2 else 'other', model_version='v1', label=1,
+                                         probability=0.9)
+        assert writer.submit(campaign)
+    writer.stop()
+
+    stats = writer.stats()
+    assert (stats['written'], stats['duplicates'], stats['failed']) == (2, 1, 0)
+    session = session_factory()
+    assert session.query(Campaign).count() == 2
+    session.close()
+
+
+def test_campaign_writer_resolve_conflict(tmp_path):
+    """
+    Happy path for CampaignWriter: a campaign whose prediction clashes with a stored one is linked to the stored
+    prediction and written, so distinct campaigns with the same features are all kept.
+    """
+    session_factory = make_session_factory(tmp_path)
+    writer = CampaignWriter(session_factory, batch_size=10, flush_interval=0.05,
+                            resolve_conflict=link_stored_prediction)
+    for i in range(3):
+        campaign = make_campaign(i)
+        campaign.prediction = Prediction(feature_hash='same' if i < 2 else 'other', model_version='v1', label=1,
+                                         probability=0.9)
+        assert writer.submit(campaign)
+    writer.stop()
+
+    stats = writer.stats()
+    assert (stats['written'], stats['duplicates'], stats['failed']) == (3, 0, 0)
+    session = session_factory()
+    prediction_ids = [row[0] for row in session.query(Campaign.prediction_id).order_by(Campaign.id)]
+    assert session.query(Prediction).count() == 2
+    session.close()
+    assert prediction_ids[0] == prediction_ids[1] != prediction_ids[2]
+
+
+def test_campaign_writer_resolve_stored(tmp_path):
+    """
+    Happy path for CampaignWriter: campaigns carrying a prediction that is already stored are linked to it before
+    their batch is written, so the batch does not clash.
+    """
+    session_factory = make_session_factory(tmp_path)
+    session = session_factory()
+    session.add(Prediction(feature_hash='same', model_version='v1', label=1, probability=0.9))
+    session.commit()
+    session.close()
+
+    resolved = []
+
+    def resolve_conflict(session, row):
+        resolved.append(row.name)
+        return link_stored_prediction(session, row)
+
+    writer = CampaignWriter(session_factory, batch_size=10, flush_interval=0.05, resolve_conflict=resolve_conflict)
+    for i in range(3):
+        campaign = make_campaign(i)
+        campaign.prediction = Prediction(feature_hash='same', model_version='v1', label=1, probability=0.9)
+        assert writer.submit(campaign)
+    writer.stop()
+
+    stats = writer.stats()
+    assert (stats['written'], stats['duplicates'], stats['flushes']) == (3, 0, 1)
+    # Each row was resolved once, up front, rather than again after a clash
+    assert resolved == ["Name 0", "Name 1", "Name 2"]
+    session = session_factory()
+    assert session.query(Prediction).count() == 1
+    assert session.query(Campaign).filter(Campaign.prediction_id.isnot(None)).count() == 3
+    session.close()
+
+###########################################################################################################
@@ -0,0 +1,115 @@
+import pytest
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from src.forest_engine import *
+
+###########################################################################################################
+
+
+def make_forest(n_features=6):
+    rng = np.random.RandomState(0)
+    X = rng.rand(300, n_features)
+    y = (X[:, 0] + X[:, 1] * rng.rand(300) > 0.8).astype(int)
+    model = RandomForestClassifier(n_estimators=15, criterion='entropy', random_state=123).fit(X, y)
+    return model, rng.rand(50, n_features)
+
+
+def test_compiled_forest():
+    """
+    Happy path for CompiledForest: probabilities and labels match sklearn for a batch and a single row.
+    """
+    model, X = make_forest()
+    forest = CompiledForest.from_sklearn(model)
+    assert np.allclose(forest.predict_proba(X), model.predict_proba(X))
+    assert np.allclose(forest.predict_proba(X[0]), model.predict_proba(X[:1]))
+    assert (forest.predict(X) == model.predict(X)).all()
+
+
+def test_compiled_forest_unhappy():
+    """
+    Unhappy path for CompiledForest: rows landing exactly on a split threshold follow sklearn's <= rule.
+    """
+    model, X = make_forest()
+    forest = CompiledForest.from_sklearn(model)
+    X_edge = np.repeat(X[:1], forest.n_features, axis=0).astype(np.float32)
+    root_features = forest.feature[forest.roots][:forest.n_features]
+    for i, feature in enumerate(root_features):
+        X_edge[i, feature] = forest.threshold[forest.roots[i]]
+    assert np.allclose(forest.predict_proba(X_edge), model.predict_proba(X_edge))
+
+###########################################################################################################
+
+
+def test_save_load(tmp_path):
+    """
+    Happy path for CompiledForest.save and load: the memory-mapped forest scores like the original.
+    """
+    model, X = make_forest()
+    forest = CompiledForest.from_sklearn(model)
+    forest.save(str(tmp_path / "forest"), {'columns': ['a', 'b']})
+    loaded = CompiledForest.load(str(tmp_path / "forest"))
+    assert np.allclose(loaded.predict_proba(X), model.predict_proba(X))
+    assert (loaded.classes_ == model.classes_).all()
+    assert loaded.metadata['columns'] == ['a', 'b']
+    assert not loaded.value.flags.writeable
+
+
+def test_save_load_unhappy(tmp_path):
+    """
+    Unhappy path for CompiledForest.save: saving over an existing export replaces it whole.
+    """
+    model, X = make_forest()
+    other, _ = make_forest(n_features=3)
+    CompiledForest.from_sklearn(other).save(str(tmp_path / "forest"))
+    CompiledForest.from_sklearn(model).save(str(tmp_path / "forest"))
+    loaded = CompiledForest.load(str(tmp_path / "forest"))
+    assert loaded.n_features == 6
+    assert np.allclose(loaded.predict_proba(X), model.predict_proba(X))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['forest']
+
+
+def test_load_older_export(tmp_path):
+    """
+    Unhappy path for CompiledForest.load: an export without the derived arrays gets them derived on load.
+    """
+    model, X = make_forest()
+    CompiledForest.from_sklearn(model).save(str(tmp_path / "forest"))
+    for name in ['is_leaf', 'children', 'delta', 'parent_feature']:
+        (tmp_path / "forest" / f"{name}.npy").unlink()
+    loaded = CompiledForest.load(str(tmp_path / "forest"))
+    assert np.allclose(loaded.predict_proba(X), model.predict_proba(X))
+    baseline, contributions = loaded.contributions(X)
+    assert np.allclose(baseline + contributions.sum(axis=1), model.predict_proba(X)[:, 1])
+
+###########################################################################################################
+
+
+def test_contributions():
+    """
+    Happy path for CompiledForest.contributions: baseline plus contributions equals the predicted probability.
+    """
+    model, X = make_forest()
+    forest = CompiledForest.from_sklearn(model)
+    baseline, contributions = forest.contributions(X)
+    assert contributions.shape == (len(X), forest.n_features)
+    assert np.allclose(baseline + contributions.sum(axis=1), model.predict_proba(X)[:, 1])
+    single_baseline, single = forest.contributions(X[0])
+    assert np.allclose(single, contributions[:1])
+
+
+def test_contributions_unhappy(tmp_path):
+    """
+    Unhappy path for CompiledForest.contributions: features no tree splits on get no contribution, also after a
+    save and load without the precomputed deltas.
+    """
+    model, X = make_forest(n_features=6)
+    forest = CompiledForest.from_sklearn(model)
+    forest.save(str(tmp_path / "forest"))
+    (tmp_path / "forest" / "delta.npy").unlink()
+    loaded = CompiledForest.load(str(tmp_path / "forest"))
+    unused = sorted(set(range(6)) - set(forest.feature[~forest.is_leaf]))
+    _, contributions = loaded.contributions(X)
+    assert np.allclose(contributions, forest.contributions(X)[1])
+    assert (contributions[:, unused] == 0).all()
+
+###########################################################################################################
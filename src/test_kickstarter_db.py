@@ -0,0 +1,301 @@
+import pytest
+import sqlalchemy as sql
+from src.kickstarter_db import *
+
+###########################################################################################################
+
+
+def make_user_input(name, **fields):
+    """Builds raw campaign fields as submitted through the form."""
+    user_input = {'name': name, 'blurb': "A fun board game", 'USD_goal': "5000", 'num_days': "30", 'country': "US",
+                  'category_name': "Tabletop Games", 'p_category_name': "Games", 'staff_pick': "False"}
+    user_input.update(fields)
+    return user_input
+
+
+def test_session_scope(tmp_path):
+    """
+    Happy path for session_scope: the campaign added in the block is committed, through the one shared engine.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    assert get_engine(engine_string) is get_engine(engine_string)
+    Base.metadata.create_all(get_engine(engine_string))
+
+    with session_scope(engine_string) as session:
+        session.add(make_campaign(make_user_input("Board Game")))
+
+    with session_scope(engine_string) as session:
+        assert [campaign.name for campaign in session.query(Campaign)] == ["Board Game"]
+
+
+def test_session_scope_unhappy(tmp_path):
+    """
+    Unhappy path for session_scope: a block that raises is rolled back and the error is re-raised.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+
+    with pytest.raises(ValueError):
+        with session_scope(engine_string) as session:
+            session.add(make_campaign(make_user_input("Board Game")))
+            session.flush()
+            raise ValueError("Campaign rejected")
+
+    with session_scope(engine_string) as session:
+        assert session.query(Campaign).count() == 0
+
+###########################################################################################################
+
+
+def test_make_campaign():
+    """
+    Happy path for make_campaign: fields are typed and categoricals normalized to their level.
+    """
+    campaign = make_campaign(make_user_input("Board Game"))
+    assert (campaign.USD_goal, campaign.num_days, campaign.staff_pick) == (5000.0, 30, False)
+    assert (campaign.country, campaign.category_name, campaign.p_category_name) == ('us', 'tabletop games', 'games')
+    assert campaign.invalid_fields is None
+
+
+def test_make_campaign_unhappy():
+    """
+    Unhappy path for make_campaign: invalid entries are recorded in invalid_fields, with typed fields left NULL.
+    """
+    campaign = make_campaign(make_user_input("Board Game", USD_goal="a lot", country="Atlantis"))
+    assert campaign.USD_goal is None
+    assert campaign.country == "Atlantis"
+    assert campaign.invalid_fields == 'USD_goal,country'
+
+###########################################################################################################
+
+
+def make_legacy_db(engine_string, n):
+    """Creates a kickstarter table with the original all-string schema holding n campaigns."""
+    with get_engine(engine_string).begin() as connection:
+        connection.execute(sql.text(
+            "CREATE TABLE kickstarter (id INTEGER PRIMARY KEY, USD_goal VARCHAR(100), staff_pick VARCHAR(100), "
+            "category_name VARCHAR(100), p_category_name VARCHAR(100), blurb VARCHAR(200), name VARCHAR(200), "
+            "country VARCHAR(100), num_days VARCHAR(100))"))
+        for i in range(n):
+            connection.execute(sql.text(
+                "INSERT INTO kickstarter (id, USD_goal, staff_pick, category_name, p_category_name, blurb, name, "
+                "country, num_days) VALUES (:id, :USD_goal, :staff_pick, :category_name, :p_category_name, :blurb, "
+                ":name, :country, :num_days)"),
+                dict(make_user_input(f"Campaign {i}", num_days="30" if i % 3 else "a month",
+                                     staff_pick="True" if i % 2 else "False"), id=2 * i + 1))
+
+
+def test_migrate_campaigns(tmp_path):
+    """
+    Happy path for migrate_campaigns: legacy rows are copied in batches with their ids, typed and validated, and
+    the legacy table is dropped.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    make_legacy_db(engine_string, 7)
+
+    assert migrate_campaigns(engine_string, batch_size=3) == {'rows': 7, 'invalid': 3}
+    assert LEGACY_TABLE not in sql.inspect(get_engine(engine_string)).get_table_names()
+    with session_scope(engine_string) as session:
+        campaigns = session.query(Campaign).order_by(Campaign.id).all()
+        assert [campaign.id for campaign in campaigns] == [1, 3, 5, 7, 9, 11, 13]
+        assert [campaign.num_days for campaign in campaigns[:3]] == [None, 30, 30]
+        assert campaigns[0].invalid_fields == 'num_days'
+        assert all(campaign.created_at is not None for campaign in campaigns)
+
+
+def test_migrate_campaigns_types(tmp_path):
+    """
+    Happy path for migrate_campaigns: migrated values read back with their column types.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    make_legacy_db(engine_string, 2)
+
+    migrate_campaigns(engine_string)
+    with session_scope(engine_string) as session:
+        first, second = session.query(Campaign).order_by(Campaign.id).all()
+        assert (second.USD_goal, second.num_days, second.staff_pick) == (5000.0, 30, True)
+        assert (type(second.USD_goal), type(second.num_days), type(second.staff_pick)) == (float, int, bool)
+        assert first.staff_pick is False
+        assert (second.country, second.category_name, second.p_category_name) == ('us', 'tabletop games', 'games')
+        assert isinstance(second.created_at, datetime.datetime)
+        assert second.prediction_id is None and second.invalid_fields is None
+
+
+def test_migrate_campaigns_resume_after_rename(tmp_path):
+    """
+    Unhappy path for migrate_campaigns: a migration that stopped after renaming the table, before creating the new
+    one, copies every row when run again.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    make_legacy_db(engine_string, 5)
+    with get_engine(engine_string).begin() as connection:
+        connection.execute(sql.text(f"ALTER TABLE kickstarter RENAME TO {LEGACY_TABLE}"))
+
+    assert migrate_campaigns(engine_string, batch_size=2) == {'rows': 5, 'invalid': 2}
+    assert LEGACY_TABLE not in sql.inspect(get_engine(engine_string)).get_table_names()
+
+
+def test_migrate_campaigns_resume_after_batch(tmp_path, monkeypatch):
+    """
+    Unhappy path for migrate_campaigns: a migration that failed after its first batch resumes after the last copied
+    id, so every row is copied exactly once.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    make_legacy_db(engine_string, 7)
+    batches = []
+
+    def fail_second_batch(data):
+        batches.append(len(data))
+        if len(batches) == 2:
+            raise RuntimeError("Connection lost")
+        return make_campaign_records(data)
+
+    monkeypatch.setattr('src.kickstarter_db.make_campaign_records', fail_second_batch)
+    with pytest.raises(RuntimeError):
+        migrate_campaigns(engine_string, batch_size=3)
+    monkeypatch.undo()
+    with session_scope(engine_string) as session:
+        assert [row[0] for row in session.query(Campaign.id).order_by(Campaign.id)] == [1, 3, 5]
+
+    assert migrate_campaigns(engine_string, batch_size=3) == {'rows': 4, 'invalid': 2}
+    with session_scope(engine_string) as session:
+        assert [row[0] for row in session.query(Campaign.id).order_by(Campaign.id)] == [1, 3, 5, 7, 9, 11, 13]
+    assert LEGACY_TABLE not in sql.inspect(get_engine(engine_string)).get_table_names()
+
+
+def test_migrate_campaigns_unhappy(tmp_path):
+    """
+    Unhappy path for migrate_campaigns: a table that already has the typed schema is left as it is.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    with session_scope(engine_string) as session:
+        session.add(make_campaign(make_user_input("Board Game")))
+
+    assert migrate_campaigns(engine_string) == {'rows': 0, 'invalid': 0}
+    with session_scope(engine_string) as session:
+        assert session.query(Campaign).count() == 1
+
+###########################################################################################################
+
+
+def test_find_prediction(tmp_path):
+    """
+    Happy path for find_prediction: a stored prediction is found by its feature hash and model version.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    with session_scope(engine_string) as session:
+        campaign = make_campaign(make_user_input("Board Game"))
+        campaign.prediction = Prediction(feature_hash='abc', model_version='v1', label=1, probability=0.9,
+                                         explanation='{"baseline": 0.5}')
+        session.add(campaign)
+
+    with session_scope(engine_string) as session:
+        prediction = find_prediction(session, 'abc', 'v1')
+        assert (prediction.label, prediction.probability, prediction.explanation) == (1, 0.9, '{"baseline": 0.5}')
+        assert [campaign.name for campaign in prediction.campaigns] == ["Board Game"]
+        assert find_prediction(session, 'abc', 'v2') is None
+
+
+def test_find_prediction_unhappy(tmp_path):
+    """
+    Unhappy path for find_prediction: a second prediction for the same features and model version is rejected.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    with pytest.raises(sql.exc.IntegrityError):
+        with session_scope(engine_string) as session:
+            for name in ["Board Game", "Card Game"]:
+                campaign = make_campaign(make_user_input(name))
+                campaign.prediction = Prediction(feature_hash='abc', model_version='v1', label=1, probability=0.9)
+                session.add(campaign)
+
+    with session_scope(engine_string) as session:
+        assert session.query(Campaign).count() == 0
+
+
+def test_link_stored_prediction(tmp_path):
+    """
+    Happy path for link_stored_prediction: a campaign whose prediction clashed is stored with the existing
+    prediction, next to the campaign that stored it first.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    with session_scope(engine_string) as session:
+        campaign = make_campaign(make_user_input("Board Game"))
+        campaign.prediction = Prediction(feature_hash='abc', model_version='v1', label=1, probability=0.9)
+        session.add(campaign)
+
+    campaign = make_campaign(make_user_input("Card Game"))
+    campaign.prediction = Prediction(feature_hash='abc', model_version='v1', label=1, probability=0.9)
+    with pytest.raises(sql.exc.IntegrityError):
+        with session_scope(engine_string) as session:
+            session.add(campaign)
+    with session_scope(engine_string) as session:
+        assert link_stored_prediction(session, campaign)
+        session.add(campaign)
+
+    with session_scope(engine_string) as session:
+        prediction = find_prediction(session, 'abc', 'v1')
+        assert sorted(campaign.name for campaign in prediction.campaigns) == ["Board Game", "Card Game"]
+        assert session.query(Prediction).count() == 1
+
+
+def test_link_stored_prediction_unhappy(tmp_path):
+    """
+    Unhappy path for link_stored_prediction: a campaign without a prediction, or whose prediction is not stored,
+    is not linked.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    campaign = make_campaign(make_user_input("Board Game"))
+    with session_scope(engine_string) as session:
+        assert not link_stored_prediction(session, campaign)
+        campaign.prediction = Prediction(feature_hash='abc', model_version='v1', label=1, probability=0.9)
+        assert not link_stored_prediction(session, campaign)
+
+
+###########################################################################################################
+
+
+def test_list_campaigns(tmp_path):
+    """
+    Happy path for list_campaigns: pages follow each other by id, newest first, with filters and predictions.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    with session_scope(engine_string) as session:
+        for i in range(6):
+            campaign = make_campaign(make_user_input(f"Campaign {i}", country="US" if i % 2 else "GB"))
+            if i == 5:
+                campaign.prediction = Prediction(feature_hash='abc', model_version='v1', label=1, probability=0.9)
+            session.add(campaign)
+
+    with session_scope(engine_string) as session:
+        first = list_campaigns(session, 2, country='us')
+        assert [(campaign.name, prediction is not None) for campaign, prediction in first] == [
+            ("Campaign 5", True), ("Campaign 3", False)]
+        second = list_campaigns(session, 2, before_id=first[-1][0].id, country='us')
+        assert [campaign.name for campaign, _ in second] == ["Campaign 1"]
+
+
+def test_list_campaigns_unhappy(tmp_path):
+    """
+    Unhappy path for list_campaigns: a page past the oldest campaign is empty.
+    """
+    engine_string = f"sqlite:///{tmp_path / 'kickstarter.db'}"
+    Base.metadata.create_all(get_engine(engine_string))
+    with session_scope(engine_string) as session:
+        session.add(make_campaign(make_user_input("Board Game")))
+
+    with session_scope(engine_string) as session:
+        assert list_campaigns(session, 10, before_id=1) == []
+
+
+###########################################################################################################
+
+
+if __name__ == "__main__":
+    test_make_campaign()
+    test_make_campaign_unhappy()
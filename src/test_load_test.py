@@ -0,0 +1,93 @@
+import pytest
+from src.load_test import *
+
+###########################################################################################################
+
+
+def test_make_payloads(tmp_path):
+    """
+    Happy path for make_payloads: seeded payloads are reproducible and survive a save and load for replay.
+    """
+    payloads = make_payloads(50, invalid_rate=0.0, random_state=1)
+    assert payloads == make_payloads(50, invalid_rate=0.0, random_state=1)
+    assert all(set(payload) == set(CAMPAIGN_FIELDS) for payload in payloads)
+    assert all(payload['country'].isupper() for payload in payloads)
+
+    save_payloads(payloads, str(tmp_path / "payloads.ndjson"))
+    assert load_payloads(str(tmp_path / "payloads.ndjson")) == payloads
+
+
+def test_make_payloads_unhappy():
+    """
+    Unhappy path for make_payloads: with an invalid rate of 1 every payload has an empty or non-numeric field.
+    """
+    payloads = make_payloads(20, invalid_rate=1.0, random_state=1)
+    assert all("" in payload.values() or "a lot" in payload.values() for payload in payloads)
+
+###########################################################################################################
+
+
+def test_run_load_test():
+    """
+    Happy path for run_load_test: every payload is sent once and the report counts statuses.
+    """
+    sent = []
+
+    def send(payload):
+        sent.append(payload['name'])
+        return 400 if payload['name'] == 'bad' else 200
+
+    payloads = [{'name': 'good'}] * 9 + [{'name': 'bad'}]
+    report = run_load_test(payloads, send, concurrency=3)
+    assert len(sent) == 10
+    assert report['requests'] == 10
+    assert report['statuses'] == {'200': 9, '400': 1}
+    assert report['error_rate'] == 0.0
+    assert report['p50_ms'] <= report['p99_ms'] <= report['max_ms']
+
+
+def test_run_load_test_unhappy():
+    """
+    Unhappy path for run_load_test: server errors and exceptions count as errors and are flagged against a baseline.
+    """
+    def send(payload):
+        if payload['name'] == 'crash':
+            raise ConnectionError("refused")
+        return 500
+
+    report = run_load_test([{'name': 'crash'}, {'name': 'error'}], send, concurrency=2)
+    assert report['statuses'] == {'500': 1, 'ConnectionError': 1}
+    assert report['error_rate'] == 1.0
+
+    baseline = dict(report, error_rate=0.0)
+    assert compare_reports(report, baseline) == ["error_rate: 0 -> 1"]
+    assert compare_reports(report, report) == []
+
+
+def test_make_sender(served_model, monkeypatch):
+    """
+    Happy path for make_sender: in-process payloads are scored by the app without being stored, unless asked for.
+    """
+    import app as flask_app
+    monkeypatch.setitem(flask_app.app.config, 'PERSIST_CAMPAIGNS', True)
+    stored = []
+    monkeypatch.setattr(flask_app, 'save_campaign', stored.append)
+    monkeypatch.setattr(flask_app, 'lookup_prediction', lambda key: None)
+    payloads = make_payloads(3, invalid_rate=0.0, random_state=1)
+
+    send = make_sender('/output')
+    assert [send(payload) for payload in payloads] == [200, 200, 200]
+    assert stored == []
+
+    flask_app.app.config['PERSIST_CAMPAIGNS'] = True
+    send = make_sender('/output', persist=True)
+    assert send(payloads[0]) == 200
+    assert [campaign.name for campaign in stored] == [payloads[0]['name']]
+
+###########################################################################################################
+
+
+if __name__ == "__main__":
+    test_make_payloads_unhappy()
+    test_run_load_test()
+    test_run_load_test_unhappy()
@@ -0,0 +1,43 @@
+import pytest
+from src.metrics import *
+
+###########################################################################################################
+
+
+def test_histogram():
+    """
+    Happy path for Histogram: quantiles are interpolated within buckets and rendered with cumulative buckets.
+    """
+    registry = MetricsRegistry(enabled=True)
+    histogram = registry.histogram('test_seconds', "Test latency.", ['stage'])
+    for value in [0.002] * 90 + [0.02] * 10:
+        histogram.observe(value, 'predict')
+    assert histogram.count('predict') == 100
+    assert 0.001 < histogram.quantile(0.5, 'predict') <= 0.0025
+    assert 0.01 < histogram.quantile(0.99, 'predict') <= 0.025
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="predict",le="+Inf"} 100' in text
+    assert 'test_seconds_count{stage="predict"} 100' in text
+
+
+def test_histogram_unhappy():
+    """
+    Unhappy path for MetricsRegistry: a disabled registry hands out a no-op timer and records nothing.
+    """
+    registry = MetricsRegistry(enabled=False)
+    histogram = registry.histogram('test_seconds', "Test latency.", ['stage'])
+    counter = registry.counter('test_total', "Test counter.", ['field'])
+    with registry.timer(histogram, 'predict') as timer:
+        pass
+    assert timer is NULL_TIMER
+    with pytest.raises(ValueError):
+        with registry.timer(histogram, 'predict'):
+            raise ValueError("not swallowed")
+    counter.inc('name')
+    assert histogram.count('predict') == 0
+    assert histogram.quantile(0.5, 'predict') is None
+    assert counter.get('name') == 0
+
+###########################################################################################################
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from src.micro_batcher import *
+
+###########################################################################################################
+
+
+def test_micro_batcher():
+    """
+    Happy path for MicroBatcher: concurrent submissions are scored together and each caller gets its own result.
+    """
+    batches = []
+
+    def score_batch(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    async def run():
+        batcher = MicroBatcher(score_batch, max_batch_size=4, max_wait=0.05)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = run_in_new_loop(run())
+    assert results == [i * 10 for i in range(10)]
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert stats == {'batches': 3, 'items': 10, 'mean_batch_size': 10 / 3}
+
+
+def test_micro_batcher_unhappy():
+    """
+    Unhappy path for MicroBatcher: a failing item fails only its own caller, not the others batched with it, and
+    later batches are still scored.
+    """
+    batches = []
+
+    def score_batch(items):
+        batches.append(list(items))
+        if 'bad' in items:
+            raise ValueError("bad item")
+        return [item.upper() for item in items]
+
+    async def run():
+        batcher = MicroBatcher(score_batch, max_batch_size=3, max_wait=0.05)
+        first = await asyncio.gather(*(batcher.submit(item) for item in ['good', 'bad', 'fine']),
+                                     return_exceptions=True)
+        recovered = await batcher.submit('good')
+        await batcher.stop()
+        return first, recovered, batcher.stats()
+
+    first, recovered, stats = run_in_new_loop(run())
+    assert first[0] == 'GOOD' and first[2] == 'FINE'
+    assert isinstance(first[1], ValueError)
+    assert recovered == 'GOOD'
+    # Submissions gathered together may be queued in any order
+    assert sorted(batches[0]) == ['bad', 'fine', 'good']
+    assert batches[1:4] == [[item] for item in batches[0]]
+    assert batches[4] == ['good']
+    assert (stats['batches'], stats['items']) == (3, 3)
+
+###########################################################################################################
+
+
+if __name__ == "__main__":
+    test_micro_batcher()
+    test_micro_batcher_unhappy()
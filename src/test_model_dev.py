@@ -45,6 +45,35 @@ def test_make_dummies_unhappy():
 
 ###########################################################################################################
 
+class StubForest(object):
+    """Stand-in for a fitted forest with fixed probabilities."""
+    classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        proba = np.array([0.2, 0.5, 0.7])
+        return np.column_stack([1 - proba, proba])
+
+
+def test_predict_with_threshold():
+    """
+    Happy path for predict_with_threshold: a 0.5 threshold matches argmax labeling, ties go to the negative class.
+    """
+    ypred_proba, ypred_binary = predict_with_threshold(StubForest(), None)
+    assert np.isclose(ypred_proba, [0.2, 0.5, 0.7]).all()
+    assert list(ypred_binary) == [0, 0, 1]
+
+
+def test_predict_with_threshold_unhappy():
+    """
+    Unhappy path for predict_with_threshold: a lower threshold flips borderline campaigns to success.
+    """
+    ypred_proba, ypred_binary = predict_with_threshold(StubForest(), None, threshold=0.1)
+    assert list(ypred_binary) == [1, 1, 1]
+
+###########################################################################################################
+
 if __name__ == "__main__":
     test_make_dummies()
     test_make_dummies_unhappy()
+    test_predict_with_threshold()
+    test_predict_with_threshold_unhappy()
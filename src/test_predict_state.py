@@ -21,6 +21,7 @@ def test_process_USD_goal_unhappy():
     test = process_USD_goal("hello")
     true = ('hello', True)
     assert test == true
+    assert process_USD_goal(10 ** 400) == (10 ** 400, True)
 
 ###########################################################################################################
 
@@ -168,6 +169,446 @@ def test_process_num_days_unhappy():
     test = process_num_days("hello")
     true = ('hello', True)
     assert test == true
+    assert process_num_days(10 ** 400)[1]
+
+###########################################################################################################
+
+
+def test_model_store(tmp_path):
+    """
+    Happy path for ModelStore: model is loaded once and reloaded when the artifact changes.
+    """
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, 'wb') as outfile:
+        pickle.dump({'version': 1}, outfile)
+    store = ModelStore(str(model_path), engine='sklearn')
+    first = store.get()
+    assert first == {'version': 1}
+    assert store.get() is first
+
+    with open(model_path, 'wb') as outfile:
+        pickle.dump({'version': 2, 'padding': 'x'}, outfile)
+    assert store.get() == {'version': 2, 'padding': 'x'}
+
+
+def test_model_store_unhappy(tmp_path):
+    """
+    Unhappy path for ModelStore: a corrupt artifact keeps the previously loaded model in service.
+    """
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, 'wb') as outfile:
+        pickle.dump({'version': 1}, outfile)
+    store = ModelStore(str(model_path), engine='sklearn')
+    store.get()
+
+    with open(model_path, 'wb') as outfile:
+        outfile.write(b"not a pickle at all")
+    assert store.get() == {'version': 1}
+
+
+def test_artifact_cache_unhappy(tmp_path):
+    """
+    Unhappy path for ArtifactCache: a cache that does not define how to load its artifact cannot be created.
+    """
+    with pytest.raises(TypeError):
+        ArtifactCache(str(tmp_path / "model.pkl"))
+
+
+def test_artifact_snapshot(tmp_path):
+    """
+    Happy path for ArtifactCache.snapshot: the object comes with the version it was loaded from, and a recheck
+    picks up a new artifact within the check interval.
+    """
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, 'wb') as outfile:
+        pickle.dump({'version': 1}, outfile)
+    store = ModelStore(str(model_path), check_interval=3600, engine='sklearn')
+    version, first = store.snapshot()
+    assert (version, first) == (store.version, {'version': 1})
+
+    with open(model_path, 'wb') as outfile:
+        pickle.dump({'version': 2, 'padding': 'x'}, outfile)
+    assert store.snapshot() == (version, first)
+    new_version, second = store.snapshot(recheck=True)
+    assert new_version != version and second == {'version': 2, 'padding': 'x'}
+
+
+def test_get_model_version(tmp_path, monkeypatch):
+    """
+    Happy path for get_model_version: the version follows the content of the served artifact.
+    """
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, 'wb') as outfile:
+        pickle.dump({'version': 1}, outfile)
+    monkeypatch.setattr(config, 'MODEL_FORMAT', 'pickle')
+    monkeypatch.setattr(config, 'MODEL_STORE_PATH', str(model_path))
+    monkeypatch.setattr(config, 'INFERENCE_ENGINE', 'sklearn')
+    first = get_model_version()
+    assert first == artifact_digest(str(model_path))[:16]
+
+    with open(model_path, 'wb') as outfile:
+        pickle.dump({'version': 2, 'padding': 'x'}, outfile)
+    get_model_store().snapshot(recheck=True)
+    assert get_model_version() == artifact_digest(str(model_path))[:16] != first
+
+###########################################################################################################
+
+
+def test_mapped_model_store(tmp_path):
+    """
+    Happy path for MappedModelStore: an exported model is served memory-mapped with the same probabilities.
+    """
+    encoder = FeatureEncoder(['len_name'], ['country'], [Vocabulary(['us', 'au'])])
+    rng = np.random.RandomState(0)
+    X = np.column_stack([rng.randint(1, 50, 200), rng.rand(200) > 0.5, rng.rand(200) > 0.5]).astype(float)
+    y = (X[:, 0] > 25).astype(int)
+    model = RandomForestClassifier(n_estimators=5, random_state=123).fit(X, y)
+
+    export_model(model, str(tmp_path / "model"), encoder)
+    store = get_model_store(str(tmp_path / "model"))
+    assert isinstance(store, MappedModelStore)
+    forest = store.get()
+    assert forest.metadata['columns'] == ['len_name', 'au', 'us']
+    assert forest.metadata['vocabularies'] == {'country': ['au', 'us']}
+    assert np.allclose(forest.predict_proba(X), model.predict_proba(X))
+    assert store.get() is forest
+
+
+def test_mapped_model_store_unhappy(tmp_path):
+    """
+    Unhappy path for MappedModelStore: a directory without an export fails on first load.
+    """
+    (tmp_path / "model").mkdir()
+    store = MappedModelStore(str(tmp_path / "model"))
+    with pytest.raises(FileNotFoundError):
+        store.get()
+
+
+def test_mapped_model_store_swap(tmp_path):
+    """
+    Unhappy path for MappedModelStore: while an export is being swapped and its directory is missing, the loaded
+    forest keeps being served.
+    """
+    encoder = FeatureEncoder(['len_name'], ['country'], [Vocabulary(['us', 'au'])])
+    X = np.column_stack([np.arange(20), np.arange(20) % 2, 1 - np.arange(20) % 2]).astype(float)
+    model = RandomForestClassifier(n_estimators=2, random_state=123).fit(X, X[:, 0] > 10)
+    export_model(model, str(tmp_path / "model"), encoder)
+    store = MappedModelStore(str(tmp_path / "model"))
+    forest = store.get()
+
+    (tmp_path / "model").rename(tmp_path / "model.old")
+    assert store.get() is forest
+
+###########################################################################################################
+
+
+def test_vocabulary():
+    """
+    Happy path for Vocabulary.
+    """
+    vocab = Vocabulary(['us', 'au', 'mx', 'au', 'gb'])
+    assert vocab.levels == ('au', 'gb', 'mx', 'us')
+    assert vocab.index == {'au': 0, 'gb': 1, 'mx': 2, 'us': 3}
+    assert process_country('MX', vocab) == ('mx', False)
+
+
+def test_vocabulary_store_unhappy(tmp_path):
+    """
+    Unhappy path for VocabularyStore: a missing file gives an empty vocabulary and a new file is picked up.
+    """
+    levels_path = tmp_path / "countries.txt"
+    store = VocabularyStore(str(levels_path))
+    assert len(store.get()) == 0
+
+    levels_path.write_text("us\nau\n")
+    assert 'au' in store.get()
+
+###########################################################################################################
+
+VOCABULARIES = [Vocabulary(['us', 'au']), Vocabulary(['food', 'games']), Vocabulary(['food', 'games'])]
+
+
+def test_validate_user_input():
+    """
+    Happy path for validate_user_input.
+    """
+    campaign = {'name': 'Name!', 'blurb': 'Blurb!', 'USD_goal': '1000', 'num_days': '2', 'country': 'US',
+                'category_name': 'Food', 'p_category_name': 'Games', 'staff_pick': 'False'}
+    features, invalid_fields = validate_user_input(campaign, VOCABULARIES)
+    true = {'len_name': 5, 'len_blurb': 6, 'USD_goal': 1000.0, 'time_elapsed': 172800, 'country': 'us',
+            'category_name': 'food', 'p_category_name': 'games', 'staff_pick': False}
+    assert features == true
+    assert invalid_fields == []
+
+
+def test_validate_user_input_unhappy():
+    """
+    Unhappy path for validate_user_input: missing and invalid fields are reported by name.
+    """
+    campaign = {'name': 'Name!', 'USD_goal': 'lots', 'num_days': '2', 'country': 'ee',
+                'category_name': 'Food', 'p_category_name': 'Games', 'staff_pick': 'False'}
+    features, invalid_fields = validate_user_input(campaign, VOCABULARIES)
+    assert invalid_fields == ['blurb', 'USD_goal', 'country']
+
+
+def test_process_user_inputs_unhappy():
+    """
+    Unhappy path for process_user_inputs: invalid records are flagged without scoring.
+    """
+    campaigns = [{'name': ''}, {'name': 'Name!', 'country': 'zz'}]
+    y_pred, y_pred_proba, invalid_fields = process_user_inputs(campaigns)
+    assert list(y_pred) == [-1, -1]
+    assert np.isnan(y_pred_proba).all()
+    assert invalid_fields[1] == ['blurb', 'USD_goal', 'num_days', 'country', 'category_name', 'p_category_name', 'staff_pick']
+
+###########################################################################################################
+
+
+def test_feature_encoder():
+    """
+    Happy path for FeatureEncoder: matches the pandas prep_user_input path column for column.
+    """
+    rows = [
+        {'len_name': 5, 'len_blurb': 6, 'USD_goal': 1000.0, 'time_elapsed': 172800, 'country': 'us',
+         'category_name': 'food', 'p_category_name': 'games', 'staff_pick': False},
+        {'len_name': 12, 'len_blurb': 80, 'USD_goal': 25000.5, 'time_elapsed': 2592000, 'country': 'au',
+         'category_name': 'games', 'p_category_name': 'food', 'staff_pick': True},
+    ]
+    numerical = ['USD_goal', 'staff_pick', 'len_blurb', 'len_name', 'time_elapsed']
+    categorical = ['country', 'category_name', 'p_category_name']
+    encoder = FeatureEncoder(numerical, categorical, VOCABULARIES)
+
+    df_true = prep_user_input(pd.DataFrame(rows), categorical, numerical, [v.levels for v in VOCABULARIES])
+    test = encoder.encode(rows)
+    assert list(df_true.columns) == encoder.columns
+    assert np.isclose(test, df_true.values.astype(float)).all()
+    assert np.isclose(encoder.encode_row(rows[1]), test[1]).all()
+
+
+def test_feature_encoder_unhappy():
+    """
+    Unhappy path for FeatureEncoder: an unknown level leaves its dummy block empty, like the pandas path.
+    """
+    encoder = FeatureEncoder(['len_name'], ['country'], [Vocabulary(['us', 'au'])])
+    test = encoder.encode_row({'len_name': 3, 'country': 'ee'})
+    assert list(test) == [3, 0, 0]
+
+###########################################################################################################
+
+
+def test_make_prediction_record():
+    """
+    Happy path for make_prediction_record.
+    """
+    test = make_prediction_record(np.int64(1), np.float64(0.75), [])
+    true = {'predicted_state': 'SUCCESS', 'prediction': 1, 'probability': 0.75}
+    assert test == true
+
+
+def test_make_prediction_record_explained():
+    """
+    Happy path for make_prediction_record with an explanation: baseline and contributions are added to the record.
+    """
+    explanation = {'baseline': 0.5, 'contributions': {'USD_goal': -0.2, 'country': 0.05}}
+    test = make_prediction_record(0, 0.35, [], explanation)
+    assert test == {'predicted_state': 'FAILED', 'prediction': 0, 'probability': 0.35, 'baseline': 0.5,
+                    'contributions': {'USD_goal': -0.2, 'country': 0.05}}
+
+
+def test_summarize_contributions():
+    """
+    Happy path for summarize_contributions: the one-hot columns of a categorical feature are summed into one
+    contribution and features are ordered by absolute contribution.
+    """
+    encoder = FeatureEncoder(['USD_goal'], ['country'], [Vocabulary(['gb', 'us'])])
+    test = summarize_contributions(np.array([0.5]), np.array([[0.05, -0.1, -0.2]]), encoder)
+    assert test == [{'baseline': 0.5, 'contributions': {'country': pytest.approx(-0.3), 'USD_goal': 0.05}}]
+    assert list(test[0]['contributions']) == ['country', 'USD_goal']
+
+
+def test_get_explainer_unhappy():
+    """
+    Unhappy path for get_explainer: an sklearn forest is compiled once and reused, not recompiled per call.
+    """
+    rng = np.random.RandomState(0)
+    X = rng.rand(100, 3)
+    model = RandomForestClassifier(n_estimators=3, random_state=123).fit(X, X[:, 0] > 0.5)
+    forest = get_explainer(model)
+    assert isinstance(forest, CompiledForest)
+    assert get_explainer(model) is forest
+    assert get_explainer(forest) is forest
+
+
+def test_iter_prediction_records_unhappy():
+    """
+    Unhappy path for iter_prediction_records: unparsed and invalid records keep their row numbers across batches.
+    """
+    records = list(iter_prediction_records([None, {'name': ''}, None], batch_size=2))
+    assert [record['row'] for record in records] == [0, 1, 2]
+    assert records[0] == {'error': 'Record could not be parsed.', 'row': 0}
+    assert records[1]['predicted_state'] == 'INVALID USER ENTRY'
+
+###########################################################################################################
+
+
+def test_prediction_cache():
+    """
+    Happy path for PredictionCache: hits are counted and the least recently used entry is evicted.
+    """
+    cache = PredictionCache(max_size=2)
+    cache.sync('v1')
+    cache.put(('a',), (1, 0.9))
+    cache.put(('b',), (0, 0.1))
+    assert cache.get(('a',)) == (1, 0.9)
+    cache.put(('c',), (0, 0.2))
+    assert cache.get(('b',)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_prediction_cache_unhappy():
+    """
+    Unhappy path for PredictionCache: a new model version or an expired TTL invalidates entries.
+    """
+    cache = PredictionCache(max_size=2)
+    cache.sync('v1')
+    cache.put(('a',), (1, 0.9))
+    cache.sync('v2')
+    assert cache.get(('a',)) is None
+
+    cache = PredictionCache(max_size=2, ttl=0)
+    cache.put(('a',), (1, 0.9))
+    time.sleep(0.01)
+    assert cache.get(('a',)) is None
+
+###########################################################################################################
+
+
+def test_validate_frame():
+    """
+    Happy path for validate_frame: matches validate_user_input row for row on the scalar test cases.
+    """
+    campaigns = [
+        {'name': "How are you doing today?", 'blurb': "How are you doing today?", 'USD_goal': 5, 'num_days': 5,
+         'country': 'us', 'category_name': 'food', 'p_category_name': 'games', 'staff_pick': 'true'},
+        {'name': "", 'blurb': "", 'USD_goal': "hello", 'num_days': "hello",
+         'country': 'ee', 'category_name': 'no', 'p_category_name': 'no', 'staff_pick': 'hello'},
+        {'name': "Name!", 'blurb': 12, 'USD_goal': '1_000', 'num_days': 30.0,
+         'country': 'AU', 'category_name': 'Games', 'p_category_name': 5, 'staff_pick': 'FALSE'},
+    ]
+    features, reasons = validate_frame(pd.DataFrame(campaigns), VOCABULARIES)
+    for i, campaign in enumerate(campaigns):
+        true_features, true_invalid = validate_user_input(campaign, VOCABULARIES)
+        assert invalid_fields_from_reasons(reasons)[i] == true_invalid
+        assert features.iloc[i].to_dict() == true_features
+
+
+def test_validate_frame_unhappy():
+    """
+    Unhappy path for validate_frame: invalid fields are reason-coded and missing columns count as missing.
+    """
+    data = pd.DataFrame([{'name': '', 'USD_goal': 'lots', 'num_days': None, 'country': 'ee',
+                          'category_name': 7, 'p_category_name': 'food', 'staff_pick': 'maybe'}])
+    features, reasons = validate_frame(data, VOCABULARIES)
+    true = {'name': REASON_EMPTY, 'blurb': REASON_MISSING, 'USD_goal': REASON_NOT_A_NUMBER, 'num_days': REASON_MISSING,
+            'country': REASON_UNKNOWN_LEVEL, 'category_name': REASON_NOT_A_STRING, 'p_category_name': '',
+            'staff_pick': REASON_UNKNOWN_LEVEL}
+    assert reasons.iloc[0].to_dict() == true
+
+
+def test_validate_frame_huge_integers():
+    """
+    Unhappy path for validate_frame: JSON integers too large for a float are invalid, as in the scalar validators.
+    """
+    campaign = {'name': 'Name', 'blurb': 'Blurb', 'USD_goal': 10 ** 400, 'num_days': 10 ** 400, 'country': 'us',
+                'category_name': 'food', 'p_category_name': 'games', 'staff_pick': 'false'}
+    data = pd.DataFrame([campaign, dict(campaign, USD_goal=1000, num_days=30)], dtype=object)
+    features, reasons = validate_frame(data, VOCABULARIES)
+    assert list(reasons.iloc[0][reasons.iloc[0] != '']) == [REASON_NOT_A_NUMBER, REASON_NOT_A_NUMBER]
+    assert (reasons.iloc[1] == '').all()
+    assert features['USD_goal'].iloc[0] == 10 ** 400
+    assert validate_user_input(campaign, VOCABULARIES)[1] == ['USD_goal', 'num_days']
+
+
+def test_feature_encoder_frame():
+    """
+    Happy path for FeatureEncoder.encode_frame: matches the row-wise encoder.
+    """
+    campaigns = pd.DataFrame([
+        {'name': 'Name!', 'blurb': 'Blurb!', 'USD_goal': '1000', 'num_days': '2', 'country': 'US',
+         'category_name': 'Food', 'p_category_name': 'Games', 'staff_pick': 'False'},
+        {'name': 'Other', 'blurb': 'Other blurb', 'USD_goal': 250.5, 'num_days': 45, 'country': 'au',
+         'category_name': 'games', 'p_category_name': 'food', 'staff_pick': 'true'},
+    ])
+    numerical = ['USD_goal', 'staff_pick', 'len_blurb', 'len_name', 'time_elapsed']
+    categorical = ['country', 'category_name', 'p_category_name']
+    encoder = FeatureEncoder(numerical, categorical, VOCABULARIES)
+    features, reasons = validate_frame(campaigns, VOCABULARIES)
+    rows = [features.iloc[i].to_dict() for i in range(len(features))]
+    assert np.array_equal(encoder.encode_frame(features), encoder.encode(rows))
+
+###########################################################################################################
+
+
+def test_make_sweep_values():
+    """
+    Happy path for make_sweep_values: explicit values, linear and log ranges, and whole days.
+    """
+    assert list(make_sweep_values([3000, 1000, 1000])) == [1000, 3000]
+    assert list(make_sweep_values({'min': 10, 'max': 30, 'steps': 3})) == [10, 20, 30]
+    assert np.allclose(make_sweep_values({'min': 100, 'max': 10000, 'steps': 3, 'scale': 'log'}), [100, 1000, 10000])
+    assert list(make_sweep_values({'min': 1, 'max': 2, 'steps': 5}, integer=True)) == [1, 2]
+
+
+def test_make_sweep_values_unhappy():
+    """
+    Unhappy path for make_sweep_values: malformed, empty and non-finite ranges are rejected.
+    """
+    for spec in [{'min': 1, 'steps': 3}, {'min': 5, 'max': 1, 'steps': 3}, {'min': 0, 'max': 1, 'steps': 3, 'scale': 'log'},
+                 [], ['a lot'], [float('inf')]]:
+        with pytest.raises(ValueError):
+            make_sweep_values(spec)
+
+
+def test_make_sweep_values_oversized():
+    """
+    Unhappy path for make_sweep_values: a range or list longer than SWEEP_MAX_POINTS is rejected before it is built.
+    """
+    with pytest.raises(ValueError):
+        make_sweep_values({'min': 1, 'max': 2, 'steps': 10000000000})
+    with pytest.raises(ValueError):
+        make_sweep_values(list(range(config.SWEEP_MAX_POINTS + 1)))
+
+
+def test_sweep_campaign_unhappy():
+    """
+    Unhappy path for sweep_campaign: invalid fields that are not swept are reported before any scoring.
+    """
+    campaign = {'name': 'Name!', 'blurb': 'Blurb!', 'USD_goal': 'a lot', 'num_days': '30', 'country': 'US',
+                'category_name': 'Food', 'p_category_name': 'Food', 'staff_pick': 'False'}
+    sweep, invalid_fields = sweep_campaign(dict(campaign, country=None), goals=[1000, 2000])
+    assert sweep is None
+    assert invalid_fields == ['country']
+
+###########################################################################################################
+
+
+def test_feature_hash():
+    """
+    Happy path for feature_hash: campaigns that normalize to the same features share a hash.
+    """
+    campaign = make_sample_campaigns(1, random_state=0)[0]
+    features, _ = validate_user_input(campaign)
+    shouted, _ = validate_user_input(dict(campaign, country=campaign['country'].upper()))
+    assert feature_hash(features) == feature_hash(shouted)
+
+
+def test_feature_hash_unhappy():
+    """
+    Unhappy path for feature_hash: the same features under another decision threshold hash differently.
+    """
+    features, _ = validate_user_input(make_sample_campaigns(1, random_state=0)[0])
+    assert feature_hash(features, threshold=0.3) != feature_hash(features, threshold=0.7)
+
 
 ###########################################################################################################
 
@@ -188,4 +629,26 @@ if __name__ == "__main__":
     test_process_country()
     test_process_country_unhappy()
     test_process_num_days()
-    test_process_num_days_unhappy()
\ No newline at end of file
+    test_process_num_days_unhappy()
+    test_vocabulary()
+    test_validate_user_input()
+    test_validate_user_input_unhappy()
+    test_process_user_inputs_unhappy()
+    test_feature_encoder()
+    test_feature_encoder_unhappy()
+    test_make_prediction_record()
+    test_make_prediction_record_explained()
+    test_summarize_contributions()
+    test_get_explainer_unhappy()
+    test_iter_prediction_records_unhappy()
+    test_prediction_cache()
+    test_prediction_cache_unhappy()
+    test_validate_frame()
+    test_validate_frame_unhappy()
+    test_feature_encoder_frame()
+    test_make_sweep_values()
+    test_make_sweep_values_unhappy()
+    test_make_sweep_values_oversized()
+    test_sweep_campaign_unhappy()
+    test_feature_hash()
+    test_feature_hash_unhappy()
@@ -0,0 +1,69 @@
+import os
+import time
+import multiprocessing
+from src import config
+from src import predict_state
+import logging.config
+
+logging.config.fileConfig(config.LOGGING_CONFIG, disable_existing_loggers=False)
+logger = logging.getLogger('throughput_benchmark')
+
+
+def score_for(args):
+    """
+    Scores campaigns one request at a time for a fixed duration, as a serving worker would.
+
+    Args:
+        args (tuple): campaigns (list[dict]) to cycle through and duration (float) in seconds
+
+    Returns:
+        n_scored (int): number of predictions made
+    """
+    campaigns, duration = args
+    n_scored = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        predict_state.process_user_input(campaigns[n_scored % len(campaigns)])
+        n_scored += 1
+    return n_scored
+
+
+def benchmark_workers(n_workers, campaigns, duration):
+    """
+    Measures prediction throughput of n_workers processes forked after the model was loaded in the parent, the
+    same way the pre-forked gunicorn workers share it.
+
+    Args:
+        n_workers (int): number of forked worker processes
+        campaigns (list[dict]): campaign records to score
+        duration (float): number of seconds each worker scores for
+
+    Returns:
+        throughput (float): predictions per second over all workers
+    """
+    context = multiprocessing.get_context('fork')
+    with context.Pool(n_workers) as pool:
+        counts = pool.map(score_for, [(campaigns, duration)] * n_workers)
+    return sum(counts) / duration
+
+
+if __name__ == "__main__":
+
+    # Keep per-request logging out of the measurement
+    logging.disable(logging.WARNING)
+
+    # Score distinct campaigns with the prediction cache off, so every request reaches the model
+    campaigns = predict_state.make_sample_campaigns(5000, random_state=0)
+    predict_state.get_prediction_cache().max_size = 0
+
+    # Load the model once in the parent; workers inherit it copy-on-write
+    predict_state.warmup()
+
+    max_workers = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, max_workers} & set(range(1, max_workers + 1)))
+    baseline = None
+    print(f"Inference engine: {config.INFERENCE_ENGINE}; CPUs: {max_workers}")
+    for n_workers in worker_counts:
+        throughput = benchmark_workers(n_workers, campaigns, duration=5.0)
+        baseline = baseline or throughput
+        print(f"{n_workers} workers: {throughput:.0f} predictions/s ({throughput / baseline:.2f}x)")